@@ -155,4 +155,56 @@ NEWS_SUMMARY_BACKEND = "fallback"
 NEWS_SUMMARY_CALLABLE = "profiles.zhipu_client.get_news_brief"
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# 数学实验室：符号计算（化简/积分/解方程/极限/级数）放到独立进程池执行，
+# 超过时间或内存上限直接取消，避免一个病态积分长时间占住 Django worker
+MATHS_SANDBOX_ENABLED = True
+MATHS_SANDBOX_TIMEOUT = 10          # 秒
+MATHS_SANDBOX_MEMORY_MB = 512       # 单个计算进程的 RSS 上限
+MATHS_SANDBOX_WORKERS = 2
+# 积分/极限在 strategy=auto 时符号与数值竞速（两条路径都在上面的进程池里）：
+# 符号路径超过这个秒数仍无闭式解就取消，返回数值结果；数值路径仍以 MATHS_SANDBOX_TIMEOUT 为上限。
+# 明显短于 MATHS_SANDBOX_TIMEOUT，难积分在 auto 下几秒内就能拿到数值结果；需要闭式解时用 strategy=symbolic
+MATHS_FALLBACK_BUDGET = 3
+
+# 数学实验室后台任务（api/jobs/）、批量接口（api/batch/）与流式接口（api/series/stream/）的线程数
+MATHS_JOB_WORKERS = 4
+MATHS_BATCH_WORKERS = 4
+MATHS_STREAM_WORKERS = 4
+
+# 数学实验室的 SymPy / NumPy / Matplotlib 按需导入；设为 True 时进程启动后在后台线程预热，
+# 第一个计算请求不必等待导入（也可以在 gunicorn post_fork 里调用 maths.warmup.warm_up()）
+MATHS_WARMUP_ON_START = False
+
+# 确定性计算（化简/求导/积分/解方程/极限/级数）的结果缓存：进程内 LRU + 共享的 Django 缓存。
+# 默认落到本地文件缓存，多个 worker 进程共享；多机部署可改成指向 Redis / Memcached 的别名，设为 None 只用进程内 LRU
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "maths_results": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / ".cache" / "maths_results",
+        "TIMEOUT": 7 * 24 * 3600,
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+MATHS_RESULT_CACHE_ALIAS = "maths_results"
+MATHS_RESULT_CACHE_SIZE = 512                 # 进程内 LRU 条数
+MATHS_RESULT_CACHE_MAX_BYTES = 256 * 1024     # 单个结果序列化后超过这个大小就不缓存
+MATHS_RESULT_CACHE_TIMEOUT = 7 * 24 * 3600
+
+# 线性代数上传矩阵文件（.npy / .mtx / .txt / .csv）的大小上限
+MATHS_MATRIX_UPLOAD_MAX_MB = 20
+
+# 深度学习训练调度：最多同时训练几个任务、每个用户同时运行 / 排队的任务上限、每个任务的 PyTorch 线程数
+# （None 表示 CPU 核数平分给各 worker）
+DEEPLEARNING_TRAINING_WORKERS = 2
+DEEPLEARNING_MAX_RUNNING_PER_USER = 1
+DEEPLEARNING_MAX_QUEUED_PER_USER = 3
+DEEPLEARNING_THREADS_PER_JOB = None
+# 训练执行后端："process" 每个任务一个子进程（不占 Django 进程的 GIL / 内存，崩溃互不影响），"thread" 在进程内训练
+DEEPLEARNING_TRAINING_BACKEND = "process"
+# 训练实时推送（training-stream）每隔多少个批次报告一次本轮进度，0 表示只按轮推送
+DEEPLEARNING_PROGRESS_EVERY_BATCHES = 20
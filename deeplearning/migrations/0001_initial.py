@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 07:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingJob',
+            fields=[
+                ('job_id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', '排队中'), ('running', '训练中'), ('finished', '已完成'), ('error', '出错')], db_index=True, default='queued', max_length=10)),
+                ('message', models.TextField(blank=True, default='')),
+                ('current_epoch', models.PositiveIntegerField(default=0)),
+                ('total_epochs', models.PositiveIntegerField(default=0)),
+                ('device', models.CharField(blank=True, default='', max_length=32)),
+                ('history', models.TextField(blank=True, default='')),
+                ('latest', models.JSONField(blank=True, default=dict)),
+                ('traceback', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+        ),
+    ]
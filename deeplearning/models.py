@@ -0,0 +1,33 @@
+from django.db import models
+
+
+class TrainingJob(models.Model):
+    """
+    训练任务的持久化记录：重启后历史仍在，多个 web 进程都能查到同一个任务。
+    history 用紧凑格式存（见 utils/job_store.py），读出时再展开成原来的状态 JSON。
+    """
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", "排队中"
+        RUNNING = "running", "训练中"
+        FINISHED = "finished", "已完成"
+        ERROR = "error", "出错"
+
+    job_id = models.CharField(max_length=32, primary_key=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED, db_index=True)
+    message = models.TextField(blank=True, default="")
+
+    current_epoch = models.PositiveIntegerField(default=0)
+    total_epochs = models.PositiveIntegerField(default=0)
+    device = models.CharField(max_length=32, blank=True, default="")
+
+    history = models.TextField(blank=True, default="")
+    latest = models.JSONField(default=dict, blank=True)
+    traceback = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.job_id} ({self.status})"
@@ -0,0 +1,470 @@
+import json
+import threading
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from .forms import DEFAULT_FORM_DATA
+from .models import TrainingJob
+from .utils import job_store, trainer
+from .utils.backends import ProcessBackend
+from .utils.scheduler import QueueFull, TrainingScheduler
+from .views import _normalize_config
+
+
+def small_config(**overrides):
+    config = _normalize_config({**DEFAULT_FORM_DATA, "num_samples": 200, "epochs": 2, **overrides})
+    config["progress_every_batches"] = 0
+    return config
+
+
+def register_job(status="running", epochs=3):
+    """不经调度器，直接在本进程任务表和数据库里登记一个任务"""
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "status": status,
+        "message": "",
+        "current_epoch": 0,
+        "total_epochs": epochs,
+        "device": "cpu",
+        "history": {key: [] for key in ("epoch", "train_loss", "test_loss", "train_acc", "test_acc")},
+        "latest": {},
+        "progress": None,
+        "version": 0,
+    }
+    job_store.save_job(job)
+    with trainer.TRAINING_LOCK:
+        trainer.TRAINING_JOBS[job_id] = job
+        trainer._JOB_LOCKS[job_id] = threading.Condition()
+    return job_id
+
+
+class Recorder:
+    """代替 run_job：记录执行顺序，job_id 以 fail 开头时抛异常"""
+
+    def __init__(self, expected: int):
+        self.ran = []
+        self.errors = []
+        self.remaining = expected
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    def _finish(self):
+        with self.lock:
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.done.set()
+
+    def run_job(self, job_id, payload):
+        try:
+            self.ran.append(job_id)
+            if job_id.startswith("fail"):
+                raise RuntimeError(f"{job_id} broke")
+        finally:
+            self._finish()
+
+    def on_error(self, job_id, error):
+        self.errors.append((job_id, str(error)))
+
+
+class TrainingSchedulerTests(SimpleTestCase):
+    def test_worker_survives_failing_job(self):
+        recorder = Recorder(expected=3)
+        scheduler = TrainingScheduler(recorder.run_job, max_workers=1, on_error=recorder.on_error)
+        with self.assertLogs("deeplearning.utils.scheduler", "ERROR"):
+            for job_id in ("fail-1", "ok-1", "ok-2"):
+                scheduler.submit(job_id, None, user="u", priority=0)
+            self.assertTrue(recorder.done.wait(5))
+        self.assertEqual(recorder.ran, ["fail-1", "ok-1", "ok-2"])
+        self.assertEqual(recorder.errors, [("fail-1", "fail-1 broke")])
+        self.assertEqual(scheduler.stats()["running"], 0)
+
+    def test_failing_error_handler_is_logged(self):
+        recorder = Recorder(expected=2)
+
+        def on_error(job_id, error):
+            raise OSError("database is locked")
+
+        scheduler = TrainingScheduler(recorder.run_job, max_workers=1, on_error=on_error)
+        with self.assertLogs("deeplearning.utils.scheduler", "ERROR") as logs:
+            scheduler.submit("fail-1", None, user="u")
+            scheduler.submit("ok-1", None, user="u")
+            self.assertTrue(recorder.done.wait(5))
+        self.assertEqual(recorder.ran, ["fail-1", "ok-1"])
+        self.assertEqual(len(logs.records), 2)
+
+    def test_priority_and_per_user_limits(self):
+        gate = threading.Event()
+        ran = []
+
+        def run_job(job_id, payload):
+            ran.append(job_id)
+            gate.wait(5)
+
+        scheduler = TrainingScheduler(run_job, max_workers=1, max_running_per_user=1, max_queued_per_user=2)
+        scheduler.submit("a-1", None, user="a")
+        # 等 a-1 开始后再排队，保证后面的顺序只由优先级决定
+        for _ in range(100):
+            if ran:
+                break
+            time.sleep(0.01)
+        scheduler.submit("a-2", None, user="a")
+        scheduler.submit("b-1", None, user="b", priority=1)
+        self.assertEqual(scheduler.position("b-1"), (1, 2))
+        self.assertEqual(scheduler.position("a-2"), (2, 2))
+        scheduler.submit("a-3", None, user="a")
+        with self.assertRaises(QueueFull):
+            scheduler.submit("a-4", None, user="a")
+        gate.set()
+
+    def test_position_skips_jobs_blocked_by_user_limit(self):
+        gate = threading.Event()
+        ran = []
+
+        def run_job(job_id, payload):
+            ran.append(job_id)
+            gate.wait(5)
+
+        scheduler = TrainingScheduler(run_job, max_workers=1, max_running_per_user=1)
+        scheduler.submit("a-1", None, user="a")
+        for _ in range(100):
+            if ran:
+                break
+            time.sleep(0.01)
+        scheduler.submit("a-2", None, user="a")
+        scheduler.submit("a-3", None, user="a")
+        scheduler.submit("b-1", None, user="b")
+        # a 已经有任务在跑，后提交的 b-1 会先开始
+        self.assertEqual(scheduler.position("b-1"), (1, 3))
+        self.assertEqual(scheduler.position("a-2"), (2, 3))
+        self.assertEqual(scheduler.position("a-3"), (3, 3))
+        self.assertIsNone(scheduler.position("a-1"))
+        gate.set()
+
+
+class LocalJobTestCase(TestCase):
+    """本进程任务表里的任务，测试结束时清空"""
+
+    def tearDown(self):
+        with trainer.TRAINING_LOCK:
+            trainer.TRAINING_JOBS.clear()
+            trainer._JOB_LOCKS.clear()
+
+    def run_epochs(self, job_id, epochs):
+        for epoch in epochs:
+            trainer._append_history(job_id, epoch, 1.0 / epoch, 2.0 / epoch, 0.5, 0.4)
+            trainer._update_job(job_id, current_epoch=epoch)
+
+
+class FailJobTests(LocalJobTestCase):
+    def test_marks_job_error_and_persists(self):
+        job_id = register_job()
+        trainer._fail_job(job_id, OSError("disk full"))
+        self.assertIsNone(trainer._get_local(job_id)[0])
+        job = job_store.load_job(job_id)
+        self.assertEqual(job["status"], "error")
+        self.assertIn("OSError: disk full", job["message"])
+
+    def test_keeps_error_in_memory_when_database_write_fails(self):
+        job_id = register_job()
+        with mock.patch.object(job_store, "save_job", side_effect=OSError("database is locked")), \
+                self.assertLogs("deeplearning.utils.trainer", "ERROR"):
+            trainer._fail_job(job_id, RuntimeError("boom"))
+        self.assertEqual(trainer.get_training_job(job_id)["status"], "error")
+
+
+class Sink:
+    """代替 _update_job / _append_history / _report_progress，记录子进程发回的消息"""
+
+    def __init__(self, fail_on_status=None):
+        self.updates = []
+        self.history = []
+        self.fail_on_status = fail_on_status
+
+    def update(self, job_id, **fields):
+        if fields.get("status") is not None and fields.get("status") == self.fail_on_status:
+            raise OSError("database is locked")
+        self.updates.append(fields)
+
+    def append_history(self, job_id, **metrics):
+        self.history.append(metrics)
+
+    def report_progress(self, job_id, **progress):
+        pass
+
+    def backend(self):
+        return ProcessBackend(self.update, self.append_history, self.report_progress, threads_per_job=1)
+
+
+class ProcessBackendTests(SimpleTestCase):
+    def test_runs_job_in_child_process(self):
+        sink = Sink()
+        sink.backend()("job-ok", small_config())
+        self.assertEqual(sink.updates[-1]["status"], "finished")
+        self.assertEqual([m["epoch"] for m in sink.history], [1, 2])
+
+    def test_failing_update_stops_child_and_marks_error(self):
+        sink = Sink(fail_on_status="running")
+        with self.assertLogs("deeplearning.utils.backends", "ERROR"):
+            sink.backend()("job-broken", small_config(epochs=50))
+        self.assertEqual(sink.updates[-1]["status"], "error")
+        self.assertIn("训练状态写入失败", sink.updates[-1]["message"])
+        self.assertEqual(sink.history, [])
+
+    def test_failing_error_update_does_not_raise(self):
+        sink = Sink(fail_on_status="error")
+        with self.assertLogs("deeplearning.utils.backends", "ERROR"):
+            # 未知数据集：子进程报告 error，转发失败，再次标记 error 也失败，只记日志
+            sink.backend()("job-error", small_config(dataset_name="nope"))
+
+
+def make_history(n, acc=True):
+    return {
+        "epoch": list(range(1, n + 1)),
+        "train_loss": [1 / (i + 3) for i in range(n)],
+        "test_loss": [2 / (i + 3) for i in range(n)],
+        "train_acc": [0.5 + i / 100 for i in range(n)] if acc else [None] * n,
+        "test_acc": [0.4 + i / 100 for i in range(n)] if acc else [None] * n,
+    }
+
+
+class HistoryFormatTests(SimpleTestCase):
+    def test_round_trip_keeps_six_significant_digits(self):
+        history = make_history(3)
+        restored = job_store.expand_history(job_store.compact_history(history))
+        self.assertEqual(restored["epoch"], [1, 2, 3])
+        self.assertEqual(restored["train_loss"], [0.333333, 0.25, 0.2])
+        self.assertEqual(restored["test_acc"], [0.4, 0.41, 0.42])
+
+    def test_regression_accuracy_columns_are_null(self):
+        text = job_store.compact_history(make_history(2, acc=False))
+        self.assertIn('"train_acc":null', text)
+        self.assertEqual(job_store.expand_history(text)["train_acc"], [None, None])
+
+    def test_empty_history(self):
+        self.assertEqual(job_store.expand_history(""), {
+            "epoch": [], "train_loss": [], "test_loss": [], "train_acc": [], "test_acc": [],
+        })
+
+
+class JobStoreTests(TestCase):
+    def save(self, status="running", epochs=4, **fields):
+        job_id = uuid.uuid4().hex
+        job_store.save_job({
+            "job_id": job_id, "status": status, "current_epoch": epochs, "total_epochs": 10,
+            "device": "cpu", "history": make_history(epochs), "latest": {"train_loss": 0.1}, **fields,
+        })
+        return job_id
+
+    def age(self, job_id, seconds, **fields):
+        past = timezone.now() - timedelta(seconds=seconds)
+        TrainingJob.objects.filter(job_id=job_id).update(updated_at=past, **fields)
+
+    def test_load_returns_history_after_since(self):
+        job_id = self.save()
+        job = job_store.load_job(job_id, since=3)
+        self.assertEqual(job["history"]["epoch"], [4])
+        self.assertEqual(job["history_since"], 3)
+        self.assertEqual(job["latest"], {"train_loss": 0.1})
+        self.assertNotIn("traceback", job)
+        self.assertIsNone(job_store.load_job("missing"))
+
+    def test_terminal_status_sets_finished_at(self):
+        job_id = self.save(status="error", traceback="Traceback ...")
+        self.assertIsNotNone(TrainingJob.objects.get(job_id=job_id).finished_at)
+        self.assertEqual(job_store.load_job(job_id)["traceback"], "Traceback ...")
+
+    def test_stale_running_job_reads_as_error(self):
+        job_id = self.save()
+        self.age(job_id, job_store.STALE_JOB_SECONDS + 60)
+        job = job_store.load_job(job_id)
+        self.assertEqual(job["status"], "error")
+        self.assertIn("进程已退出", job["message"])
+
+    def test_long_queued_job_is_not_stale(self):
+        job_id = self.save(status="queued", epochs=0)
+        self.age(job_id, job_store.STALE_JOB_SECONDS + 60)
+        self.assertEqual(job_store.load_job(job_id)["status"], "queued")
+
+    def test_prune_removes_old_finished_and_abandoned_jobs(self):
+        recent = self.save(status="finished")
+        old = self.save(status="finished")
+        self.age(old, 0, finished_at=timezone.now() - timedelta(seconds=job_store.FINISHED_JOB_TTL + 60))
+        running = self.save()
+        abandoned = self.save()
+        self.age(abandoned, job_store.FINISHED_JOB_TTL + 60)
+        self.assertEqual(job_store.prune_jobs(), 2)
+        self.assertEqual(set(TrainingJob.objects.values_list("job_id", flat=True)), {recent, running})
+
+
+class StartTrainingJobTests(LocalJobTestCase):
+    def test_queued_job_is_persisted(self):
+        scheduler = mock.Mock()
+        with mock.patch.object(trainer, "_get_scheduler", return_value=scheduler):
+            job_id = trainer.start_training_job(small_config(), user="u")
+        scheduler.submit.assert_called_once()
+        self.assertEqual(TrainingJob.objects.get(job_id=job_id).status, "queued")
+
+    def test_rejected_job_is_not_left_behind(self):
+        scheduler = mock.Mock(**{"submit.side_effect": QueueFull("排队的任务太多")})
+        with mock.patch.object(trainer, "_get_scheduler", return_value=scheduler), self.assertRaises(QueueFull):
+            trainer.start_training_job(small_config(), user="u")
+        self.assertFalse(TrainingJob.objects.exists())
+        self.assertEqual(trainer.TRAINING_JOBS, {})
+
+
+class StartTrainingApiTests(TestCase):
+    def post(self):
+        return self.client.post("/deeplearning/start-training/", DEFAULT_FORM_DATA)
+
+    def test_full_queue_is_too_many_requests(self):
+        with mock.patch("deeplearning.views.start_training_job", side_effect=QueueFull("排队的任务太多")):
+            resp = self.post()
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(resp.json()["message"], "排队的任务太多")
+
+    def test_limits_by_session_or_user(self):
+        with mock.patch("deeplearning.views.start_training_job", return_value="job-1") as start:
+            self.assertEqual(self.post().json()["job_id"], "job-1")
+            self.assertTrue(start.call_args.kwargs["user"].startswith("session:"))
+            self.assertEqual(start.call_args.kwargs["priority"], 0)
+
+            staff = User.objects.create_user("staff", is_staff=True)
+            self.client.force_login(staff)
+            self.post()
+            self.assertEqual(start.call_args.kwargs["user"], f"user:{staff.pk}")
+            self.assertEqual(start.call_args.kwargs["priority"], 1)
+
+    def test_invalid_form(self):
+        resp = self.client.post("/deeplearning/start-training/", {**DEFAULT_FORM_DATA, "epochs": "x"})
+        self.assertEqual(resp.status_code, 400)
+
+
+class IncrementalStatusTests(LocalJobTestCase):
+    def test_since_returns_only_new_epochs(self):
+        job_id = register_job()
+        self.run_epochs(job_id, [1, 2, 3])
+        job = trainer.get_training_job(job_id, since=2)
+        self.assertEqual(job["history"]["epoch"], [3])
+        self.assertEqual(job["history"]["train_loss"], [1.0 / 3])
+        self.assertEqual(job["history_since"], 2)
+        self.assertEqual(job["current_epoch"], 3)
+        self.assertEqual(trainer.get_training_job(job_id)["history"]["epoch"], [1, 2, 3])
+
+    def test_snapshot_is_a_copy(self):
+        job_id = register_job()
+        self.run_epochs(job_id, [1])
+        job = trainer.get_training_job(job_id)
+        self.run_epochs(job_id, [2])
+        self.assertEqual(job["history"]["epoch"], [1])
+
+    def test_finished_job_is_read_from_database(self):
+        job_id = register_job()
+        self.run_epochs(job_id, [1, 2])
+        trainer._update_job(job_id, status="finished")
+        self.assertIsNone(trainer._get_local(job_id)[0])
+        job = trainer.get_training_job(job_id, since=1)
+        self.assertEqual((job["status"], job["history"]["epoch"]), ("finished", [2]))
+
+    def test_status_api(self):
+        job_id = register_job()
+        self.run_epochs(job_id, [1, 2])
+        for since, epochs in (("1", [2]), ("-3", [1, 2]), ("abc", [1, 2])):
+            with self.subTest(since=since):
+                resp = self.client.get(f"/deeplearning/training-status/{job_id}/", {"since": since})
+                self.assertEqual(resp.json()["job"]["history"]["epoch"], epochs)
+        self.assertEqual(self.client.get("/deeplearning/training-status/missing/").status_code, 404)
+
+
+def parse_sse(chunks) -> list:
+    """SSE 文本 -> [(id, event, data)]，跳过 keep-alive 注释"""
+    events = []
+    for block in "".join(chunks).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class WatchTrainingJobTests(LocalJobTestCase):
+    def setUp(self):
+        # 训练线程里的状态更新不落库：测试数据库的事务只对测试线程可见
+        patcher = mock.patch.object(job_store, "save_job")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def train_in_background(self, job_id, epochs):
+        def train():
+            time.sleep(0.05)
+            self.run_epochs(job_id, range(1, epochs + 1))
+            trainer._update_job(job_id, status="finished", message="训练完成。")
+
+        thread = threading.Thread(target=train)
+        thread.start()
+        self.addCleanup(thread.join)
+
+    def test_yields_new_epochs_until_finished(self):
+        job_id = register_job(epochs=3)
+        self.train_in_background(job_id, 3)
+        snapshots = [job for job in trainer.watch_training_job(job_id, keepalive=5) if job is not None]
+        self.assertEqual(snapshots[-1]["status"], "finished")
+        # 每份快照只带上一份之后的新轮次，拼起来正好是完整历史
+        sent = 0
+        for job in snapshots:
+            self.assertEqual(job["history_since"], sent)
+            self.assertEqual(job["history"]["epoch"], list(range(sent + 1, sent + 1 + len(job["history"]["epoch"]))))
+            sent += len(job["history"]["epoch"])
+        self.assertEqual(sent, 3)
+
+    def test_keepalive_when_nothing_changes(self):
+        job_id = register_job()
+        watch = trainer.watch_training_job(job_id, keepalive=0.05)
+        self.assertEqual(next(watch)["status"], "running")
+        self.assertIsNone(next(watch))
+        trainer._report_progress(job_id, epoch=1, batch=3, batches=10, train_loss=0.5)
+        self.assertEqual(next(watch)["progress"]["batch"], 3)
+
+    def test_unknown_job_stops_immediately(self):
+        with mock.patch.object(job_store, "load_job", return_value=None):
+            self.assertEqual(list(trainer.watch_training_job("missing")), [])
+
+
+class TrainingStreamApiTests(TestCase):
+    def save_finished(self, epochs):
+        job_id = uuid.uuid4().hex
+        job_store.save_job({
+            "job_id": job_id, "status": "finished", "message": "训练完成。", "current_epoch": epochs,
+            "total_epochs": epochs, "device": "cpu", "latest": {}, "traceback": "secret",
+            "history": {key: list(range(1, epochs + 1))
+                        for key in ("epoch", "train_loss", "test_loss", "train_acc", "test_acc")},
+        })
+        return job_id
+
+    def stream(self, job_id, params=None, **headers):
+        resp = self.client.get(f"/deeplearning/training-stream/{job_id}/", params, **headers)
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        return parse_sse(chunk.decode() for chunk in resp.streaming_content)
+
+    def test_unknown_job_is_not_found(self):
+        self.assertEqual(self.client.get("/deeplearning/training-stream/missing/").status_code, 404)
+
+    def test_finished_job_sends_single_end_event(self):
+        job_id = self.save_finished(3)
+        [(event_id, event, job)] = self.stream(job_id)
+        self.assertEqual((event_id, event), ("3", "end"))
+        self.assertEqual(job["history"]["epoch"], [1, 2, 3])
+        self.assertNotIn("traceback", job)
+
+    def test_resumes_from_last_event_id(self):
+        job_id = self.save_finished(3)
+        [(event_id, _, job)] = self.stream(job_id, HTTP_LAST_EVENT_ID="2")
+        self.assertEqual(event_id, "3")
+        self.assertEqual(job["history"]["epoch"], [3])
+        [(_, _, job)] = self.stream(job_id, {"since": 1})
+        self.assertEqual(job["history"]["epoch"], [2, 3])
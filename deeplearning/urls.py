@@ -9,4 +9,5 @@ urlpatterns = [
     path("generate-code/", views.generate_code_api, name="generate_code"),
     path("start-training/", views.start_training_api, name="start_training"),
     path("training-status/<str:job_id>/", views.training_status_api, name="training_status"),
+    path("training-stream/<str:job_id>/", views.training_stream_api, name="training_stream"),
 ]
\ No newline at end of file
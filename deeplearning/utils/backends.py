@@ -0,0 +1,121 @@
+import logging
+import multiprocessing as mp
+
+logger = logging.getLogger(__name__)
+
+# 训练任务的执行后端：
+#   thread  —— 在 Django 进程的调度线程里直接训练（开发时调试方便）；
+#   process —— 每个任务一个子进程，GIL 与 PyTorch 的内存分配都不落在 Django 进程里，崩溃也只影响该任务。
+TRAINING_BACKENDS = ("thread", "process")
+
+_TERMINAL = ("finished", "error")
+
+
+def _get_context():
+    # forkserver 预加载 trainer（torch / sklearn）：子进程直接从预热好的进程 fork，不必每次重新导入，
+    # 也不会继承 Django 进程里的线程和锁。forkserver 是全进程共享的，若已被其它模块先启动，
+    # 子进程会在第一次用到时自行导入 trainer。
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload(["deeplearning.utils.trainer"])
+        return ctx
+    return mp.get_context("spawn")
+
+
+def _process_main(conn, job_id: str, config: dict, threads: int):
+    import torch
+
+    from deeplearning.utils import trainer
+
+    torch.set_num_threads(threads)
+
+    def update(job_id, **fields):
+        conn.send(("update", fields))
+
+    def append_history(job_id, **metrics):
+        conn.send(("history", metrics))
+
+    def report_progress(job_id, **progress):
+        conn.send(("progress", progress))
+
+    try:
+        trainer._run_training_job(
+            job_id, config, update=update, append_history=append_history, report_progress=report_progress
+        )
+    finally:
+        conn.close()
+
+
+class ProcessBackend:
+    """
+    在独立子进程里执行一个训练任务（调度器 worker 线程调用，阻塞到任务结束）。
+    子进程把状态更新、每轮指标、批次进度经管道发回，这里转给 update / append_history / report_progress
+    写入本进程的任务表，所以 get_training_job 返回的 JSON 与线程后端完全一致。
+    子进程没报告结束就退出（段错误、被 OOM killer 杀掉等）时，把任务标记为 error；
+    管道读出坏消息或转发时写入失败（例如数据库不可用）时，结束子进程，同样标记为 error。
+    异常不会抛给调度器的 worker 线程。
+    """
+
+    def __init__(self, update, append_history, report_progress, threads_per_job: int = 1):
+        self.update = update
+        self.append_history = append_history
+        self.report_progress = report_progress
+        self.threads_per_job = max(1, int(threads_per_job))
+
+    def __call__(self, job_id: str, config: dict):
+        ctx = _get_context()
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        proc = ctx.Process(
+            target=_process_main,
+            args=(child_conn, job_id, config, self.threads_per_job),
+            daemon=True,
+        )
+        try:
+            proc.start()
+        except Exception as e:
+            parent_conn.close()
+            self._fail(job_id, f"训练进程启动失败：{type(e).__name__}: {e}")
+            return
+        finally:
+            child_conn.close()
+
+        status = None
+        failure = None
+        try:
+            while True:
+                try:
+                    kind, data = parent_conn.recv()
+                except (EOFError, OSError):
+                    break
+                try:
+                    if kind == "update":
+                        self.update(job_id, **data)
+                        status = data.get("status", status)
+                    elif kind == "history":
+                        self.append_history(job_id, **data)
+                    else:
+                        self.report_progress(job_id, **data)
+                except Exception as e:
+                    # 状态没能记下来，任务已经无法跟踪，不再让子进程继续训练
+                    logger.exception("训练任务 %s 的状态更新失败", job_id)
+                    failure = f"训练状态写入失败：{type(e).__name__}: {e}"
+                    proc.kill()
+                    break
+        except Exception as e:
+            logger.exception("训练任务 %s 的子进程消息读取失败", job_id)
+            failure = f"训练进程通信失败：{type(e).__name__}: {e}"
+            proc.kill()
+        finally:
+            parent_conn.close()
+            proc.join()
+
+        if failure is not None:
+            self._fail(job_id, failure)
+        elif status not in _TERMINAL:
+            self._fail(job_id, f"训练进程异常退出（exit code {proc.exitcode}）")
+
+    def _fail(self, job_id: str, message: str):
+        try:
+            self.update(job_id, status="error", message=message)
+        except Exception:
+            logger.exception("训练任务 %s 的错误状态写入失败", job_id)
@@ -0,0 +1,107 @@
+import json
+from datetime import timedelta
+
+# 数据库里的训练任务记录（deeplearning.models.TrainingJob）。
+# 模型在函数里按需导入：trainer 也会在训练子进程里被导入，那里没有初始化 Django。
+
+# 已结束的任务保留多久（秒），超过后在下一次提交时清理
+FINISHED_JOB_TTL = 24 * 3600
+# 训练中的任务每轮都会更新，超过这么久没有任何更新，视为所在进程已经退出（重启、崩溃）。
+# 排队中的任务在开始训练前本来就不会更新，不做这个判断
+STALE_JOB_SECONDS = 30 * 60
+
+_METRICS = ("train_loss", "test_loss", "train_acc", "test_acc")
+_TERMINAL = ("finished", "error")
+
+
+def _round(value):
+    return None if value is None else float(f"{value:.6g}")
+
+
+def compact_history(history: dict) -> str:
+    """epoch 恒为 1..n，只存条数；指标保留 6 位有效数字；整列为 None（回归任务的准确率）存 null"""
+    data = {"n": len(history["epoch"])}
+    for key in _METRICS:
+        column = history[key]
+        data[key] = None if all(v is None for v in column) else [_round(v) for v in column]
+    return json.dumps(data, separators=(",", ":"))
+
+
+def expand_history(text: str) -> dict:
+    data = json.loads(text) if text else {"n": 0}
+    n = data["n"]
+    history = {"epoch": list(range(1, n + 1))}
+    for key in _METRICS:
+        history[key] = data.get(key) or [None] * n
+    return history
+
+
+def save_job(job: dict):
+    """把内存里的任务状态整体写入数据库（没有就新建）"""
+    from django.utils import timezone
+
+    from deeplearning.models import TrainingJob
+
+    TrainingJob.objects.update_or_create(
+        job_id=job["job_id"],
+        defaults={
+            "status": job["status"],
+            "message": job.get("message", ""),
+            "current_epoch": job.get("current_epoch", 0),
+            "total_epochs": job.get("total_epochs", 0),
+            "device": job.get("device", ""),
+            "history": compact_history(job["history"]),
+            "latest": job.get("latest") or {},
+            "traceback": job.get("traceback", ""),
+            "finished_at": timezone.now() if job["status"] in _TERMINAL else None,
+        },
+    )
+
+
+def load_job(job_id: str, since: int = 0):
+    """按 get_training_job 的格式返回任务（history 只含第 since 轮之后的部分）；不存在返回 None"""
+    from django.utils import timezone
+
+    from deeplearning.models import TrainingJob
+
+    record = TrainingJob.objects.filter(job_id=job_id).first()
+    if record is None:
+        return None
+    job = {
+        "job_id": record.job_id,
+        "status": record.status,
+        "message": record.message,
+        "current_epoch": record.current_epoch,
+        "total_epochs": record.total_epochs,
+        "device": record.device,
+        "history": {key: values[since:] for key, values in expand_history(record.history).items()},
+        "history_since": since,
+        "latest": record.latest,
+    }
+    if record.traceback:
+        job["traceback"] = record.traceback
+    if record.status == "running" and timezone.now() - record.updated_at > timedelta(seconds=STALE_JOB_SECONDS):
+        job["status"] = "error"
+        job["message"] = "训练任务所在的进程已退出（服务重启或崩溃），任务已中断。"
+    return job
+
+
+def delete_job(job_id: str):
+    from deeplearning.models import TrainingJob
+
+    TrainingJob.objects.filter(job_id=job_id).delete()
+
+
+def prune_jobs(ttl: float = FINISHED_JOB_TTL) -> int:
+    """删除结束超过 ttl 秒的任务，以及长时间没有更新的中断任务"""
+    from django.db.models import Q
+    from django.utils import timezone
+
+    from deeplearning.models import TrainingJob
+
+    now = timezone.now()
+    deleted, _ = TrainingJob.objects.filter(
+        Q(finished_at__lt=now - timedelta(seconds=ttl))
+        | Q(finished_at__isnull=True, updated_at__lt=now - timedelta(seconds=max(ttl, STALE_JOB_SECONDS)))
+    ).delete()
+    return deleted
@@ -0,0 +1,135 @@
+import heapq
+import itertools
+import logging
+import os
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(RuntimeError):
+    """同一用户排队中的训练任务已达上限"""
+
+
+def default_threads_per_job(max_workers: int) -> int:
+    """CPU 核数平分给各 worker"""
+    return max(1, (os.cpu_count() or 1) // max(1, int(max_workers)))
+
+
+class TrainingScheduler:
+    """
+    有界的训练调度器：固定数量的 worker 线程从优先队列里取任务执行。
+    - priority 大的先跑，同优先级按提交顺序（FIFO）；
+    - 同一用户同时运行的任务不超过 max_running_per_user，超出的留在队列里，先跑其他用户的任务；
+    - 同一用户排队中的任务不超过 max_queued_per_user，超出时 submit 抛 QueueFull；
+    - 每个 worker 启动时调用 set_num_threads(threads_per_job)，各 worker 平分 CPU 核，
+      不会出现 N 个任务各开满核数的线程互相抢占；
+    - run_job 抛出的异常记日志并交给 on_error(job_id, exc)，worker 继续取下一个任务，
+      不会因为一个任务出错而少一个 worker。
+    """
+
+    def __init__(self, run_job, max_workers: int = 2, max_running_per_user: int = 1,
+                 max_queued_per_user: int = 5, threads_per_job: int | None = None, set_num_threads=None,
+                 on_error=None):
+        self.run_job = run_job
+        self.on_error = on_error
+        self.max_workers = max(1, int(max_workers))
+        self.max_running_per_user = max(1, int(max_running_per_user))
+        self.max_queued_per_user = max(1, int(max_queued_per_user))
+        self.threads_per_job = int(threads_per_job or default_threads_per_job(self.max_workers))
+        self.set_num_threads = set_num_threads
+        self._heap = []
+        self._seq = itertools.count()
+        self._queued = Counter()
+        self._running = Counter()
+        self._workers = []
+        self._cond = threading.Condition()
+
+    def submit(self, job_id: str, payload, user=None, priority: int = 0):
+        with self._cond:
+            if self._queued[user] >= self.max_queued_per_user:
+                raise QueueFull(f"排队中的训练任务已达上限（{self.max_queued_per_user} 个），请等待前面的任务开始后再提交。")
+            heapq.heappush(self._heap, (-int(priority), next(self._seq), job_id, user, payload))
+            self._queued[user] += 1
+            if len(self._workers) < self.max_workers:
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    name=f"training-worker-{len(self._workers)}",
+                    daemon=True,
+                )
+                self._workers.append(worker)
+                worker.start()
+            self._cond.notify_all()
+
+    def _pop_runnable(self):
+        """按调度顺序取第一个所属用户还没达到并发上限的任务（调用方持有锁）"""
+        for entry in sorted(self._heap):
+            if self._running[entry[3]] < self.max_running_per_user:
+                self._heap.remove(entry)
+                heapq.heapify(self._heap)
+                return entry
+        return None
+
+    def _worker_loop(self):
+        if self.set_num_threads is not None:
+            self.set_num_threads(self.threads_per_job)
+        while True:
+            with self._cond:
+                entry = self._pop_runnable()
+                while entry is None:
+                    self._cond.wait()
+                    entry = self._pop_runnable()
+                _, _, job_id, user, payload = entry
+                self._queued[user] -= 1
+                self._running[user] += 1
+            try:
+                self.run_job(job_id, payload)
+            except Exception as e:
+                logger.exception("训练任务 %s 执行失败", job_id)
+                self._report_error(job_id, e)
+            finally:
+                with self._cond:
+                    self._running[user] -= 1
+                    self._cond.notify_all()
+
+    def _report_error(self, job_id: str, error: Exception):
+        if self.on_error is None:
+            return
+        try:
+            self.on_error(job_id, error)
+        except Exception:
+            logger.exception("训练任务 %s 的错误状态写入失败", job_id)
+
+    def position(self, job_id: str):
+        """
+        排队中的任务返回 (第几个开始, 队列长度)，已开始或不存在返回 None。
+        按 _pop_runnable 的规则模拟出队顺序，所属用户已达并发上限的任务会被排在后面；
+        任务何时结束无法预知，所有任务都在等自己用户的任务结束时，假设排在最前的那个用户先空出名额，
+        所以结果是估计值。
+        """
+        with self._cond:
+            pending = sorted(self._heap)
+            total = len(pending)
+            running = Counter(self._running)
+            for rank in range(1, total + 1):
+                for index, entry in enumerate(pending):
+                    if running[entry[3]] < self.max_running_per_user:
+                        break
+                else:
+                    index = 0
+                    running[pending[0][3]] -= 1
+                entry = pending.pop(index)
+                if entry[2] == job_id:
+                    return rank, total
+                running[entry[3]] += 1
+        return None
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "workers": self.max_workers,
+                "threads_per_job": self.threads_per_job,
+                "queued": len(self._heap),
+                "running": sum(self._running.values()),
+            }
@@ -1,4 +1,4 @@
-import copy
+import logging
 import threading
 import time
 import traceback
@@ -12,15 +12,52 @@ from sklearn.datasets import load_breast_cancer, load_digits, load_iris
 from sklearn.model_selection import train_test_split
 from torch.utils.data import DataLoader, TensorDataset
 
+from . import job_store
+from .backends import TRAINING_BACKENDS, ProcessBackend
+from .scheduler import QueueFull, TrainingScheduler, default_threads_per_job
+
 try:
     from torchvision import datasets, transforms
     HAS_TORCHVISION = True
 except Exception:
     HAS_TORCHVISION = False
 
+logger = logging.getLogger(__name__)
 
+# 本进程正在排队 / 训练的任务（写入时同步落库）；结束后只留在数据库里，任何 web 进程都能查到。
+# TRAINING_LOCK 只保护字典本身的增删，任务内容的读写用各自的锁，轮询不会和其它任务的训练线程互相等待。
+# 每个任务的锁是条件变量：内容变化时 version 加一并通知，实时推送（watch_training_job）据此唤醒
 TRAINING_JOBS = {}
 TRAINING_LOCK = threading.Lock()
+_JOB_LOCKS = {}
+
+# 实时推送：没有变化时多久产出一次心跳；不在本进程的任务多久查一次数据库
+WATCH_KEEPALIVE_SECONDS = 10
+WATCH_POLL_SECONDS = 1
+
+# 训练任务统一交给有界调度器，不再每个请求开一个线程
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def _get_scheduler(backend: str = "thread", **options) -> TrainingScheduler:
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            if backend not in TRAINING_BACKENDS:
+                raise ValueError(f"不支持的训练后端：{backend}")
+            options["threads_per_job"] = options.get("threads_per_job") or default_threads_per_job(
+                options.get("max_workers", 2)
+            )
+            if backend == "process":
+                # 线程数在子进程里设置，调度线程本身不跑 PyTorch
+                run_job = ProcessBackend(_update_job, _append_history, _report_progress, options["threads_per_job"])
+                _SCHEDULER = TrainingScheduler(run_job, on_error=_fail_job, **options)
+            else:
+                _SCHEDULER = TrainingScheduler(
+                    _run_training_job, set_num_threads=torch.set_num_threads, on_error=_fail_job, **options
+                )
+        return _SCHEDULER
 
 DATASET_TASK_MAP = {
     "normal_regression": "regression",
@@ -33,7 +70,21 @@ DATASET_TASK_MAP = {
 }
 
 
-def start_training_job(config: dict) -> str:
+def start_training_job(config: dict, user=None, priority: int = 0, max_workers: int = 2,
+                       max_running_per_user: int = 1, max_queued_per_user: int = 5,
+                       threads_per_job: int | None = None, backend: str = "thread") -> str:
+    """
+    创建训练任务并放进调度队列，立即返回 job_id；user 用于按用户限制并发，priority 大的先跑。
+    backend 见 backends.TRAINING_BACKENDS。调度器参数与 backend 只在第一次调用时生效。
+    同一用户排队的任务过多时抛 QueueFull。
+    """
+    scheduler = _get_scheduler(
+        backend=backend,
+        max_workers=max_workers,
+        max_running_per_user=max_running_per_user,
+        max_queued_per_user=max_queued_per_user,
+        threads_per_job=threads_per_job,
+    )
     job_id = uuid.uuid4().hex
     device = "cuda" if torch.cuda.is_available() else "cpu"
 
@@ -52,47 +103,180 @@ def start_training_job(config: dict) -> str:
             "test_acc": [],
         },
         "latest": {},
+        "progress": None,
+        "version": 0,
     }
 
+    job_store.prune_jobs()
+    # 先落库再入队：任务一旦开始，后续的状态更新都是在这条记录上修改
+    job_store.save_job(job_data)
     with TRAINING_LOCK:
         TRAINING_JOBS[job_id] = job_data
+        _JOB_LOCKS[job_id] = threading.Condition()
 
-    thread = threading.Thread(
-        target=_run_training_job,
-        args=(job_id, config),
-        daemon=True,
-    )
-    thread.start()
+    try:
+        scheduler.submit(job_id, config, user=user, priority=priority)
+    except QueueFull:
+        _forget_job(job_id)
+        job_store.delete_job(job_id)
+        raise
     return job_id
 
 
-def get_training_job(job_id: str):
+def _get_local(job_id: str):
     with TRAINING_LOCK:
-        job = TRAINING_JOBS.get(job_id)
-        return copy.deepcopy(job) if job else None
+        return TRAINING_JOBS.get(job_id), _JOB_LOCKS.get(job_id)
 
 
-def _update_job(job_id: str, **kwargs):
+def _forget_job(job_id: str):
     with TRAINING_LOCK:
-        if job_id in TRAINING_JOBS:
-            TRAINING_JOBS[job_id].update(kwargs)
+        TRAINING_JOBS.pop(job_id, None)
+        _JOB_LOCKS.pop(job_id, None)
+
+
+def _snapshot(job: dict, since: int = 0) -> dict:
+    """
+    复制状态字段，历史只切出第 since 轮之后的部分（调用方持有该任务的锁）。
+    指标都是 float / None，切片即可，不需要 deepcopy。
+    """
+    out = {k: v for k, v in job.items() if k not in ("history", "latest")}
+    out["latest"] = dict(job["latest"])
+    out["history"] = {key: values[since:] for key, values in job["history"].items()}
+    out["history_since"] = since
+    return out
+
+
+def get_training_job(job_id: str, since: int = 0):
+    """
+    since：客户端已经拿到的轮数。history 只返回第 since+1 轮起的新数据点，
+    轮询开销不随总轮数增长；默认 0 返回完整历史。
+    """
+    since = max(0, int(since or 0))
+    job, lock = _get_local(job_id)
+    if job is None:
+        return job_store.load_job(job_id, since=since)
+    with lock:
+        job = _snapshot(job, since)
+    return _with_queue_position(job)
+
+
+def _with_queue_position(job: dict) -> dict:
+    if job["status"] == "queued" and _SCHEDULER is not None:
+        position = _SCHEDULER.position(job["job_id"])
+        if position:
+            job["queue_position"], job["queue_length"] = position
+            job["message"] = f"排队中，前面还有 {position[0] - 1} 个任务。"
+    return job
+
+
+def watch_training_job(job_id: str, since: int = 0, keepalive: float = WATCH_KEEPALIVE_SECONDS):
+    """
+    生成器：任务每有变化（新的一轮、批次进度、状态）就产出一份增量快照，格式同 get_training_job，
+    history 只含上次产出之后的新轮次；keepalive 秒内没有变化时产出 None（调用方据此发心跳）。
+    任务结束后产出最后一份快照即停止；任务不存在时直接停止。
+    本进程里的任务在条件变量上等待通知；其它进程的任务（或已结束、只在数据库里的）定时查数据库。
+    """
+    since = max(0, int(since or 0))
+    seen_version = None
+    seen_state = None
+    idle = 0.0
+    while True:
+        job, cond = _get_local(job_id)
+        if job is not None:
+            with cond:
+                if job["version"] == seen_version:
+                    cond.wait(keepalive)
+                changed = job["version"] != seen_version
+                seen_version = job["version"]
+                snapshot = _snapshot(job, since)
+            # 排队名次变化不会通知，排队中的任务每次心跳都带上最新名次
+            if not changed and snapshot["status"] != "queued":
+                yield None
+                continue
+            snapshot = _with_queue_position(snapshot)
+        else:
+            snapshot = job_store.load_job(job_id, since=since)
+            if snapshot is None:
+                return
+            state = (snapshot["status"], snapshot["message"], snapshot["current_epoch"])
+            if state == seen_state:
+                time.sleep(WATCH_POLL_SECONDS)
+                idle += WATCH_POLL_SECONDS
+                if idle >= keepalive:
+                    idle = 0.0
+                    yield None
+                continue
+            seen_state, idle = state, 0.0
+
+        since += len(snapshot["history"]["epoch"])
+        yield snapshot
+        if snapshot["status"] in ("finished", "error"):
+            return
+
+
+def _update_job(job_id: str, **kwargs):
+    job, lock = _get_local(job_id)
+    if job is None:
+        return
+    with lock:
+        job.update(kwargs)
+        job["version"] += 1
+        lock.notify_all()
+        snapshot = _snapshot(job)
+    job_store.save_job(snapshot)
+    if snapshot["status"] in ("finished", "error"):
+        _forget_job(job_id)
+
+
+def _fail_job(job_id: str, error: Exception):
+    """
+    调度器兜底：run_job 自己没能把任务标记为结束就抛出了异常（通常是写数据库失败）。
+    内存里的状态先改为 error，轮询本进程马上能看到；落库再失败也只记日志，任务留在内存表里。
+    """
+    try:
+        _update_job(
+            job_id,
+            status="error",
+            message=f"训练任务异常终止：{type(error).__name__}: {error}",
+            traceback="".join(traceback.format_exception(error)),
+        )
+    except Exception:
+        logger.exception("训练任务 %s 的错误状态落库失败", job_id)
 
 
 def _append_history(job_id: str, epoch, train_loss, test_loss, train_acc, test_acc):
-    with TRAINING_LOCK:
-        history = TRAINING_JOBS[job_id]["history"]
+    """只改内存；每轮结束紧接着的 _update_job(current_epoch=...) 会连同历史一起落库"""
+    job, lock = _get_local(job_id)
+    if job is None:
+        return
+    with lock:
+        history = job["history"]
         history["epoch"].append(epoch)
         history["train_loss"].append(train_loss)
         history["test_loss"].append(test_loss)
         history["train_acc"].append(train_acc)
         history["test_acc"].append(test_acc)
 
-        TRAINING_JOBS[job_id]["latest"] = {
+        job["latest"] = {
             "train_loss": train_loss,
             "test_loss": test_loss,
             "train_acc": train_acc,
             "test_acc": test_acc,
         }
+        job["progress"] = None
+        job["version"] += 1
+        lock.notify_all()
+
+
+def _report_progress(job_id: str, **progress):
+    """一轮之内的批次进度（epoch、batch、batches、train_loss），只用于实时推送，不落库"""
+    job, lock = _get_local(job_id)
+    if job is None:
+        return
+    with lock:
+        job["progress"] = progress
+        job["version"] += 1
+        lock.notify_all()
 
 
 def _get_activation(name: str):
@@ -447,11 +631,18 @@ def _evaluate(model, loader, criterion, task_type, device):
     return avg_loss, acc
 
 
-def _run_training_job(job_id: str, config: dict):
+def _run_training_job(job_id: str, config: dict, update=None, append_history=None, report_progress=None):
+    """
+    update / append_history / report_progress 默认直接写本进程的任务表；进程后端在子进程里换成发回父进程的管道。
+    config["progress_every_batches"] > 0 时每隔这么多个批次报告一次本轮的平均训练损失。
+    """
+    update = update or _update_job
+    append_history = append_history or _append_history
+    report_progress = report_progress or _report_progress
     try:
         device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-        _update_job(
+        update(
             job_id,
             status="running",
             device=str(device),
@@ -468,6 +659,8 @@ def _run_training_job(job_id: str, config: dict):
             criterion = nn.CrossEntropyLoss()
 
         epochs = int(config["epochs"])
+        progress_every = int(config.get("progress_every_batches") or 0)
+        num_batches = len(train_loader)
 
         for epoch in range(1, epochs + 1):
             model.train()
@@ -475,7 +668,7 @@ def _run_training_job(job_id: str, config: dict):
             train_samples = 0
             train_correct = 0
 
-            for xb, yb in train_loader:
+            for batch_index, (xb, yb) in enumerate(train_loader, 1):
                 xb = _prepare_x(xb).to(device, non_blocking=True)
                 yb = yb.to(device, non_blocking=True)
 
@@ -492,6 +685,15 @@ def _run_training_job(job_id: str, config: dict):
                 if task_type == "classification":
                     train_correct += (pred.argmax(dim=1) == yb).sum().item()
 
+                if progress_every and batch_index % progress_every == 0 and batch_index < num_batches:
+                    report_progress(
+                        job_id,
+                        epoch=epoch,
+                        batch=batch_index,
+                        batches=num_batches,
+                        train_loss=float(train_loss_sum / train_samples),
+                    )
+
             train_loss = train_loss_sum / max(train_samples, 1)
 
             if task_type == "classification":
@@ -501,7 +703,7 @@ def _run_training_job(job_id: str, config: dict):
 
             test_loss, test_acc = _evaluate(model, test_loader, criterion, task_type, device)
 
-            _append_history(
+            append_history(
                 job_id=job_id,
                 epoch=epoch,
                 train_loss=float(train_loss),
@@ -510,7 +712,7 @@ def _run_training_job(job_id: str, config: dict):
                 test_acc=(float(test_acc) if test_acc is not None else None),
             )
 
-            _update_job(
+            update(
                 job_id,
                 current_epoch=epoch,
                 message=f"第 {epoch}/{epochs} 轮训练完成，当前设备：{device}",
@@ -519,14 +721,14 @@ def _run_training_job(job_id: str, config: dict):
             # 这一句原来是 0.15，会明显拖慢训练
             time.sleep(0.02)
 
-        _update_job(
+        update(
             job_id,
             status="finished",
             message=f"训练完成，使用设备：{device}",
         )
 
     except Exception as e:
-        _update_job(
+        update(
             job_id,
             status="error",
             message=f"{type(e).__name__}: {str(e)}",
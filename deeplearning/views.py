@@ -1,10 +1,14 @@
-from django.http import JsonResponse
+import json
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.decorators.http import require_GET, require_POST
 
 from .forms import DATASET_CHOICES, DEFAULT_FORM_DATA, DeepLearningBuilderForm
 from .utils.code_generator import generate_pytorch_code
-from .utils.trainer import get_training_job, start_training_job
+from .utils.scheduler import QueueFull
+from .utils.trainer import get_training_job, start_training_job, watch_training_job
 
 DATASET_TASK_MAP = {
     "normal_regression": "regression",
@@ -35,6 +39,15 @@ def _normalize_config(raw_data: dict) -> dict:
     return config
 
 
+def _user_key(request) -> str:
+    """按用户限制训练并发：登录用户按账号，匿名用户按会话（没有会话时退回 IP）"""
+    if request.user.is_authenticated:
+        return f"user:{request.user.pk}"
+    if request.session.session_key is None:
+        request.session.save()
+    return f"session:{request.session.session_key or request.META.get('REMOTE_ADDR', '')}"
+
+
 @require_GET
 def builder(request):
     form = DeepLearningBuilderForm(initial=DEFAULT_FORM_DATA)
@@ -84,8 +97,21 @@ def start_training_api(request):
         )
 
     config = _normalize_config(form.cleaned_data)
-
-    job_id = start_training_job(config)
+    config["progress_every_batches"] = getattr(settings, "DEEPLEARNING_PROGRESS_EVERY_BATCHES", 20)
+
+    try:
+        job_id = start_training_job(
+            config,
+            user=_user_key(request),
+            priority=1 if request.user.is_staff else 0,
+            max_workers=getattr(settings, "DEEPLEARNING_TRAINING_WORKERS", 2),
+            max_running_per_user=getattr(settings, "DEEPLEARNING_MAX_RUNNING_PER_USER", 1),
+            max_queued_per_user=getattr(settings, "DEEPLEARNING_MAX_QUEUED_PER_USER", 3),
+            threads_per_job=getattr(settings, "DEEPLEARNING_THREADS_PER_JOB", None),
+            backend=getattr(settings, "DEEPLEARNING_TRAINING_BACKEND", "thread"),
+        )
+    except QueueFull as e:
+        return JsonResponse({"ok": False, "message": str(e)}, status=429)
 
     return JsonResponse(
         {
@@ -99,7 +125,12 @@ def start_training_api(request):
 
 @require_GET
 def training_status_api(request, job_id):
-    job = get_training_job(job_id)
+    # ?since=N：只返回第 N 轮之后的新历史点，前端自行拼接
+    try:
+        since = max(0, int(request.GET.get("since", 0)))
+    except ValueError:
+        since = 0
+    job = get_training_job(job_id, since=since)
     if not job:
         return JsonResponse(
             {
@@ -114,4 +145,35 @@ def training_status_api(request, job_id):
             "ok": True,
             "job": job,
         }
-    )
\ No newline at end of file
+    )
+
+
+@require_GET
+def training_stream_api(request, job_id):
+    """
+    训练指标的实时推送（text/event-stream），替代定时轮询 training-status：
+    每有新的一轮或批次进度就推一条 job 事件（数据同 training-status 的 job，history 只含新轮次），
+    结束时推 end 事件。事件 id 是已推送的轮数，EventSource 断线重连时凭 Last-Event-ID 续传。
+    """
+    since = request.headers.get("Last-Event-ID") or request.GET.get("since") or 0
+    try:
+        since = max(0, int(since))
+    except ValueError:
+        since = 0
+    if get_training_job(job_id, since=since) is None:
+        return JsonResponse({"ok": False, "message": "找不到该训练任务。"}, status=404)
+
+    def stream():
+        for job in watch_training_job(job_id, since=since):
+            if job is None:
+                yield ": keep-alive\n\n"
+                continue
+            job.pop("traceback", None)
+            event = "end" if job["status"] in ("finished", "error") else "job"
+            sent = job["history_since"] + len(job["history"]["epoch"])
+            yield f"id: {sent}\nevent: {event}\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
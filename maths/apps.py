@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class MathsConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
     name = 'maths'
+
+    def ready(self):
+        # 默认不预热：manage.py 命令也会走到这里，不该为用不到的 SymPy 付导入开销
+        if getattr(settings, "MATHS_WARMUP_ON_START", False):
+            from .warmup import warm_up_in_background
+
+            warm_up_in_background()
@@ -0,0 +1,66 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 一次批量请求最多包含多少个操作
+MAX_BATCH_OPS = 32
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="maths-batch")
+        return _EXECUTOR
+
+
+def _op_key(op: dict) -> str:
+    """规范化后的操作描述：键排序、表达式去首尾空白，用于去重"""
+    canonical = {k: (v.strip() if isinstance(v, str) else v) for k, v in op.items()}
+    return json.dumps(canonical, sort_keys=True, ensure_ascii=False)
+
+
+def _run_one(execute, op: dict, workspace: dict) -> dict:
+    try:
+        return {"ok": True, "data": execute(op, workspace)}
+    except Exception as e:
+        result = {"ok": False, "error": str(e)}
+        if hasattr(e, "as_dict"):
+            result.update(e.as_dict())
+        return result
+
+
+def run_batch(execute, ops: list, workspace: dict | None = None, max_workers: int = 4) -> dict:
+    """
+    批量执行多个互相独立的操作（共享同一个只读 workspace）。
+    完全相同的操作只算一次；不同操作并行提交（符号计算会落到各自的预算进程里真正并行）。
+    单个操作失败不影响其它操作，结果按输入顺序返回。
+    """
+    if not isinstance(ops, list) or not ops:
+        raise ValueError("ops 必须是非空列表")
+    if len(ops) > MAX_BATCH_OPS:
+        raise ValueError(f"一次最多提交 {MAX_BATCH_OPS} 个操作")
+    if not all(isinstance(op, dict) for op in ops):
+        raise ValueError("ops 中的每一项都必须是对象")
+
+    workspace = workspace or {}
+    keys = [_op_key(op) for op in ops]
+    unique = {}
+    for key, op in zip(keys, ops):
+        unique.setdefault(key, op)
+
+    if len(unique) == 1:
+        key, op = next(iter(unique.items()))
+        done = {key: _run_one(execute, op, workspace)}
+    else:
+        executor = _get_executor(max_workers)
+        futures = {key: executor.submit(_run_one, execute, op, workspace) for key, op in unique.items()}
+        done = {key: future.result() for key, future in futures.items()}
+
+    return {
+        "results": [done[key] for key in keys],
+        "deduped": len(ops) - len(unique),
+    }
@@ -0,0 +1,298 @@
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from . import engine
+
+# 基准语料：每个模式若干条有代表性的输入，名字在不同版本之间保持不变，compare 按名字对齐
+CORPUS = {
+    "eval": [
+        ("eval-poly", {"expr": "(x+1)^5 - (x-1)^5"}),
+        ("eval-trig", {"expr": "sin(x)^2 + cos(x)^2 + tan(x)*cos(x)"}),
+        ("eval-rational", {"expr": "(x^3 - 1)/(x - 1) + 1/(x^2 + 2*x + 1)"}),
+    ],
+    "diff": [
+        ("diff-chain", {"expr": "sin(exp(x^2))", "var": "x", "order": 1}),
+        ("diff-high-order", {"expr": "x^3*log(x)*exp(-x)", "var": "x", "order": 4}),
+    ],
+    "integrate": [
+        ("integrate-poly", {"expr": "x^4 - 3*x^2 + 2", "var": "x"}),
+        ("integrate-parts", {"expr": "x^2*exp(x)*sin(x)", "var": "x"}),
+        ("integrate-definite", {"expr": "exp(-x)*cos(x)", "var": "x", "a": "0", "b": "oo"}),
+        ("integrate-numeric", {"expr": "x^x", "var": "x", "a": "0", "b": "1", "strategy": "numeric"}),
+    ],
+    "solve": [
+        ("solve-quadratic", {"expr": "x^2 - 5*x + 6 = 0", "var": "x"}),
+        ("solve-trig", {"expr": "sin(x) = 1/2", "var": "x"}),
+        ("solve-nsolve", {"expr": "cos(x) = x", "var": "x", "method": "numeric", "x0": "1"}),
+        ("solve-scan", {"expr": "sin(3x) + cos(x)/2", "var": "x", "method": "scan", "x_min": "-20", "x_max": "20"}),
+    ],
+    "series": [
+        ("series-exp", {"expr": "exp(x)", "var": "x", "point": "0", "order": 8}),
+        ("series-tan", {"expr": "tan(x)", "var": "x", "point": "0", "order": 10}),
+    ],
+    "limit": [
+        ("limit-sinc", {"expr": "sin(x)/x", "var": "x", "approach": "0"}),
+        ("limit-infinity", {"expr": "(1 + 1/x)^x", "var": "x", "approach": "oo"}),
+        ("limit-numeric", {"expr": "(exp(x) - 1 - x)/x^2", "var": "x", "approach": "0", "strategy": "numeric"}),
+    ],
+    "plot": [
+        ("plot-uniform", {"expr": "sin(x)/x", "var": "x", "x_min": -20, "x_max": 20, "n": 800}),
+        ("plot-adaptive", {"expr": "tan(x)", "var": "x", "x_min": -10, "x_max": 10, "n": 800,
+                           "sampling": "adaptive"}),
+        ("plot-data", {"expr": "exp(-x^2)*cos(5*x)", "var": "x", "n": 2000, "output": "data"}),
+    ],
+    "plot3d": [
+        ("plot3d-surface", {"expr": "sin(sqrt(x^2 + y^2))", "n": 80}),
+        ("plot3d-lod", {"expr": "sin(x)*cos(y)", "n": 400}),
+        ("plot3d-data", {"expr": "exp(-(x^2 + y^2))", "n": 500, "output": "data"}),
+    ],
+    "linear": [
+        ("linear-det", {"op": "det", "matrix_a": "[[2,1,0],[1,3,1],[0,1,4]]"}),
+        ("linear-eig", {"op": "eig", "matrix_a": "[[4,1],[2,3]]"}),
+        ("linear-solve-sparse", {"op": "solve", "format": "coo",
+                                 "matrix_a": "; ".join(f"{i} {i} 4; {i} {(i + 1) % 200} -1" for i in range(200)),
+                                 "vector": "[" + ",".join(["1"] * 200) + "]"}),
+    ],
+    "ml": [
+        ("ml-gradient", {"ml_op": "gradient", "expr": "x^2*y + sin(x*y)", "vars": "x, y"}),
+        ("ml-jacobian-cse", {"ml_op": "jacobian", "expr": "sin(x*y) + x; exp(x*y)*y; x^2 - y^2",
+                             "vars": "x, y", "cse": True, "points": "1,2; 0,0; 3,1"}),
+        ("ml-hessian", {"ml_op": "hessian", "expr": "exp(x*y*z)*sin(x + y + z)", "vars": "x, y, z"}),
+        ("ml-gd-grid", {"ml_op": "gd_demo", "expr": "(x^2 - 1)^2 + y^2", "vars": "x, y", "lr": 0.05,
+                        "steps": 300, "grid_n": 20, "optimizer": "adam"}),
+    ],
+}
+
+PERCENTILES = (50, 90, 95, 99)
+
+# compare 时低于这些绝对差值的变化视为噪声
+NOISE_FLOOR_MS = 1.0
+NOISE_FLOOR_KB = 64
+
+
+def _call(mode: str, payload: dict):
+    """与 views_api._execute 一致的分发，但不依赖 Django 和沙箱进程池，测的是引擎本身"""
+    if mode == "linear":
+        return engine.linear_algebra(
+            payload["op"], payload["matrix_a"], payload.get("matrix_b"), payload.get("vector"),
+            fmt=payload.get("format", "dense"),
+        )
+    return engine.run(mode, payload)
+
+
+def _environment() -> dict:
+    import matplotlib
+    import sympy
+
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sympy": sympy.__version__,
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+    }
+    try:
+        import scipy
+        env["scipy"] = scipy.__version__
+    except ImportError:
+        env["scipy"] = None
+    return env
+
+
+def _clear_caches():
+    """冷启动：清空 engine 的解析/lambdify 缓存以及 SymPy 自身的 cacheit 缓存，结果才可复现"""
+    from sympy.core.cache import clear_cache
+
+    engine.clear_caches()
+    clear_cache()
+
+
+def _bench_case(name: str, mode: str, payload: dict, repeat: int, warm: bool) -> dict:
+    result = {"name": name, "mode": mode, "ok": True, "error": None}
+    samples = []
+    try:
+        if warm:
+            _call(mode, payload)
+        for _ in range(repeat):
+            if not warm:
+                _clear_caches()
+            t0 = time.perf_counter()
+            _call(mode, payload)
+            samples.append((time.perf_counter() - t0) * 1000)
+
+        # 峰值内存单独跑一遍：tracemalloc 本身会拖慢计时
+        if not warm:
+            _clear_caches()
+        tracemalloc.start()
+        try:
+            _call(mode, payload)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    except Exception as e:
+        result.update(ok=False, error=f"{type(e).__name__}: {e}")
+        return result
+
+    arr = np.array(samples)
+    result["samples_ms"] = [round(v, 3) for v in samples]
+    for p in PERCENTILES:
+        result[f"p{p}_ms"] = round(float(np.percentile(arr, p)), 3)
+    result["mean_ms"] = round(float(arr.mean()), 3)
+    result["min_ms"] = round(float(arr.min()), 3)
+    result["max_ms"] = round(float(arr.max()), 3)
+    result["peak_kb"] = round(peak / 1024, 1)
+    return result
+
+
+# 在全新的子进程里测 Django 启动 + 加载 maths URLconf 的耗时，以及是否把重型库拉进来
+HEAVY_MODULES = ("sympy", "numpy", "matplotlib")
+_STARTUP_SNIPPET = """
+import json, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+import maths.urls
+t2 = time.perf_counter()
+print(json.dumps({"setup": t1 - t0, "maths_urls": t2 - t1,
+                  "loaded": [m for m in %r if m in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_startup(repeat: int = 5) -> dict:
+    """
+    重复 repeat 次启动新的 Python 进程，记录 import maths.urls（视图模块）的耗时分位数。
+    结果与其它用例同格式（name="startup-maths-urls"），可以一起 compare。
+    """
+    import os
+    import subprocess
+    import sys
+
+    from django.conf import settings
+
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    samples, setup, loaded = [], [], []
+    for _ in range(int(repeat)):
+        proc = subprocess.run(
+            [sys.executable, "-c", _STARTUP_SNIPPET],
+            cwd=str(settings.BASE_DIR), env=env, capture_output=True, text=True, timeout=300,
+        )
+        if proc.returncode != 0:
+            return {"name": "startup-maths-urls", "mode": "startup", "ok": False,
+                    "error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "子进程失败"}
+        data = json.loads(proc.stdout.strip().splitlines()[-1])
+        samples.append(data["maths_urls"] * 1000)
+        setup.append(data["setup"] * 1000)
+        loaded = data["loaded"]
+
+    arr = np.array(samples)
+    result = {"name": "startup-maths-urls", "mode": "startup", "ok": True, "error": None,
+              "samples_ms": [round(v, 3) for v in samples]}
+    for p in PERCENTILES:
+        result[f"p{p}_ms"] = round(float(np.percentile(arr, p)), 3)
+    result["mean_ms"] = round(float(arr.mean()), 3)
+    result["min_ms"] = round(float(arr.min()), 3)
+    result["max_ms"] = round(float(arr.max()), 3)
+    result["peak_kb"] = None
+    result["django_setup_p50_ms"] = round(float(np.percentile(setup, 50)), 3)
+    result["heavy_modules_loaded"] = loaded
+    return result
+
+
+def run_benchmarks(modes=None, repeat: int = 5, warm: bool = False, names=None, on_case=None,
+                   startup: bool = False) -> dict:
+    """
+    跑语料中的全部（或指定模式 / 名字的）用例，每条重复 repeat 次。
+    默认每次迭代前清空解析/lambdify 缓存和 SymPy 缓存（冷启动），warm=True 时先预热一次并保留缓存。
+    on_case(result) 每跑完一条回调一次，便于命令行实时输出。
+    startup=True 时额外测一次进程启动（见 measure_startup）。
+    """
+    modes = list(modes or CORPUS)
+    unknown = [m for m in modes if m not in CORPUS]
+    if unknown:
+        raise ValueError(f"未知模式：{', '.join(unknown)}（可选：{', '.join(CORPUS)}）")
+    repeat = int(repeat)
+    if repeat < 1:
+        raise ValueError("repeat 至少为 1")
+
+    results = []
+    if startup:
+        case = measure_startup(repeat)
+        results.append(case)
+        if on_case:
+            on_case(case)
+    for mode in modes:
+        for name, payload in CORPUS[mode]:
+            if names and name not in names:
+                continue
+            case = _bench_case(name, mode, payload, repeat, warm)
+            results.append(case)
+            if on_case:
+                on_case(case)
+
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "repeat": repeat,
+            "warm": bool(warm),
+            "environment": _environment(),
+        },
+        "results": results,
+    }
+
+
+def write_results(report: dict, path: str):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, ensure_ascii=False, indent=2)
+
+
+def load_results(path: str) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        report = json.load(fh)
+    if "results" not in report:
+        raise ValueError(f"{path} 不是基准结果文件")
+    return report
+
+
+def _verdict(base, head, threshold: float, floor: float) -> str:
+    if base is None or head is None:
+        return "n/a"
+    if head > base * (1 + threshold) and head - base > floor:
+        return "regression"
+    if head < base * (1 - threshold) and base - head > floor:
+        return "improvement"
+    return "ok"
+
+
+def compare(base: dict, head: dict, threshold: float = 0.10, metric: str = "p50_ms") -> list:
+    """
+    按用例名对齐两次结果，比较 metric（默认中位数）与峰值内存。
+    变化超过 threshold（相对）且超过噪声下限（绝对）才标记为 regression / improvement。
+    """
+    base_by_name = {r["name"]: r for r in base["results"]}
+    rows = []
+    for r in head["results"]:
+        b = base_by_name.get(r["name"])
+        row = {"name": r["name"], "mode": r["mode"]}
+        if b is None or not b.get("ok") or not r.get("ok"):
+            row.update(status="missing" if b is None else "error",
+                       error=r.get("error") or (b or {}).get("error"))
+            rows.append(row)
+            continue
+
+        row["base"] = b.get(metric)
+        row["head"] = r.get(metric)
+        row["ratio"] = round(row["head"] / row["base"], 3) if row["base"] else None
+        row["time"] = _verdict(row["base"], row["head"], threshold, NOISE_FLOOR_MS)
+        row["base_peak_kb"] = b.get("peak_kb")
+        row["head_peak_kb"] = r.get("peak_kb")
+        row["memory"] = _verdict(b.get("peak_kb"), r.get("peak_kb"), threshold, NOISE_FLOOR_KB)
+        row["status"] = "regression" if "regression" in (row["time"], row["memory"]) else row["time"]
+        rows.append(row)
+    return rows
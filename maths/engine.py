@@ -1,39 +1,149 @@
 import base64
 import io
 import re
+import time
+import warnings
 import numpy as np
 import sympy as sp
 
 import ast
 
-from sympy.parsing.sympy_parser import (
-    parse_expr, standard_transformations, implicit_multiplication_application
-)
+from .cache import LRUCache
+from .parser import parse as _parse
 
-# 允许的符号/函数（你可以逐步扩充）
+# 允许的符号/函数（你可以逐步扩充）；表达式里只能用到这些名字，其它名字当作符号，写成函数调用则报错
 ALLOWED = {
-    "pi": sp.pi, "E": sp.E,
+    "pi": sp.pi, "E": sp.E, "I": sp.I, "oo": sp.oo,
     "sin": sp.sin, "cos": sp.cos, "tan": sp.tan,
-    "asin": sp.asin, "acos": sp.acos, "atan": sp.atan,
+    "sec": sp.sec, "csc": sp.csc, "cot": sp.cot,
+    "asin": sp.asin, "acos": sp.acos, "atan": sp.atan, "acot": sp.acot, "atan2": sp.atan2,
+    "sinh": sp.sinh, "cosh": sp.cosh, "tanh": sp.tanh,
+    "asinh": sp.asinh, "acosh": sp.acosh, "atanh": sp.atanh,
     "log": lambda x, base=10: sp.log(x, base), "ln": sp.log, "exp": sp.exp,
-    "sqrt": sp.sqrt, "Abs": sp.Abs,
+    "sqrt": sp.sqrt, "cbrt": sp.cbrt, "root": sp.root, "Abs": sp.Abs, "abs": sp.Abs,
+    "floor": sp.floor, "ceiling": sp.ceiling, "sign": sp.sign,
+    "factorial": sp.factorial, "binomial": sp.binomial, "gamma": sp.gamma, "erf": sp.erf,
+    "zeta": sp.zeta, "Heaviside": sp.Heaviside,
+    "re": sp.re, "im": sp.im, "arg": sp.arg, "conjugate": sp.conjugate, "Min": sp.Min, "Max": sp.Max,
+    "asec": sp.asec, "acsc": sp.acsc, "sinc": sp.sinc, "Mod": sp.Mod, "gcd": sp.gcd, "lcm": sp.lcm,
+    "EulerGamma": sp.EulerGamma, "GoldenRatio": sp.GoldenRatio, "Rational": sp.Rational,
+    # 改写 / 化简
+    "expand": sp.expand, "factor": sp.factor, "simplify": sp.simplify, "cancel": sp.cancel,
+    "together": sp.together, "apart": sp.apart, "collect": sp.collect, "trigsimp": sp.trigsimp,
+    "expand_trig": sp.expand_trig, "powsimp": sp.powsimp, "radsimp": sp.radsimp, "nsimplify": sp.nsimplify,
+    # 微积分、求和、关系式（范围参数写成元组：Sum(1/n^2, (n, 1, oo))）
+    "diff": sp.diff, "integrate": sp.integrate, "limit": sp.limit, "summation": sp.summation,
+    "product": sp.product, "Derivative": sp.Derivative, "Integral": sp.Integral, "Limit": sp.Limit,
+    "Sum": sp.Sum, "Product": sp.Product,
+    "Eq": sp.Eq, "Ne": sp.Ne, "Lt": sp.Lt, "Le": sp.Le, "Gt": sp.Gt, "Ge": sp.Ge,
 }
 
-TRANSFORMS = standard_transformations + (implicit_multiplication_application,)
-FORBIDDEN = re.compile(r"(__|import|exec|eval|lambda|open|os\.|sys\.|subprocess|pickle)", re.I)
+# 解析结果 / lambdify 结果缓存：同一函数换个范围反复作图时不必重新解析、编译
+EXPR_CACHE_SIZE = 256
+LAMBDA_CACHE_SIZE = 128
+_PARSE_CACHE = LRUCache(EXPR_CACHE_SIZE)
+_LAMBDA_CACHE = LRUCache(LAMBDA_CACHE_SIZE)
+
+def _locals_key(extra_locals: dict | None):
+    """把 workspace/变量表转成可哈希的 key；含不可哈希的值时返回 None（不走缓存）"""
+    if not extra_locals:
+        return ()
+    try:
+        key = tuple(sorted(extra_locals.items(), key=lambda kv: kv[0]))
+        hash(key)
+    except TypeError:
+        return None
+    return key
 
 def safe_parse(expr_str: str, extra_locals: dict | None = None) -> sp.Expr:
+    """
+    白名单解析（maths/parser.py）：只接受数字、名字、+ - * / ^ ** ( ) , ! < > <= >= 和空白，
+    支持隐式乘法（2x、x(x+1)、xy）与隐式函数调用（sin x、sin^2 x）。
+    """
     if not expr_str or len(expr_str) > 800:
         raise ValueError("表达式为空或过长")
-    if FORBIDDEN.search(expr_str):
-        raise ValueError("表达式包含不允许的内容")
+
+    expr_str = expr_str.strip()
+
+    locals_key = _locals_key(extra_locals)
+    cache_key = (expr_str, locals_key) if locals_key is not None else None
+    if cache_key is not None:
+        cached = _PARSE_CACHE.get(cache_key)
+        if cached is not None:
+            return cached
 
     local_dict = dict(ALLOWED)
     if extra_locals:
         local_dict.update(extra_locals)
 
-    expr_str = expr_str.replace("^", "**")
-    return parse_expr(expr_str, local_dict=local_dict, transformations=TRANSFORMS, evaluate=True)
+    expr = _parse(expr_str, local_dict)
+    if cache_key is not None:
+        _PARSE_CACHE.put(cache_key, expr)
+    return expr
+
+def _lambdify(args, expr):
+    """带缓存的 sp.lambdify(args, expr, modules="numpy")"""
+    key = (tuple(args) if isinstance(args, (list, tuple)) else args, expr)
+    f = _LAMBDA_CACHE.get(key)
+    if f is None:
+        f = sp.lambdify(args, expr, modules=["numpy"])
+        _LAMBDA_CACHE.put(key, f)
+    return f
+
+def cache_stats() -> dict:
+    return {
+        "parse": _PARSE_CACHE.stats(),
+        "lambdify": _LAMBDA_CACHE.stats(),
+    }
+
+def clear_caches():
+    _PARSE_CACHE.clear()
+    _LAMBDA_CACHE.clear()
+
+# 化简分级：none 不化简；cheap 只做 cancel/together 这类便宜的有理化改写；full 完整 sp.simplify
+# 默认 auto：表达式运算数超过阈值时用 cheap，否则 full
+SIMPLIFY_LEVELS = ("auto", "none", "cheap", "full")
+SIMPLIFY_SIZE_THRESHOLD = 60
+
+def _cheap_simplify(expr):
+    try:
+        return sp.cancel(sp.together(expr))
+    except Exception:
+        # Piecewise / 关系式等 cancel 处理不了的结构，原样返回
+        return expr
+
+def _simplify(expr, level=None):
+    """按分级化简，返回 (结果, 实际使用的级别)；矩阵逐元素处理"""
+    level = (level or "auto").lower()
+    if level not in SIMPLIFY_LEVELS:
+        raise ValueError("simplify 只支持 auto / none / cheap / full")
+    if level == "auto":
+        level = "cheap" if sp.count_ops(expr) > SIMPLIFY_SIZE_THRESHOLD else "full"
+
+    if level == "none":
+        return expr, level
+    if level == "cheap":
+        if isinstance(expr, sp.MatrixBase):
+            return expr.applyfunc(_cheap_simplify), level
+        return _cheap_simplify(expr), level
+    return sp.simplify(expr), level
+
+def _simplify_each(exprs, level=None):
+    """
+    逐个化简（auto 时每个元素按自己的大小选级别），返回 (结果列表, 用到的最高级别)；
+    列表为空时级别为 None。
+    """
+    results, used = [], None
+    for expr in exprs:
+        expr_s, expr_level = _simplify(expr, level)
+        results.append(expr_s)
+        if used is None or SIMPLIFY_LEVELS.index(expr_level) > SIMPLIFY_LEVELS.index(used):
+            used = expr_level
+    return results, used
+
+def _timings(**seconds) -> dict:
+    """各阶段耗时（毫秒）"""
+    return {f"{k}_ms": round(v * 1000, 3) for k, v in seconds.items()}
 
 def _sym(var_name: str) -> sp.Symbol:
     if not var_name or len(var_name) > 8:
@@ -62,15 +172,34 @@ def parse_equation(eq_str: str, var: sp.Symbol, workspace: dict | None = None) -
         expr = safe_parse(s, local_ws)
         return sp.Eq(expr, 0)
 
-def eval_expr(expr_str: str, workspace: dict | None = None):
+WORKSPACE_NAME = re.compile(r"[a-zA-Z]\w{0,15}")
+
+def build_workspace(definitions: dict | None, base: dict | None = None) -> dict:
+    """
+    把 {"f": "sin(x)*x", "g": "f^2"} 这样的定义按顺序解析成 workspace；
+    后面的定义可以引用前面的名字，也可以引用 base（例如用户已保存的变量）。
+    """
+    workspace = dict(base or {})
+    for name, expr_str in (definitions or {}).items():
+        if not WORKSPACE_NAME.fullmatch(name or "") or name in ALLOWED:
+            raise ValueError(f"变量名不合法：{name}")
+        workspace[name] = safe_parse(str(expr_str), workspace)
+    return workspace
+
+def eval_expr(expr_str: str, workspace: dict | None = None, simplify=None):
     workspace = workspace or {}
+    t0 = time.perf_counter()
     expr = safe_parse(expr_str, workspace)
-    simplified = sp.simplify(expr)
+    t1 = time.perf_counter()
+    simplified, level = _simplify(expr, simplify)
+    t2 = time.perf_counter()
     return {
         "kind": "text",
         "expr_latex": sp.latex(expr),
         "result_str": str(simplified),
         "result_latex": sp.latex(simplified),
+        "simplify_level": level,
+        "timings": _timings(parse=t1 - t0, simplify=t2 - t1),
     }
 
 def simplify_expr(expr_str: str, workspace: dict | None = None):
@@ -84,55 +213,329 @@ def simplify_expr(expr_str: str, workspace: dict | None = None):
         "result_latex": sp.latex(simplified),
     }
 
-def diff_expr(expr_str: str, var_name="x", order=1, workspace: dict | None = None):
+def diff_expr(expr_str: str, var_name="x", order=1, workspace: dict | None = None, simplify=None):
     workspace = workspace or {}
     var = _sym(var_name)
     local_ws = dict(workspace)
     local_ws[var_name] = var
+    t0 = time.perf_counter()
     expr = safe_parse(expr_str, local_ws)
+    t1 = time.perf_counter()
 
     order = int(order)
     if order < 1 or order > 6:
         raise ValueError("导数阶数建议 1~6")
 
     d = sp.diff(expr, var, order)
-    d_s = sp.simplify(d)
+    t2 = time.perf_counter()
+    d_s, level = _simplify(d, simplify)
+    t3 = time.perf_counter()
     return {
         "kind": "text",
         "expr_latex": sp.latex(expr),
         "result_str": str(d_s),
         "result_latex": sp.latex(d_s),
+        "simplify_level": level,
+        "timings": _timings(parse=t1 - t0, compute=t2 - t1, simplify=t3 - t2),
+    }
+
+# 积分/极限的求解方式：symbolic 只求闭式解；numeric 只做数值计算；
+# auto 由调用方（views_api）让两者在时间预算内竞速，见 maths/fallback.py
+SOLVE_STRATEGIES = ("auto", "symbolic", "numeric")
+
+def _check_strategy(strategy):
+    strategy = (strategy or "symbolic").lower()
+    if strategy not in SOLVE_STRATEGIES:
+        raise ValueError("strategy 只支持 auto / symbolic / numeric")
+    # engine 自身不做竞速，auto 在进程内等同于 symbolic
+    return "symbolic" if strategy == "auto" else strategy
+
+def _scipy_integrate():
+    try:
+        import scipy.integrate as spi
+    except ImportError:
+        raise ValueError("当前环境未安装 scipy，无法数值积分")
+    return spi
+
+def _numeric_bound(value) -> float:
+    """积分上下限转 float，支持 oo / -oo"""
+    if value == sp.oo:
+        return np.inf
+    if value == -sp.oo:
+        return -np.inf
+    try:
+        return float(value)
+    except TypeError:
+        raise ValueError(f"数值积分的上下限必须是数值：{value}")
+
+def _numeric_result(expr, value, **extra) -> dict:
+    value = complex(value)
+    if abs(value.imag) > 1e-12 * max(1.0, abs(value.real)):
+        num = sp.Float(value.real, 15) + sp.I * sp.Float(value.imag, 15)
+    else:
+        num = sp.Float(value.real, 15)
+    return {
+        "kind": "text",
+        "expr_latex": sp.latex(expr),
+        "result_str": str(num),
+        "result_latex": r"\approx " + sp.latex(num),
+        "method": "numeric",
+        **extra,
     }
 
-def integrate_expr(expr_str: str, var_name="x", a=None, b=None, workspace: dict | None = None):
+def numeric_integrate(expr, var, a_expr, b_expr) -> dict:
+    """自适应求积（QUADPACK）；复值函数实部、虚部分开积"""
+    import warnings
+
+    spi = _scipy_integrate()
+    a, b = _numeric_bound(a_expr), _numeric_bound(b_expr)
+    f = _lambdify((var,), expr)
+
+    def value(t) -> complex:
+        # 按复数求值：sqrt/log 在负数处给出复值而不是 nan
+        try:
+            with np.errstate(all="ignore"):
+                v = complex(f(complex(t)))
+        except (ZeroDivisionError, OverflowError, ValueError):
+            v = complex(np.nan, np.nan)
+        if not np.isfinite(v):
+            # 不能把 nan 交给 QUADPACK（细分次数较大时会直接崩溃），抛异常中止积分
+            raise ArithmeticError(t)
+        return v
+
+    def part(fn):
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            try:
+                val, err = spi.quad(fn, a, b, limit=200)
+            except ArithmeticError as e:
+                raise ValueError(f"被积函数在 {var} = {float(e.args[0].real):.6g} 处无定义，无法数值积分")
+        if not np.isfinite(val):
+            raise ValueError("数值积分不收敛")
+        return val, err, [str(w.message).splitlines()[0] for w in caught]
+
+    real, err, warns = part(lambda t: value(t).real)
+    imag_err, imag = 0.0, 0.0
+    lo, hi = np.arctan([a, b])   # 在 arctan 压缩后的区间上取样，兼容无穷上下限
+    if any(abs(value(np.tan(u)).imag) > 0 for u in np.linspace(lo, hi, 9)[1:-1]):
+        imag, imag_err, more = part(lambda t: value(t).imag)
+        warns += more
+    return _numeric_result(
+        expr, complex(real, imag),
+        abs_error=float(err + imag_err),
+        warnings=warns,
+    )
+
+def numeric_limit(expr, var, approach, direction="+-") -> dict:
+    """
+    在 mpmath 里沿 approach 两侧取点，用 Richardson 外推估计极限；
+    双边极限要求左右两侧的结果一致。
+    """
+    import mpmath
+
+    f = sp.lambdify((var,), expr, modules=["mpmath"])
+    if approach in (sp.oo, -sp.oo):
+        point = mpmath.inf if approach == sp.oo else -mpmath.inf
+        sides = [1]
+    else:
+        try:
+            point = mpmath.mpf(float(approach))
+        except TypeError:
+            raise ValueError(f"数值极限的趋近点必须是数值：{approach}")
+        sides = {"+": [1], "-": [-1]}.get(direction, [1, -1])
+
+    values = []
+    with mpmath.workdps(30):
+        for side in sides:
+            try:
+                v = mpmath.limit(f, point, direction=side)
+            except (ZeroDivisionError, ValueError, OverflowError):
+                raise ValueError("数值极限计算失败")
+            v = complex(v)
+            if not np.isfinite(v.real) or not np.isfinite(v.imag) or abs(v) > 1e12:
+                raise ValueError("数值极限不收敛（可能趋于无穷）")
+            values.append(v)
+
+    if len(values) == 2 and abs(values[0] - values[1]) > 1e-6 * max(1.0, abs(values[0])):
+        raise ValueError("左右极限数值不一致，双边极限不存在")
+    return _numeric_result(expr, values[0])
+
+def integrate_expr(expr_str: str, var_name="x", a=None, b=None, workspace: dict | None = None, simplify=None,
+                   strategy="symbolic"):
+    """
+    strategy="numeric" 时（仅定积分）直接数值积分；
+    符号结果里仍含未求出的 Integral 时 unevaluated=True，供 fallback 改用数值结果。
+    """
     workspace = workspace or {}
+    strategy = _check_strategy(strategy)
     var = _sym(var_name)
     local_ws = dict(workspace)
     local_ws[var_name] = var
+    t0 = time.perf_counter()
     expr = safe_parse(expr_str, local_ws)
 
     # 有上下限 -> 定积分；否则不定积分
     if a is not None and b is not None and str(a).strip() != "" and str(b).strip() != "":
         a_expr = safe_parse(str(a), local_ws)
         b_expr = safe_parse(str(b), local_ws)
+        t1 = time.perf_counter()
+        if strategy == "numeric":
+            out = numeric_integrate(expr, var, a_expr, b_expr)
+            out["timings"] = _timings(parse=t1 - t0, compute=time.perf_counter() - t1)
+            return out
         res = sp.integrate(expr, (var, a_expr, b_expr))
     else:
+        if strategy == "numeric":
+            raise ValueError("不定积分没有数值解，请给出上下限")
+        t1 = time.perf_counter()
         res = sp.integrate(expr, var)
+    t2 = time.perf_counter()
 
-    res_s = sp.simplify(res)
+    res_s, level = _simplify(res, simplify)
+    t3 = time.perf_counter()
     return {
         "kind": "text",
         "expr_latex": sp.latex(expr),
         "result_str": str(res_s),
         "result_latex": sp.latex(res_s),
+        "method": "symbolic",
+        "unevaluated": res_s.has(sp.Integral),
+        "simplify_level": level,
+        "timings": _timings(parse=t1 - t0, compute=t2 - t1, simplify=t3 - t2),
     }
 
-def solve_expr(eq_str: str, var_name="x", method="symbolic", x0=None, workspace: dict | None = None):
+SOLVE_METHODS = ("symbolic", "numeric", "scan")
+SOLVE_SCAN_N = 2001            # 区间扫描的默认采样点数
+SOLVE_SCAN_MAX_N = 200001
+SOLVE_SCAN_MAX_ROOTS = 500
+SOLVE_SCAN_ITERS = 64          # 二分 / 黄金分割的最大轮数，足够收敛到双精度
+
+def _bisect_brackets(f, lo, hi, f_lo):
+    """所有有根区间同时二分，每轮一次向量化求值"""
+    for _ in range(SOLVE_SCAN_ITERS):
+        mid = (lo + hi) / 2
+        f_mid = _eval_1d(f, mid)
+        right = np.sign(f_mid) == np.sign(f_lo)
+        lo = np.where(right, mid, lo)
+        f_lo = np.where(right, f_mid, f_lo)
+        hi = np.where(right, hi, mid)
+        if np.all(hi - lo <= 4 * np.finfo(float).eps * np.maximum(1.0, np.abs(lo))):
+            break
+    return (lo + hi) / 2
+
+def _golden_minimize(f, lo, hi):
+    """在每个 [lo, hi] 上同时用黄金分割找 |f| 的极小点（不变号的重根，如 x^2 = 0）"""
+    g = (np.sqrt(5) - 1) / 2
+    for _ in range(SOLVE_SCAN_ITERS):
+        c = hi - g * (hi - lo)
+        d = lo + g * (hi - lo)
+        left = ~(np.abs(_eval_1d(f, c)) > np.abs(_eval_1d(f, d)))   # NaN 时保守地往左收缩
+        hi = np.where(left, d, hi)
+        lo = np.where(left, lo, c)
+    return (lo + hi) / 2
+
+def _scan_roots(f, a: float, b: float, n: int) -> dict:
+    """
+    在 [a, b] 上找出全部实根：
+    1. n 个采样点一次向量化求值，相邻点变号处各是一个有根区间；
+    2. 所有有根区间同时二分细化；
+    3. |f| 的局部极小且接近 0 处（不变号的重根）同时做黄金分割细化；
+    4. 剔除细化后 |f| 反而比区间端点大的“根”（1/x、tan(x) 这类极点处的变号）。
+    """
+    t0 = time.perf_counter()
+    xs = np.linspace(a, b, n)
+    ys = _eval_1d(f, xs)
+    finite = np.isfinite(ys)
+    t1 = time.perf_counter()
+
+    roots = [xs[finite & (ys == 0)]]
+
+    sign = np.sign(ys)
+    bracket = finite[:-1] & finite[1:] & (sign[:-1] * sign[1:] < 0)
+    if bracket.any():
+        lo, hi = xs[:-1][bracket], xs[1:][bracket]
+        bound = np.minimum(np.abs(ys[:-1][bracket]), np.abs(ys[1:][bracket]))
+        r = _bisect_brackets(f, lo, hi, ys[:-1][bracket])
+        roots.append(r[np.abs(_eval_1d(f, r)) < bound])
+
+    abs_y = np.abs(ys)
+    scale = max(float(np.nanmax(abs_y)) if finite.any() else 1.0, 1.0)
+    inner = np.arange(1, n - 1)
+    touch = inner[
+        finite[inner] & (abs_y[inner] > 0)
+        & (abs_y[inner] <= abs_y[inner - 1]) & (abs_y[inner] <= abs_y[inner + 1])
+        & (sign[inner - 1] == sign[inner]) & (sign[inner + 1] == sign[inner])
+    ]
+    if touch.size:
+        r = _golden_minimize(f, xs[touch - 1], xs[touch + 1])
+        roots.append(r[np.abs(_eval_1d(f, r)) <= 1e-12 * scale])
+    t2 = time.perf_counter()
+
+    roots = np.sort(np.concatenate(roots))
+    if roots.size:
+        # 相邻采样区间可能细化到同一个根
+        keep = np.ones(roots.size, dtype=bool)
+        keep[1:] = np.diff(roots) > 1e-9 * np.maximum(1.0, np.abs(roots[1:]))
+        roots = roots[keep]
+    return {
+        "roots": roots,
+        "brackets": int(bracket.sum()),
+        "timings": {
+            "sample_ms": round((t1 - t0) * 1000, 3),
+            "refine_ms": round((t2 - t1) * 1000, 3),
+        },
+    }
+
+def _solve_scan(eq, var, x_min, x_max, n, workspace: dict) -> dict:
+    if eq == sp.true:
+        raise ValueError("方程恒成立，区间内每个点都是解")
+    # 区间端点可以引用 workspace 里的常量，但不能是求解变量本身（即使 workspace 里有同名变量）
+    local_ws = {**workspace, str(var): var}
+    a = float(safe_parse(str(-10 if x_min in (None, "") else x_min), local_ws))
+    b = float(safe_parse(str(10 if x_max in (None, "") else x_max), local_ws))
+    if not (np.isfinite(a) and np.isfinite(b) and a < b):
+        raise ValueError("扫描区间需要满足 x_min < x_max 且为有限值")
+    n = int(n or SOLVE_SCAN_N)
+    if not 3 <= n <= SOLVE_SCAN_MAX_N:
+        raise ValueError(f"采样点数需在 3 到 {SOLVE_SCAN_MAX_N} 之间")
+
+    if eq == sp.false:
+        # SymPy 已判定无解（如 1/x = 0）
+        found = {"roots": np.array([]), "brackets": 0, "timings": {"sample_ms": 0.0, "refine_ms": 0.0}}
+    else:
+        found = _scan_roots(_lambdify(var, eq.lhs - eq.rhs), a, b, n)
+    roots = found["roots"]
+    truncated = roots.size > SOLVE_SCAN_MAX_ROOTS
+    roots = [float(f"{r:.12g}") for r in roots[:SOLVE_SCAN_MAX_ROOTS]]
+    return {
+        "kind": "text",
+        "expr_latex": sp.latex(eq),
+        "result_str": "[" + ", ".join(map(str, roots)) + "]",
+        "result_latex": r"\left[" + ", ".join(sp.latex(sp.Float(r, 12)) for r in roots) + r"\right]",
+        "roots": roots,
+        "interval": [a, b],
+        "samples": n,
+        "brackets": found["brackets"],
+        "truncated": truncated,
+        "timings": found["timings"],
+    }
+
+def solve_expr(eq_str: str, var_name="x", method="symbolic", x0=None, workspace: dict | None = None,
+               x_min=None, x_max=None, n=None):
+    """
+    method：symbolic（sp.solve）/ numeric（从 x0 出发 nsolve，找一个根）/
+    scan（在 [x_min, x_max] 上采样找变号区间，向量化细化出区间内全部实根）
+    """
     workspace = workspace or {}
     var = _sym(var_name)
     eq = parse_equation(eq_str, var, workspace)
 
     method = (method or "symbolic").lower()
+    if method not in SOLVE_METHODS:
+        raise ValueError(f"method 只支持 {' / '.join(SOLVE_METHODS)}")
+
+    if method == "scan":
+        return _solve_scan(eq, var, x_min, x_max, n, workspace)
 
     if method == "numeric":
         if x0 is None or str(x0).strip() == "":
@@ -165,18 +568,124 @@ def solve_expr(eq_str: str, var_name="x", method="symbolic", x0=None, workspace:
         "result_latex": result_latex,
     }
 
-def plot_2d(func_str: str, var_name="x", x_min=-5, x_max=5, n=400, workspace: dict | None = None):
-    import matplotlib
-    matplotlib.use("Agg")
-    import matplotlib.pyplot as plt
+PLOT_OUTPUTS = ("png", "data")
+
+def _check_output(output):
+    output = (output or "png").lower()
+    if output not in PLOT_OUTPUTS:
+        raise ValueError("output 只支持 png / data")
+    return output
+
+def _clip_outliers(values: np.ndarray) -> np.ndarray:
+    """非有限值与爆炸值置为 NaN（作图时断开），原地修改并返回"""
+    # ✅ 1) 非有限值断开
+    values[~np.isfinite(values)] = np.nan
+
+    # ✅ 2) 裁剪过大的值（避免竖线/拉爆坐标轴）
+    abs_v = np.abs(values)
+    finite_abs = abs_v[np.isfinite(abs_v)]
+    if finite_abs.size > 0:
+        cap = np.nanpercentile(finite_abs, 98)  # 98分位当作“合理上界”
+        cap = max(cap * 3, 50)                  # 给一点余量，且不低于50
+        values[abs_v > cap] = np.nan
+    return values
+
+PLOT_SAMPLINGS = ("uniform", "adaptive")
+ADAPTIVE_INITIAL_POINTS = 65
+ADAPTIVE_MAX_DEPTH = 14
+ADAPTIVE_TOL = 2e-3
+ADAPTIVE_BREAK_RESERVE = 0.05     # 预留给间断点 NaN 标记的点数比例，保证总点数不超过 n
+
+def _eval_1d(f, xs: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        ys = f(xs)
+    ys = np.array(np.broadcast_to(ys, xs.shape), dtype=float)
+    ys[~np.isfinite(ys)] = np.nan
+    return ys
 
+def _y_scale(ys: np.ndarray) -> float:
+    finite = ys[np.isfinite(ys)]
+    if finite.size == 0:
+        return 1.0
+    lo, hi = np.percentile(finite, [2, 98])
+    return float(hi - lo) or 1.0
+
+def _adaptive_sample(f, x_min: float, x_max: float, max_points: int):
+    """
+    自适应采样：先粗网格，然后只在“中点偏离线性插值”或有限/非有限交界的区间里二分，
+    每一轮对所有待细分区间的中点做一次向量化求值。
+    到达深度上限仍未收敛、且两端跨越巨大跳变的区间视为间断（如 tan 的极点），插入 NaN 断开。
+    返回的点数（含 NaN 标记）不超过 max_points：细分时预留一部分给 NaN，仍不够时只断开跳变最大的区间。
+    """
+    xs = np.linspace(x_min, x_max, min(ADAPTIVE_INITIAL_POINTS, max_points))
+    ys = _eval_1d(f, xs)
+    refine = np.ones(xs.size - 1, dtype=bool)
+    sample_budget = max(xs.size, max_points - int(max_points * ADAPTIVE_BREAK_RESERVE))
+
+    for _ in range(ADAPTIVE_MAX_DEPTH):
+        idx = np.nonzero(refine)[0]
+        budget = sample_budget - xs.size
+        if idx.size == 0 or budget <= 0:
+            break
+        if idx.size > budget:
+            # 预算不够时优先细分跳变最大的区间
+            jump = np.abs(ys[idx + 1] - ys[idx])
+            jump[~np.isfinite(jump)] = np.inf
+            idx = np.sort(idx[np.argsort(-jump)[:budget]])
+
+        mids = 0.5 * (xs[idx] + xs[idx + 1])
+        ym = _eval_1d(f, mids)
+        ya, yb = ys[idx], ys[idx + 1]
+
+        tol = ADAPTIVE_TOL * _y_scale(ys)
+        fa, fm, fb = np.isfinite(ya), np.isfinite(ym), np.isfinite(yb)
+        with np.errstate(invalid="ignore"):
+            curv = np.abs(ym - 0.5 * (ya + yb)) > tol
+        left_bad = (fa != fm) | (fa & fm & fb & curv)
+        right_bad = (fm != fb) | (fa & fm & fb & curv)
+
+        flags = np.zeros(xs.size - 1, dtype=bool)
+        flags[idx] = left_bad
+        refine = np.insert(flags, idx + 1, right_bad)
+        xs = np.insert(xs, idx + 1, mids)
+        ys = np.insert(ys, idx + 1, ym)
+
+    # 未收敛且跨越大跳变的区间：视为间断点，插 NaN 断线
+    scale = _y_scale(ys)
+    with np.errstate(invalid="ignore"):
+        jump = np.abs(np.diff(ys))
+        big = np.maximum(np.abs(ys[:-1]), np.abs(ys[1:])) > scale
+        breaks = np.nonzero(refine & (jump > scale) & big)[0]
+    room = max(0, max_points - xs.size)
+    if breaks.size > room:
+        breaks = np.sort(breaks[np.argsort(-jump[breaks])[:room]])
+    if breaks.size:
+        xs = np.insert(xs, breaks + 1, 0.5 * (xs[breaks] + xs[breaks + 1]))
+        ys = np.insert(ys, breaks + 1, np.nan)
+    return xs, ys
+
+def _pack_array(values) -> dict:
+    """float32 小端字节再 base64，浏览器端直接解成 Float32Array；NaN 保留用于断线"""
+    arr = np.ascontiguousarray(values, dtype="<f4")
+    return {
+        "dtype": "float32",
+        "shape": list(arr.shape),
+        "data": base64.b64encode(arr.tobytes()).decode("ascii"),
+    }
+
+def plot_2d(func_str: str, var_name="x", x_min=-5, x_max=5, n=400, workspace: dict | None = None,
+            output="png", sampling="uniform"):
+    output = _check_output(output)
+    sampling = (sampling or "uniform").lower()
+    if sampling not in PLOT_SAMPLINGS:
+        raise ValueError("sampling 只支持 uniform / adaptive")
     workspace = workspace or {}
     var = _sym(var_name)
     local_ws = dict(workspace)
     local_ws[var_name] = var
 
     f_expr = safe_parse(func_str, local_ws)
-    f = sp.lambdify(var, f_expr, modules=["numpy"])
+    f = _lambdify(var, f_expr)
 
     x_min = float(x_min)
     x_max = float(x_max)
@@ -184,56 +693,163 @@ def plot_2d(func_str: str, var_name="x", x_min=-5, x_max=5, n=400, workspace: di
     if n < 50 or n > 5000:
         raise ValueError("点数建议 50~5000")
 
-    xs = np.linspace(x_min, x_max, n)
-    ys = f(xs)
-    
-    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
-        ys = f(xs)
+    if sampling == "adaptive":
+        # n 作为求值点数上限；平滑区域只保留粗网格，点数通常远少于 n
+        xs, ys = _adaptive_sample(f, x_min, x_max, n)
+    else:
+        xs = np.linspace(x_min, x_max, n)
+        ys = _eval_1d(f, xs)
+    _clip_outliers(ys)
+
+    if output == "data":
+        return {
+            "kind": "plot_data",
+            "plot": "line",
+            "func_latex": sp.latex(f_expr),
+            "x_label": var_name,
+            "y_label": f"f({var_name})",
+            "samples": int(xs.size),
+            "x": _pack_array(xs),
+            "y": _pack_array(ys),
+        }
 
-    ys = np.array(ys, dtype=float)
+    from .render import figure_to_base64, pooled_figure
 
-    # ✅ 1) 非有限值断开
-    ys[~np.isfinite(ys)] = np.nan
+    with pooled_figure() as fig:
+        ax = fig.add_subplot(111)
+        ax.plot(xs, ys)
+        ax.grid(True, alpha=0.25)
+        ax.set_xlabel(var_name)
+        ax.set_ylabel(f"f({var_name})")
+        img_b64 = figure_to_base64(fig)
 
-    # ✅ 2) 裁剪过大的值（避免竖线/拉爆 y 轴）
-    abs_y = np.abs(ys)
-    finite_abs = abs_y[np.isfinite(abs_y)]
-    if finite_abs.size > 0:
-        cap = np.nanpercentile(finite_abs, 98)  # 98分位当作“合理上界”
-        cap = max(cap * 3, 50)                  # 给一点余量，且不低于50
-        ys[abs_y > cap] = np.nan
-    finite_y = ys[np.isfinite(ys)]
-    
-    fig = plt.figure()
-    ax = fig.add_subplot(111)
-    ax.plot(xs, ys)
-    ax.grid(True, alpha=0.25)
-    ax.set_xlabel(var_name)
-    ax.set_ylabel(f"f({var_name})")
-
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=160, bbox_inches="tight")
-    plt.close(fig)
-    buf.seek(0)
-
-    img_b64 = base64.b64encode(buf.read()).decode("utf-8")
     return {
         "kind": "plot",
         "func_latex": sp.latex(f_expr),
+        "samples": int(xs.size),
         "img_base64": img_b64,
     }
 
+# 3D 作图：网格分块求值；细网格渲染时按细节层次（LOD）抽稀平坦区域
+PLOT3D_MAX_N = 1025
+PLOT3D_CHUNK_POINTS = 250_000     # 每块最多求值多少个点，限制 lambdify 中间数组的峰值内存
+PLOT3D_SURFACE_N = 150            # 不超过这个网格直接 plot_surface，否则走 LOD + plot_trisurf
+PLOT3D_MAX_VERTICES = 20000       # LOD 后参与渲染的顶点数上限
+PLOT3D_LOD_TOL = 0.002            # 允许的双线性插值误差（相对 z 的范围）
+PLOT3D_PREVIEW_N = 41             # 渐进式结果里先给出的粗网格
+PLOT3D_DATA_MAX_N = 257           # data 输出的网格上限：浏览器画成 720px 宽的热力图，更细的网格看不出差别
+PLOT3D_SYNC_MAX_N = 257           # 同步接口（api/run、api/batch）允许的最大 n，更细的网格走后台任务
+
+def _eval_grid_chunked(f, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+    """按行分块在网格上求值，返回 (len(ys), len(xs))"""
+    Z = np.empty((len(ys), len(xs)), dtype=float)
+    rows = max(1, PLOT3D_CHUNK_POINTS // len(xs))
+    for r0 in range(0, len(ys), rows):
+        X, Y = np.meshgrid(xs, ys[r0:r0 + rows])
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            block = f(X, Y)
+        Z[r0:r0 + rows] = np.real_if_close(np.broadcast_to(block, X.shape)).real
+    return Z
+
+def _tile_errors(Z: np.ndarray, s: int) -> np.ndarray:
+    """边长 s 的每个方块用四角双线性插值代替时的最大误差；含非有限值的方块为 inf，全为非有限值的为 0"""
+    m = (Z.shape[0] - 1) // s
+    C = Z[::s, ::s]
+    B = Z[:-1, :-1].reshape(m, s, m, s)
+    u = np.arange(s) / s
+    wi = u[None, :, None, None]
+    wj = u[None, None, None, :]
+    c00 = C[:-1, :-1][:, None, :, None]
+    c10 = C[1:, :-1][:, None, :, None]
+    c01 = C[:-1, 1:][:, None, :, None]
+    c11 = C[1:, 1:][:, None, :, None]
+    with np.errstate(invalid="ignore"):
+        interp = (1 - wi) * (1 - wj) * c00 + wi * (1 - wj) * c10 + (1 - wi) * wj * c01 + wi * wj * c11
+        err = np.abs(B - interp).max(axis=(1, 3))
+    empty = np.isnan(B).all(axis=(1, 3))
+    err[np.isnan(err)] = np.inf
+    err[empty] = 0.0
+    return err
+
+def _lod_mask(Z: np.ndarray, max_vertices=PLOT3D_MAX_VERTICES, tol=PLOT3D_LOD_TOL) -> np.ndarray:
+    """
+    四叉树抽稀：从粗方块开始，插值误差不超过容差的方块只保留四个角，否则一分为四继续检查。
+    顶点数超过 max_vertices 时放宽容差重来（各层误差只算一次）。返回与 Z 同形的保留掩码。
+    """
+    N = Z.shape[0]
+    S = 1
+    while S * 2 * 8 <= N - 1:
+        S *= 2
+    M = -(-(N - 1) // S) * S + 1
+    Zp = np.pad(Z, ((0, M - N), (0, M - N)), mode="edge")
+
+    levels = []
+    s = S
+    while s >= 1:
+        levels.append(s)
+        s //= 2
+    errors = {s: _tile_errors(Zp, s) for s in levels if s > 1}
+
+    finite = Z[np.isfinite(Z)]
+    z_range = float(finite.max() - finite.min()) if finite.size else 0.0
+    tol_abs = tol * z_range if z_range > 0 else np.inf
+
+    while True:
+        keep = np.zeros((M, M), dtype=bool)
+        active = np.ones(((M - 1) // S, (M - 1) // S), dtype=bool)
+        for s in levels:
+            leaf = active if s == 1 else active & (errors[s] <= tol_abs)
+            a, b = np.nonzero(leaf)
+            for da in (0, 1):
+                for db in (0, 1):
+                    keep[(a + da) * s, (b + db) * s] = True
+            active = np.repeat(np.repeat(active & ~leaf, 2, axis=0), 2, axis=1)
+        keep = keep[:N, :N]
+        # 边界整行整列保留：补齐 pad 后被裁掉的方块角点
+        keep[0, :] = keep[-1, :] = keep[:, 0] = keep[:, -1] = True
+        if keep.sum() <= max_vertices or tol_abs == np.inf or tol_abs > z_range:
+            return keep
+        tol_abs *= 2
+
+def _lod_triangulation(xs, ys, Z):
+    """LOD 顶点 + Delaunay 三角化；去掉落在非有限值区域（断点/定义域外）附近的三角形"""
+    from matplotlib.tri import Triangulation
+
+    finite = np.isfinite(Z)
+    keep = _lod_mask(Z) & finite
+    iy, ix = np.nonzero(keep)
+    tri = Triangulation(xs[ix], ys[iy])
+
+    bad = ~finite
+    near_bad = bad.copy()
+    near_bad[1:, :] |= bad[:-1, :]
+    near_bad[:-1, :] |= bad[1:, :]
+    near_bad[:, 1:] |= bad[:, :-1]
+    near_bad[:, :-1] |= bad[:, 1:]
+    if near_bad.any():
+        cx = xs[ix][tri.triangles].mean(axis=1)
+        cy = ys[iy][tri.triangles].mean(axis=1)
+        j = np.clip(np.rint((cx - xs[0]) / (xs[-1] - xs[0]) * (len(xs) - 1)).astype(int), 0, len(xs) - 1)
+        i = np.clip(np.rint((cy - ys[0]) / (ys[-1] - ys[0]) * (len(ys) - 1)).astype(int), 0, len(ys) - 1)
+        tri.set_mask(near_bad[i, j])
+    return tri, Z[iy, ix]
+
 def plot_3d(func_str: str,
             x_name="x", y_name="y",
             x_min=-5, x_max=5,
             y_min=-5, y_max=5,
             n=80,
-            workspace: dict | None = None):
-    import matplotlib
-    matplotlib.use("Agg")
-    import matplotlib.pyplot as plt
-    from mpl_toolkits.mplot3d import Axes3D  # noqa: F401
-
+            workspace: dict | None = None,
+            output="png",
+            progress=None):
+    """
+    n 不超过 PLOT3D_SURFACE_N 时与原来一样用 plot_surface 画全网格；
+    更细的网格分块求值后做 LOD 抽稀，用 plot_trisurf 渲染。
+    output="data" 返回规则网格（浏览器按网格画热力图，不能用 LOD 的不规则顶点），
+    边长超过 PLOT3D_DATA_MAX_N 时改在 PLOT3D_DATA_MAX_N 的网格上求值，grid_n 为实际网格。
+    progress 不为空时先用粗网格算一遍交给 progress（stage="preview"），再算完整结果（stage="final"）。
+    """
+    output = _check_output(output)
     workspace = workspace or {}
     x = _sym(x_name)
     y = _sym(y_name)
@@ -243,58 +859,82 @@ def plot_3d(func_str: str,
     local_ws[y_name] = y
 
     expr = safe_parse(func_str, local_ws)
-    f = sp.lambdify((x, y), expr, modules=["numpy"])
+    f = _lambdify((x, y), expr)
 
     x_min = float(x_min); x_max = float(x_max)
     y_min = float(y_min); y_max = float(y_max)
     n = int(n)
-    if n < 20 or n > 250:
-        raise ValueError("3D 网格点数 n 建议 20~250（太大很卡）")
-
-    xs = np.linspace(x_min, x_max, n)
-    ys = np.linspace(y_min, y_max, n)
-    X, Y = np.meshgrid(xs, ys)
-
-    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
-        Z = f(X, Y)
-
-    Z = np.array(Z, dtype=float)
-
-    # 1) 非有限值断开（不连续/除零）
-    Z[~np.isfinite(Z)] = np.nan
-
-    # 2) 裁剪爆炸值（避免“冲天柱”把图拉爆）
-    abs_z = np.abs(Z)
-    finite_abs = abs_z[np.isfinite(abs_z)]
-    if finite_abs.size > 0:
-        cap = np.nanpercentile(finite_abs, 98)
-        cap = max(cap * 3, 50)
-        Z[abs_z > cap] = np.nan
-
-    fig = plt.figure()
-    ax = fig.add_subplot(111, projection="3d")
-    ax.plot_surface(X, Y, Z, rstride=1, cstride=1, linewidth=0, antialiased=True)
+    if n < 20 or n > PLOT3D_MAX_N:
+        raise ValueError(f"3D 网格点数 n 建议 20~{PLOT3D_MAX_N}")
+
+    if progress is not None and n > PLOT3D_PREVIEW_N:
+        preview = plot_3d(func_str, x_name, y_name, x_min, x_max, y_min, y_max,
+                          PLOT3D_PREVIEW_N, workspace, output)
+        progress({**preview, "stage": "preview"})
+        return {**plot_3d(func_str, x_name, y_name, x_min, x_max, y_min, y_max, n, workspace, output),
+                "stage": "final"}
+
+    t0 = time.perf_counter()
+    grid_n = min(n, PLOT3D_DATA_MAX_N) if output == "data" else n
+    xs = np.linspace(x_min, x_max, grid_n)
+    ys = np.linspace(y_min, y_max, grid_n)
+    Z = _eval_grid_chunked(f, xs, ys)
+
+    # 1) 非有限值断开（不连续/除零）；2) 裁剪爆炸值（避免“冲天柱”把图拉爆）
+    _clip_outliers(Z)
+    t1 = time.perf_counter()
+
+    if output == "data":
+        # 规则网格只需要两条坐标轴 + Z 矩阵，浏览器端自行组网格
+        return {
+            "kind": "plot_data",
+            "plot": "surface",
+            "func_latex": sp.latex(expr),
+            "x_label": x_name,
+            "y_label": y_name,
+            "x": _pack_array(xs),
+            "y": _pack_array(ys),
+            "z": _pack_array(Z),
+            "n": n,
+            "grid_n": grid_n,
+            "timings": _timings(evaluate=t1 - t0),
+        }
 
-    ax.set_xlabel(x_name)
-    ax.set_ylabel(y_name)
-    ax.set_zlabel("z")
+    from mpl_toolkits.mplot3d import Axes3D  # noqa: F401
+    from .render import figure_to_base64, pooled_figure
+
+    with pooled_figure() as fig:
+        ax = fig.add_subplot(111, projection="3d")
+        if n <= PLOT3D_SURFACE_N:
+            X, Y = np.meshgrid(xs, ys)
+            ax.plot_surface(X, Y, Z, rstride=1, cstride=1, linewidth=0, antialiased=True)
+            vertices = n * n
+        else:
+            tri, zv = _lod_triangulation(xs, ys, Z)
+            ax.plot_trisurf(tri, zv, linewidth=0, antialiased=True)
+            vertices = len(zv)
+        t2 = time.perf_counter()
 
-    # 可选：加一个俯视投影等高线，更好读（你喜欢可以保留）
-    # ax.contour(X, Y, Z, zdir='z', offset=np.nanmin(Z[np.isfinite(Z)]) if np.isfinite(Z).any() else -1, linewidths=0.5)
+        ax.set_xlabel(x_name)
+        ax.set_ylabel(y_name)
+        ax.set_zlabel("z")
 
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=160, bbox_inches="tight")
-    plt.close(fig)
-    buf.seek(0)
+        # 可选：加一个俯视投影等高线，更好读（你喜欢可以保留）
+        # ax.contour(X, Y, Z, zdir='z', offset=np.nanmin(Z[np.isfinite(Z)]) if np.isfinite(Z).any() else -1, linewidths=0.5)
+        img_b64 = figure_to_base64(fig)
+        t3 = time.perf_counter()
 
-    img_b64 = base64.b64encode(buf.read()).decode("utf-8")
     return {
         "kind": "plot",
         "func_latex": sp.latex(expr),
         "img_base64": img_b64,
+        "n": n,
+        "vertices": int(vertices),
+        "timings": _timings(evaluate=t1 - t0, mesh=t2 - t1, render=t3 - t2),
     }
 
-def run(mode: str, payload: dict, workspace: dict | None = None):
+def run(mode: str, payload: dict, workspace: dict | None = None, progress=None):
+    """progress：可选回调，plot3d 用它先交出粗网格预览，series 用它交出低阶的部分展开式"""
     workspace = workspace or {}
     mode = (mode or "eval").lower()
 
@@ -306,16 +946,19 @@ def run(mode: str, payload: dict, workspace: dict | None = None):
     method = payload.get("method", "symbolic")
     x0 = payload.get("x0", None)
 
+    simplify = payload.get("simplify") or None
+
     if mode == "eval":
-        return eval_expr(expr, workspace)
+        return eval_expr(expr, workspace, simplify)
     if mode == "simplify":
         return simplify_expr(expr, workspace)
     if mode == "diff":
-        return diff_expr(expr, var, order, workspace)
+        return diff_expr(expr, var, order, workspace, simplify)
     if mode == "integrate":
-        return integrate_expr(expr, var, a, b, workspace)
+        return integrate_expr(expr, var, a, b, workspace, simplify, strategy=payload.get("strategy"))
     if mode == "solve":
-        return solve_expr(expr, var, method, x0, workspace)
+        return solve_expr(expr, var, method, x0, workspace,
+                          x_min=payload.get("x_min"), x_max=payload.get("x_max"), n=payload.get("n"))
     if mode == "plot":
         return plot_2d(
             func_str=expr,
@@ -323,7 +966,9 @@ def run(mode: str, payload: dict, workspace: dict | None = None):
             x_min=payload.get("x_min", -10),
             x_max=payload.get("x_max", 10),
             n=payload.get("n", 400),
-            workspace=workspace
+            workspace=workspace,
+            output=payload.get("output", "png"),
+            sampling=payload.get("sampling", "uniform"),
         )
     if mode == "plot3d":
         return plot_3d(
@@ -335,31 +980,42 @@ def run(mode: str, payload: dict, workspace: dict | None = None):
             y_min=payload.get("y_min", -5),
             y_max=payload.get("y_max", 5),
             n=payload.get("n", 80),
-            workspace=workspace
+            workspace=workspace,
+            output=payload.get("output", "png"),
+            progress=progress,
         )
     if mode == "limit":
-        return limit_expr(expr, var, payload.get("approach", "0"), payload.get("direction", "+-"), workspace)
+        return limit_expr(expr, var, payload.get("approach", "0"), payload.get("direction", "+-"), workspace,
+                          strategy=payload.get("strategy"))
     if mode == "series":
         order = payload.get("order")
         # 如果 order 不存在或为空字符串，则使用默认值 6
         if order is None or order == "":
             order = 6
-        return series_expr(expr, var, payload.get("point", "0"), order, workspace)
+        return series_expr(expr, var, payload.get("point", "0"), order, workspace, progress=progress)
     if mode == "ml":
         ml_op = payload.get("ml_op", "gradient")
         vars_str = payload.get("vars", "x")
         if ml_op == "gradient":
-            return gradient(expr, vars_str, workspace)
+            return gradient(expr, vars_str, workspace, simplify)
         elif ml_op == "jacobian":
             # expr 此时应包含多个函数表达式，用分号分隔
-            return jacobian(expr, vars_str, workspace)
+            return jacobian(expr, vars_str, workspace, simplify,
+                            cse=bool(payload.get("cse")), points=payload.get("points") or None)
         elif ml_op == "hessian":
-            return hessian(expr, vars_str, workspace)
+            return hessian(expr, vars_str, workspace, simplify,
+                           cse=bool(payload.get("cse")), points=payload.get("points") or None)
         elif ml_op == "gd_demo":
             x0 = payload.get("x0", "0,0")
             lr = float(payload.get("lr", 0.1))
             steps = int(payload.get("steps", 20))
-            return gradient_descent_demo(expr, vars_str, x0, lr, steps)
+            return gradient_descent_demo(
+                expr, vars_str, x0, lr, steps,
+                output=payload.get("output", "png"),
+                optimizer=payload.get("optimizer", "gd"),
+                grid_n=payload.get("grid_n", 0) or 0,
+                grid_range=payload.get("grid_range", "-2,2") or "-2,2",
+            )
         else:
             raise ValueError(f"不支持的 ML 子操作: {ml_op}")
     raise ValueError(f"不支持的模式：{mode}")
@@ -402,72 +1058,276 @@ def _parse_matrix(mat_str, name="矩阵"):
     else:
         raise ValueError(f"{name} 格式不正确，应为列表")
 
-def linear_algebra(op: str, matrix_a: str, matrix_b: str = None, vector: str = None, workspace: dict = None):
+# ---------- 线性代数：大矩阵 / 稀疏矩阵 ----------
+
+MATRIX_FORMATS = ("dense", "coo", "mtx")
+LATEX_MAX_DIM = 12            # 超过这个行/列数不再整体生成 LaTeX，只给左上角预览
+PREVIEW_DIM = 6
+DENSE_MAX_DIM = 3000          # 稠密算法（inv / rank / 全部特征值）允许的最大阶数
+SPARSE_MAX_NNZ = 2_000_000
+EIG_DENSE_MAX_DIM = 500       # 更大的矩阵改用 ARPACK 只求部分特征值
+EIG_SPARSE_K = 6
+
+def _scipy_sparse():
+    """scipy 为可选依赖：只有稀疏/大矩阵功能需要"""
+    try:
+        import scipy.sparse as sps
+        import scipy.sparse.linalg as spla
+    except ImportError:
+        raise ValueError("当前环境未安装 scipy，无法处理稀疏矩阵")
+    return sps, spla
+
+def _is_sparse(M) -> bool:
+    try:
+        import scipy.sparse as sps
+    except ImportError:
+        return False
+    return sps.issparse(M)
+
+def _parse_coo(text: str, name="矩阵"):
+    """
+    COO 三元组文本：每行 “行 列 值”（从 0 开始），行之间可用换行或分号分隔；
+    可选首行 “shape m n” 指定尺寸，否则取最大下标 + 1。
+    """
+    sps, _ = _scipy_sparse()
+    shape = None
+    rows, cols, vals = [], [], []
+    for line in re.split(r"[;\n]+", text or ""):
+        parts = line.replace(",", " ").split()
+        if not parts or parts[0].startswith("#"):
+            continue
+        try:
+            if parts[0].lower() == "shape":
+                shape = (int(parts[1]), int(parts[2]))
+                continue
+            i, j, v = int(parts[0]), int(parts[1]), float(parts[2])
+        except (ValueError, IndexError):
+            raise ValueError(f"{name} 的 COO 行格式应为 “行 列 值”：{line.strip()}")
+        rows.append(i)
+        cols.append(j)
+        vals.append(v)
+
+    if not vals:
+        raise ValueError(f"{name} 输入为空")
+    if len(vals) > SPARSE_MAX_NNZ:
+        raise ValueError(f"{name} 非零元过多（上限 {SPARSE_MAX_NNZ}）")
+    if min(rows) < 0 or min(cols) < 0:
+        raise ValueError(f"{name} 的下标不能为负")
+    if shape is None:
+        shape = (max(rows) + 1, max(cols) + 1)
+    return sps.coo_matrix((vals, (rows, cols)), shape=shape).tocsr()
+
+def load_matrix_file(data: bytes, filename: str, name="矩阵"):
+    """上传的矩阵文件：.npy（稠密）、.mtx（Matrix Market，稀疏）、.txt/.csv（空白或逗号分隔的稠密表）"""
+    lower = (filename or "").lower()
+    buf = io.BytesIO(data)
+    try:
+        if lower.endswith(".npy"):
+            M = np.load(buf, allow_pickle=False)
+        elif lower.endswith(".mtx"):
+            import scipy.io
+            _scipy_sparse()
+            M = scipy.io.mmread(buf)
+            M = M.tocsr() if _is_sparse(M) else np.asarray(M)
+        elif lower.endswith((".txt", ".csv")):
+            M = np.loadtxt(buf, delimiter="," if lower.endswith(".csv") else None, ndmin=2)
+        else:
+            raise ValueError(f"{name} 仅支持 .npy / .mtx / .txt / .csv 文件")
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"{name} 文件读取失败: {e}")
+
+    if not _is_sparse(M):
+        M = np.asarray(M, dtype=float)
+        if M.ndim == 1:
+            M = M.reshape(1, -1)
+        if M.ndim != 2:
+            raise ValueError(f"{name} 必须是二维矩阵")
+    return M
+
+def _load_matrix(value, name="矩阵", fmt="dense"):
+    """文本（dense 列表 / COO / Matrix Market）或已加载好的数组 -> ndarray 或 CSR 稀疏矩阵"""
+    if isinstance(value, np.ndarray) or _is_sparse(value):
+        return value
+    fmt = (fmt or "dense").lower()
+    if fmt not in MATRIX_FORMATS:
+        raise ValueError("矩阵格式只支持 dense / coo / mtx")
+    if fmt == "coo":
+        return _parse_coo(value, name)
+    if fmt == "mtx":
+        return load_matrix_file((value or "").encode("utf-8"), "input.mtx", name)
+
+    mat_list = _parse_matrix(value, name)
+    try:
+        return np.array(mat_list, dtype=float)
+    except Exception:
+        raise ValueError(f"{name} 的元素必须为数值")
+
+def _num_latex(v) -> str:
+    if np.iscomplexobj(v) and np.imag(v) != 0:
+        return f"{np.real(v):.6g} {np.imag(v):+.6g}i"
+    return f"{np.real(v):.6g}"
+
+def _matrix_output(M, vector=False):
+    """
+    小矩阵：与原来一致，完整 str + sympy LaTeX。
+    大矩阵：不再构造 sp.Matrix，只给左上角 PREVIEW_DIM 的预览，并注明尺寸。
+    返回 (result_str, result_latex, truncated)
+    """
+    if _is_sparse(M):
+        m, n = M.shape
+        if max(m, n) <= LATEX_MAX_DIM:
+            M = M.toarray()
+        else:
+            block = M[:PREVIEW_DIM, :PREVIEW_DIM].toarray()
+            return _preview(block, m, n, nnz=M.nnz)
+
+    M = np.asarray(M)
+    shape = (M.shape[0], 1) if M.ndim == 1 else M.shape
+    if max(shape) <= LATEX_MAX_DIM:
+        return str(M.tolist()), sp.latex(sp.Matrix(M)), False
+
+    block = M[:PREVIEW_DIM].reshape(-1, 1) if M.ndim == 1 else M[:PREVIEW_DIM, :PREVIEW_DIM]
+    return _preview(block, *shape)
+
+def _preview(block, m, n, nnz=None):
+    k_r, k_c = block.shape
+    rows = []
+    for r in block:
+        cells = [_num_latex(v) for v in r] + ([r"\cdots"] if n > k_c else [])
+        rows.append(" & ".join(cells))
+    if m > k_r:
+        rows.append(" & ".join([r"\vdots"] * k_c + ([r"\ddots"] if n > k_c else [])))
+    latex = r"\left[\begin{matrix}" + r" \\ ".join(rows) + r"\end{matrix}\right]" + f"_{{{m} \\times {n}}}"
+
+    desc = f"{m}×{n} 矩阵" + (f"（稀疏，非零元 {nnz}）" if nnz is not None else "")
+    text = np.array2string(block, precision=6, threshold=PREVIEW_DIM * PREVIEW_DIM, max_line_width=160)
+    return f"{desc}，左上角预览：\n{text}", latex, True
+
+def _square(A, what):
+    if A.shape[0] != A.shape[1]:
+        raise ValueError(f"{what}只对方阵定义")
+
+def _dense(A, what):
+    if max(A.shape) > DENSE_MAX_DIM:
+        raise ValueError(f"{what}需要稠密计算，矩阵阶数上限为 {DENSE_MAX_DIM}")
+    return A.toarray() if _is_sparse(A) else A
+
+def _sparse_det(A):
+    """稀疏 LU：det = ±prod(diag(U))，符号由行/列置换的奇偶性决定；矩阵奇异时为 0（与稠密路径一致）"""
+    _, spla = _scipy_sparse()
+    try:
+        lu = spla.splu(A.tocsc())
+    except RuntimeError as e:
+        # SuperLU 遇到精确为零的主元直接报 "Factor is exactly singular"
+        if "singular" in str(e).lower():
+            return 0.0
+        raise
+    diag = lu.U.diagonal()
+
+    def parity(perm):
+        perm = np.asarray(perm).copy()
+        swaps = 0
+        for i in range(perm.size):
+            while perm[i] != i:
+                j = perm[i]
+                perm[i], perm[j] = perm[j], perm[i]
+                swaps += 1
+        return -1.0 if swaps % 2 else 1.0
+
+    sign = parity(lu.perm_r) * parity(lu.perm_c)
+    return sign * np.prod(diag)
+
+def linear_algebra(op: str, matrix_a, matrix_b=None, vector=None, workspace: dict = None, fmt="dense"):
     """
     支持的操作：
         det: 行列式
         inv: 逆矩阵
-        eig: 特征值和特征向量
+        eig: 特征值和特征向量（大矩阵/稀疏矩阵只求模最大的若干个）
         solve: 解线性方程组 Ax = b (b 为向量或矩阵)
         rank: 矩阵的秩
         transpose: 转置
+    matrix_a / matrix_b 可以是文本（fmt=dense 列表写法、coo 三元组、mtx），
+    也可以是已经从上传文件加载好的 ndarray / 稀疏矩阵。
     """
-    if matrix_a is None:
+    if matrix_a is None or (isinstance(matrix_a, str) and not matrix_a.strip()):
         raise ValueError("矩阵 A 不能为空")
     try:
-        A_list = _parse_matrix(matrix_a, "矩阵 A")
+        A = _load_matrix(matrix_a, "矩阵 A", fmt)
     except ValueError as e:
         raise ValueError(f"矩阵 A 解析失败: {e}")
-    try:
-        A = np.array(A_list, dtype=float)
-    except Exception:
-        raise ValueError("矩阵 A 的元素必须为数值")
+    sparse = _is_sparse(A)
+    truncated = False
 
     if op == "det":
-        if A.shape[0] != A.shape[1]:
-            raise ValueError("行列式只对方阵定义")
-        result = np.linalg.det(A)
+        _square(A, "行列式")
+        result = _sparse_det(A) if sparse else np.linalg.det(A)
         result_latex = sp.latex(result)
         result_str = str(result)
     elif op == "inv":
-        if A.shape[0] != A.shape[1]:
-            raise ValueError("逆矩阵只对方阵定义")
-        inv = np.linalg.inv(A)
-        result_str = str(inv.tolist())
-        result_latex = sp.latex(sp.Matrix(inv))  # 转换为 sympy 矩阵以获得 LaTeX
+        _square(A, "逆矩阵")
+        inv = np.linalg.inv(_dense(A, "逆矩阵"))
+        result_str, result_latex, truncated = _matrix_output(inv)
     elif op == "eig":
-        eigvals, eigvecs = np.linalg.eig(A)
-        # 将结果转换为可读格式
-        result_str = f"特征值: {eigvals}\n特征向量:\n{eigvecs}"
-        # 生成 LaTeX 表示（简化）
-        result_latex = sp.latex(sp.Matrix(eigvals)) + r"\\" + sp.latex(sp.Matrix(eigvecs))
+        _square(A, "特征值")
+        n = A.shape[0]
+        if sparse or n > EIG_DENSE_MAX_DIM:
+            _, spla = _scipy_sparse()
+            k = min(EIG_SPARSE_K, n - 2)
+            if k < 1:
+                raise ValueError("矩阵太小，无法使用稀疏特征值求解")
+            symmetric = (abs(A - A.T) > 1e-12).nnz == 0 if sparse else np.allclose(A, A.T)
+            solver = spla.eigsh if symmetric else spla.eigs
+            try:
+                eigvals, eigvecs = solver(A.astype(float), k=k, which="LM")
+            except spla.ArpackNoConvergence:
+                raise ValueError("稀疏特征值迭代未收敛（矩阵可能是亏损的），请改用较小的稠密矩阵")
+            vals_str, vals_latex, _ = _matrix_output(eigvals)
+            vecs_str, vecs_latex, _ = _matrix_output(eigvecs)
+            result_str = f"模最大的 {k} 个特征值: {vals_str}\n特征向量:\n{vecs_str}"
+            result_latex = vals_latex + r"\\" + vecs_latex
+            truncated = True
+        else:
+            eigvals, eigvecs = np.linalg.eig(A)
+            # 将结果转换为可读格式
+            result_str = f"特征值: {eigvals}\n特征向量:\n{eigvecs}"
+            # 生成 LaTeX 表示（简化）
+            if n <= LATEX_MAX_DIM:
+                result_latex = sp.latex(sp.Matrix(eigvals)) + r"\\" + sp.latex(sp.Matrix(eigvecs))
+            else:
+                _, vals_latex, _ = _matrix_output(eigvals)
+                _, vecs_latex, _ = _matrix_output(eigvecs)
+                result_latex = vals_latex + r"\\" + vecs_latex
+                truncated = True
     elif op == "solve":
-        
-        b_str = matrix_b if matrix_b else vector
-        if not matrix_b and not vector:
+        b_src = matrix_b if matrix_b is not None and not (isinstance(matrix_b, str) and not matrix_b) else vector
+        if b_src is None or (isinstance(b_src, str) and not b_src):
             raise ValueError("解方程需要提供 b")
         try:
-            b_list = _parse_matrix(b_str, "向量 b")
+            b = _load_matrix(b_src, "向量 b", "dense" if isinstance(b_src, str) else fmt)
         except ValueError as e:
             raise ValueError(f"b 解析失败: {e}")
-        try:
-            b = np.array(b_list, dtype=float)
-        except Exception:
-            raise ValueError("b 的元素必须为数值")
         # 如果 b 是二维列矩阵，将其展平为一维向量
-        b = b.flatten()
+        b = (b.toarray() if _is_sparse(b) else b).flatten()
         # 求解
-        x = np.linalg.solve(A, b)
-        result_str = str(x.tolist())
-        result_latex = sp.latex(sp.Matrix(x))
+        if sparse:
+            _, spla = _scipy_sparse()
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", spla.MatrixRankWarning)
+                x = spla.spsolve(A.tocsc(), b)
+            # 奇异矩阵时 spsolve 只给警告、返回全 NaN，和稠密路径一样报错
+            if not np.isfinite(x).all():
+                raise np.linalg.LinAlgError("Singular matrix")
+        else:
+            x = np.linalg.solve(A, b)
+        result_str, result_latex, truncated = _matrix_output(x)
     elif op == "rank":
-        rank = np.linalg.matrix_rank(A)
+        rank = np.linalg.matrix_rank(_dense(A, "求秩"))
         result_str = str(rank)
         result_latex = str(rank)
     elif op == "transpose":
-        T = A.T
-        result_str = str(T.tolist())
-        result_latex = sp.latex(sp.Matrix(T))
+        result_str, result_latex, truncated = _matrix_output(A.T)
     else:
         raise ValueError(f"不支持的线性代数操作: {op}")
 
@@ -475,15 +1335,22 @@ def linear_algebra(op: str, matrix_a: str, matrix_b: str = None, vector: str = N
         "kind": "text",
         "result_str": result_str,
         "result_latex": result_latex,
+        "shape": list(A.shape),
+        "sparse": sparse,
+        "truncated": truncated,
     }
 
-def limit_expr(expr_str: str, var_name="x", approach="0", direction="+-", workspace: dict = None):
+def limit_expr(expr_str: str, var_name="x", approach="0", direction="+-", workspace: dict = None,
+               strategy="symbolic"):
     workspace = workspace or {}
+    strategy = _check_strategy(strategy)
     var = _sym(var_name)
     local_ws = dict(workspace)
     local_ws[var_name] = var
     expr = safe_parse(expr_str, local_ws)
     approach_val = safe_parse(approach, local_ws)
+    if strategy == "numeric":
+        return numeric_limit(expr, var, approach_val, direction)
     # direction: '+' 右极限, '-' 左极限, '+-' 双边极限
     if direction == "+":
         limit = sp.limit(expr, var, approach_val, dir="+")
@@ -496,9 +1363,24 @@ def limit_expr(expr_str: str, var_name="x", approach="0", direction="+-", worksp
         "expr_latex": sp.latex(expr),
         "result_str": str(limit),
         "result_latex": sp.latex(limit),
+        "method": "symbolic",
+        "unevaluated": limit.has(sp.Limit),
     }
 
-def series_expr(expr_str: str, var_name="x", point="0", order=6, workspace: dict | None = None):
+def _series_orders(order: int):
+    """渐进展开时依次计算的截断阶数：1, 2, 4, ... 直到 order；总耗时约为直接展开的 1~2 倍"""
+    k = 1
+    while k < order:
+        yield k
+        k *= 2
+    yield order
+
+
+def series_expr(expr_str: str, var_name="x", point="0", order=6, workspace: dict | None = None, progress=None):
+    """
+    progress：可选回调。给出时按 _series_orders 逐级加大截断阶数，每一级算完就交出当前的部分展开式
+    （stage="partial"），高阶展开要算很久时前端可以先显示低阶项；不给时直接一次展开。
+    """
     workspace = workspace or {}
     var = _sym(var_name)
     local_ws = dict(workspace)
@@ -514,7 +1396,21 @@ def series_expr(expr_str: str, var_name="x", point="0", order=6, workspace: dict
     except ValueError:
         raise ValueError("展开阶数必须为整数")
 
-    series = sp.series(expr, var, point_val, order)
+    if progress is None:
+        series = sp.series(expr, var, point_val, order)
+    else:
+        for k in _series_orders(order):
+            series = sp.series(expr, var, point_val, k)
+            if k < order:
+                progress({
+                    "kind": "text",
+                    "stage": "partial",
+                    "order": k,
+                    "order_total": order,
+                    "expr_latex": sp.latex(expr),
+                    "result_str": str(series),
+                    "result_latex": sp.latex(series),
+                })
     return {
         "kind": "text",
         "expr_latex": sp.latex(expr),
@@ -525,12 +1421,13 @@ def series_expr(expr_str: str, var_name="x", point="0", order=6, workspace: dict
 
 # ---------- 机器学习专用工具 ----------
 
-def gradient(expr_str: str, vars_str: str, workspace: dict = None):
+def gradient(expr_str: str, vars_str: str, workspace: dict = None, simplify=None):
     """
     计算多元标量函数的梯度向量
     :param expr_str: 表达式，例如 "x**2 + y**2"
     :param vars_str: 变量列表，逗号分隔，例如 "x, y"
     :param workspace: 工作空间
+    :param simplify: 化简级别 auto / none / cheap / full
     :return: 包含梯度向量字符串和 LaTeX 的字典
     """
     workspace = workspace or {}
@@ -543,10 +1440,14 @@ def gradient(expr_str: str, vars_str: str, workspace: dict = None):
     for name, sym in zip(var_names, symbols):
         local_ws[name] = sym
 
+    t0 = time.perf_counter()
     expr = safe_parse(expr_str, local_ws)
+    t1 = time.perf_counter()
     # 计算梯度：对每个变量求偏导
     grad = [sp.diff(expr, sym) for sym in symbols]
-    grad_simplified = [sp.simplify(g) for g in grad]
+    t2 = time.perf_counter()
+    grad_simplified, level = _simplify_each(grad, simplify)
+    t3 = time.perf_counter()
 
     # 格式化输出
     grad_str = "[" + ", ".join(str(g) for g in grad_simplified) + "]"
@@ -558,13 +1459,108 @@ def gradient(expr_str: str, vars_str: str, workspace: dict = None):
         "expr_latex": sp.latex(expr),
         "result_str": grad_str,
         "result_latex": grad_latex,
+        "simplify_level": level,
+        "timings": _timings(parse=t1 - t0, compute=t2 - t1, simplify=t3 - t2),
+    }
+
+# 数值求值：一次最多返回多少个矩阵元素（点数 × 行 × 列）
+ML_EVAL_MAX_ENTRIES = 200000
+
+def compile_matrix(symbols, M):
+    """
+    把符号矩阵编译成向量化的 numpy 函数 F(P)：P 形如 (N, len(symbols))，返回 (N, 行, 列)。
+    生成代码时做公共子表达式消除（lambdify(cse=True)），共享的子项每个点只算一次；结果按矩阵缓存。
+    """
+    M = sp.ImmutableMatrix(M)
+    rows, cols = M.shape
+    key = ("matrix", tuple(symbols), M)
+    F = _LAMBDA_CACHE.get(key)
+    if F is not None:
+        return F
+
+    f = sp.lambdify(symbols, list(M), modules=["numpy"], cse=True)
+
+    def F(P):
+        P = np.atleast_2d(np.asarray(P, dtype=float))
+        if P.shape[1] != len(symbols):
+            raise ValueError(f"每个点需要 {len(symbols)} 个坐标")
+        n = P.shape[0]
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            entries = f(*P.T)
+        # 常数元素是标量，广播到 N 个点
+        out = np.stack([np.broadcast_to(np.asarray(v), (n,)) for v in entries], axis=1)
+        return out.reshape(n, rows, cols)
+
+    _LAMBDA_CACHE.put(key, F)
+    return F
+
+def _parse_points(points, dim: int) -> np.ndarray:
+    """求值点：'1,2; 3,4' 或 [[1,2],[3,4]]，返回 (N, dim)"""
+    if isinstance(points, str):
+        rows = [[float(v) for v in chunk.split(",") if v.strip()]
+                for chunk in points.split(";") if chunk.strip()]
+    else:
+        rows = [[float(v) for v in row] for row in points]
+    if not rows or any(len(r) != dim for r in rows):
+        raise ValueError(f"求值点格式不正确：每个点需要 {dim} 个坐标，多个点用分号分隔")
+    return np.array(rows, dtype=float)
+
+def _evaluate_matrix(symbols, M, points) -> dict:
+    """在一组点上向量化求值，返回 values (N, 行, 列) 及耗时"""
+    P = _parse_points(points, len(symbols))
+    rows, cols = sp.Matrix(M).shape
+    if P.shape[0] * rows * cols > ML_EVAL_MAX_ENTRIES:
+        raise ValueError(f"求值规模过大（点数 × 矩阵元素数上限 {ML_EVAL_MAX_ENTRIES}）")
+    t0 = time.perf_counter()
+    F = compile_matrix(symbols, M)
+    t1 = time.perf_counter()
+    values = F(P)
+    t2 = time.perf_counter()
+    if np.iscomplexobj(values):
+        if np.allclose(values.imag, 0):
+            values = values.real
+        else:
+            raise ValueError("求值结果含复数，请检查定义域")
+    values = np.where(np.isfinite(values), values, np.nan)
+    return {
+        "points": int(P.shape[0]),
+        "values": [[[None if np.isnan(v) else float(v) for v in row] for row in mat] for mat in values],
+        "eval_timings": _timings(compile=t1 - t0, evaluate=t2 - t1),
     }
 
-def jacobian(exprs_str: str, vars_str: str, workspace: dict = None):
+def _cse_matrix(M, symbols, simplify=None):
+    """
+    对矩阵所有元素一起做公共子表达式消除，只化简消除后的（更小的）表达式。
+    返回 (替换列表 [(c_i, 子表达式)], 化简后的矩阵, 实际化简级别)
+    """
+    M = sp.Matrix(M)
+    names = sp.numbered_symbols("c", real=True, exclude=M.free_symbols | set(symbols))
+    replacements, reduced = sp.cse(list(M), symbols=names)
+    simplified, level = _simplify_each([sub for _, sub in replacements] + list(reduced), simplify)
+    replacements_s = [(sym, sub_s) for (sym, _), sub_s in zip(replacements, simplified)]
+    reduced_s = simplified[len(replacements):]
+    if level is None:
+        level = (simplify or "auto").lower()
+    return replacements_s, sp.Matrix(M.rows, M.cols, reduced_s), level
+
+def _cse_latex(replacements, reduced, lhs: str) -> tuple:
+    """公共子表达式结果的 LaTeX / 文本表示"""
+    latex = lhs + " = " + sp.latex(reduced)
+    text = str(reduced.tolist())
+    if replacements:
+        latex += r",\quad \text{其中 } " + r",\ ".join(
+            f"{sp.latex(sym)} = {sp.latex(sub)}" for sym, sub in replacements
+        )
+        text += "\n" + "\n".join(f"{sym} = {sub}" for sym, sub in replacements)
+    return text, latex
+
+def jacobian(exprs_str: str, vars_str: str, workspace: dict = None, simplify=None, cse=False, points=None):
     """
     计算多个函数关于变量的雅可比矩阵
     :param exprs_str: 函数列表，用分号分隔，例如 "x*y; x**2 + y**2"
     :param vars_str: 变量列表，逗号分隔
+    :param cse: True 时所有元素一起做公共子表达式消除，结果以 “矩阵 + 子表达式列表” 的形式给出
+    :param points: 可选，求值点 '1,2; 3,4'；给出时用编译好的 numpy 函数一次性向量化求值
     """
     workspace = workspace or {}
     var_names = [v.strip() for v in vars_str.split(',') if v.strip()]
@@ -580,16 +1576,38 @@ def jacobian(exprs_str: str, vars_str: str, workspace: dict = None):
     if not expr_strings:
         raise ValueError("至少需要提供一个函数")
 
+    t0 = time.perf_counter()
     exprs = [safe_parse(e, local_ws) for e in expr_strings]
+    t1 = time.perf_counter()
 
     # 构建雅可比矩阵：行对应函数，列对应变量
     J = []
     for f in exprs:
         row = [sp.diff(f, sym) for sym in symbols]
         J.append(row)
+    t2 = time.perf_counter()
+
+    if cse:
+        replacements, J_reduced, level = _cse_matrix(J, symbols, simplify)
+        t3 = time.perf_counter()
+        J_str, J_latex = _cse_latex(replacements, J_reduced, r"\mathbf{J}")
+        result = {
+            "kind": "text",
+            "result_str": J_str,
+            "result_latex": J_latex,
+            "simplify_level": level,
+            "cse_terms": len(replacements),
+            "timings": _timings(parse=t1 - t0, compute=t2 - t1, simplify=t3 - t2),
+        }
+        if points:
+            result.update(_evaluate_matrix(symbols, J, points))
+        return result
 
     # 简化每个元素
-    J_simple = [[sp.simplify(entry) for entry in row] for row in J]
+    flat, level = _simplify_each([entry for row in J for entry in row], simplify)
+    width = len(symbols)
+    J_simple = [flat[i * width:(i + 1) * width] for i in range(len(J))]
+    t3 = time.perf_counter()
 
     # 格式化输出
     J_latex = r"\mathbf{J} = \begin{bmatrix}"
@@ -603,15 +1621,21 @@ def jacobian(exprs_str: str, vars_str: str, workspace: dict = None):
     # 字符串表示（简化）
     J_str = "\n".join([str(row) for row in J_simple])
 
-    return {
+    result = {
         "kind": "text",
         "result_str": J_str,
         "result_latex": J_latex,
+        "simplify_level": level,
+        "timings": _timings(parse=t1 - t0, compute=t2 - t1, simplify=t3 - t2),
     }
+    if points:
+        result.update(_evaluate_matrix(symbols, J, points))
+    return result
 
-def hessian(expr_str: str, vars_str: str, workspace: dict = None):
+def hessian(expr_str: str, vars_str: str, workspace: dict = None, simplify=None, cse=False, points=None):
     """
     计算标量函数的海森矩阵
+    cse / points 含义同 jacobian
     """
     workspace = workspace or {}
     var_names = [v.strip() for v in vars_str.split(',') if v.strip()]
@@ -622,37 +1646,129 @@ def hessian(expr_str: str, vars_str: str, workspace: dict = None):
     for name, sym in zip(var_names, symbols):
         local_ws[name] = sym
 
+    t0 = time.perf_counter()
     expr = safe_parse(expr_str, local_ws)
+    t1 = time.perf_counter()
 
     # 计算海森矩阵
     H = sp.hessian(expr, symbols)
-    # 简化每个元素
-    H_simple = sp.simplify(H)
+    t2 = time.perf_counter()
 
-    # 格式化输出
-    H_latex = sp.latex(H_simple)
-    H_str = str(H_simple)
+    if cse:
+        replacements, H_reduced, level = _cse_matrix(H, symbols, simplify)
+        t3 = time.perf_counter()
+        H_str, H_latex = _cse_latex(replacements, H_reduced, r"\mathbf{H}")
+        extra = {"cse_terms": len(replacements)}
+    else:
+        # 简化每个元素
+        H_simple, level = _simplify(H, simplify)
+        t3 = time.perf_counter()
 
-    return {
+        # 格式化输出
+        H_latex = sp.latex(H_simple)
+        H_str = str(H_simple)
+        extra = {}
+
+    result = {
         "kind": "text",
         "expr_latex": sp.latex(expr),
         "result_str": H_str,
         "result_latex": H_latex,
+        "simplify_level": level,
+        "timings": _timings(parse=t1 - t0, compute=t2 - t1, simplify=t3 - t2),
+        **extra,
     }
-
-def gradient_descent_demo(func_str: str, vars_str: str, x0_str: str, lr: float = 0.1, steps: int = 20):
+    if points:
+        result.update(_evaluate_matrix(symbols, H, points))
+    return result
+
+GD_OPTIMIZERS = ("gd", "momentum", "adam", "newton")
+GD_MAX_STARTS = 2500
+GD_MAX_STEPS = 5000
+GD_MAX_WORK = 1_000_000   # 起点数 × 步数上限：轨迹全部留在内存里，(steps+1, m, 2) 个 float64
+GD_MAX_PATH_POINTS = 100_000  # 返回的轨迹最多这么多个点（帧数 × 起点数），超出时均匀抽帧
+GD_DIVERGE = 1e6          # 坐标绝对值超过它视为发散
+GD_PATHS_DRAWN = 50       # 起点多于这个数时 PNG 只画起点（按收敛到的极小点着色），不画轨迹
+
+def _parse_starts(x0_str: str, grid_n=0, grid_range="-2,2") -> np.ndarray:
     """
-    梯度下降数值演示，绘制函数等高线和迭代轨迹
+    初始点：'1, 2' 单个点，'1,2; -1,0.5; ...' 多个点；
+    grid_n > 0 时在 grid_range 的正方形上取 grid_n×grid_n 个起点（吸引域研究）。
+    """
+    grid_n = int(grid_n or 0)
+    if grid_n > 0:
+        lo_hi = [float(v) for v in str(grid_range).split(",") if v.strip()]
+        if len(lo_hi) != 2 or lo_hi[0] >= lo_hi[1]:
+            raise ValueError("起点网格范围格式应为 'min, max'")
+        if grid_n * grid_n > GD_MAX_STARTS:
+            raise ValueError(f"起点过多（上限 {GD_MAX_STARTS} 个）")
+        g = np.linspace(lo_hi[0], lo_hi[1], grid_n)
+        GX, GY = np.meshgrid(g, g)
+        return np.column_stack([GX.ravel(), GY.ravel()])
+
+    starts = []
+    for chunk in str(x0_str).split(";"):
+        if not chunk.strip():
+            continue
+        vals = [float(v.strip()) for v in chunk.split(",") if v.strip()]
+        if len(vals) != 2:
+            raise ValueError("初始点需要两个数值，例如 '1, 2'；多个初始点用分号分隔")
+        starts.append(vals)
+    if not starts:
+        raise ValueError("初始点需要两个数值，例如 '1, 2'")
+    if len(starts) > GD_MAX_STARTS:
+        raise ValueError(f"起点过多（上限 {GD_MAX_STARTS} 个）")
+    return np.array(starts, dtype=float)
+
+def _distinct_points(points: np.ndarray, tol=1e-3, limit=10) -> list:
+    """把收敛终点按距离聚类，返回不同的极小点及每个终点的类别编号"""
+    centers, labels = [], np.full(len(points), -1)
+    for i, p in enumerate(points):
+        for k, c in enumerate(centers):
+            if np.max(np.abs(p - c)) <= tol * max(1.0, np.max(np.abs(c))):
+                labels[i] = k
+                break
+        else:
+            if len(centers) < limit:
+                centers.append(p)
+                labels[i] = len(centers) - 1
+    return centers, labels
+
+def _subsample_frames(history: np.ndarray, max_frames: int) -> np.ndarray:
+    """帧数超过 max_frames 时均匀抽帧，保留第一帧和最后一帧"""
+    frames = history.shape[0]
+    if frames <= max_frames:
+        return history
+    return history[np.unique(np.linspace(0, frames - 1, max_frames).round().astype(int))]
+
+def gradient_descent_demo(func_str: str, vars_str: str, x0_str: str, lr: float = 0.1, steps: int = 20,
+                          output="png", optimizer="gd", grid_n=0, grid_range="-2,2", tol=1e-6):
+    """
+    梯度下降数值演示，绘制函数等高线和迭代轨迹。
+    所有起点放在一个 (m, 2) 数组里同时迭代，每步只调用一次向量化的梯度/海森函数；
+    梯度范数小于 tol 的点冻结（收敛），越界/非有限的点冻结（发散），全部冻结即提前停止——
+    所以即使单起点 + gd，迭代次数也可能少于 steps，发散时轨迹停在最后一个有限点。
+    起点数 × 步数不超过 GD_MAX_WORK；data 输出的轨迹超过 GD_MAX_PATH_POINTS 个点时抽帧。
     :param func_str: 二元函数表达式，例如 "x**2 + y**2"
     :param vars_str: 变量名，例如 "x, y"
-    :param x0_str: 初始点，例如 "1, 2"
-    :param lr: 学习率
-    :param steps: 迭代步数
-    :return: 包含图像 base64 的字典
+    :param x0_str: 初始点，例如 "1, 2"；多个初始点用分号分隔 "1,2; -1,0"
+    :param lr: 学习率（newton 下为阻尼系数，1 即标准牛顿法）
+    :param steps: 最大迭代步数
+    :param output: png 返回图像 base64；data 返回等高线网格与轨迹的压缩数组，由浏览器绘制
+    :param optimizer: gd / momentum / adam / newton
+    :param grid_n: >0 时忽略 x0，在 grid_range 上取 grid_n×grid_n 个起点
+    :param tol: 收敛阈值（梯度范数）
+    :return: 包含图像 base64（或绘图数据）的字典
     """
-    import matplotlib.pyplot as plt
-    from matplotlib import cm
-    import numpy as np
+    output = _check_output(output)
+    optimizer = (optimizer or "gd").lower()
+    if optimizer not in GD_OPTIMIZERS:
+        raise ValueError("优化器只支持 gd / momentum / adam / newton")
+    steps = int(steps)
+    if steps < 1 or steps > GD_MAX_STEPS:
+        raise ValueError(f"步数建议 1~{GD_MAX_STEPS}")
+    lr = float(lr)
+    tol = float(tol)
 
     # 解析变量和初始点
     var_names = [v.strip() for v in vars_str.split(',') if v.strip()]
@@ -662,58 +1778,159 @@ def gradient_descent_demo(func_str: str, vars_str: str, x0_str: str, lr: float =
     x_sym = _sym(x_name)
     y_sym = _sym(y_name)
 
-    # 解析初始点
-    x0_vals = [float(v.strip()) for v in x0_str.split(',') if v.strip()]
-    if len(x0_vals) != 2:
-        raise ValueError("初始点需要两个数值，例如 '1, 2'")
+    starts = _parse_starts(x0_str, grid_n, grid_range)
+    m = starts.shape[0]
+    if m * steps > GD_MAX_WORK:
+        raise ValueError(f"起点数 × 步数过大（{m} × {steps}，上限 {GD_MAX_WORK}），请减少起点或步数")
 
     # 解析函数表达式
     expr = safe_parse(func_str, {x_name: x_sym, y_name: y_sym})
 
-    # 计算梯度函数
-    grad_x = sp.lambdify((x_sym, y_sym), sp.diff(expr, x_sym), modules='numpy')
-    grad_y = sp.lambdify((x_sym, y_sym), sp.diff(expr, y_sym), modules='numpy')
-    f = sp.lambdify((x_sym, y_sym), expr, modules='numpy')
-
-    # 执行梯度下降
-    points = [np.array(x0_vals, dtype=float)]
-    for _ in range(steps):
-        x, y = points[-1]
-        gx = grad_x(x, y)
-        gy = grad_y(x, y)
-        new_x = x - lr * gx
-        new_y = y - lr * gy
-        points.append(np.array([new_x, new_y]))
-    points = np.array(points)
+    # 计算梯度函数（以及牛顿法需要的海森矩阵），全部 lambdify 成接受数组的函数
+    args = (x_sym, y_sym)
+    grad_x = _lambdify(args, sp.diff(expr, x_sym))
+    grad_y = _lambdify(args, sp.diff(expr, y_sym))
+    f = _lambdify(args, expr)
+    if optimizer == "newton":
+        hess = compile_matrix(args, sp.hessian(expr, args))
+
+    def grad(P):
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            gx = np.broadcast_to(grad_x(P[:, 0], P[:, 1]), (P.shape[0],))
+            gy = np.broadcast_to(grad_y(P[:, 0], P[:, 1]), (P.shape[0],))
+        return np.column_stack([gx, gy]).astype(float)
+
+    # 执行优化：history[t] 为第 t 步所有点的位置
+    P = starts.copy()
+    history = [P.copy()]
+    active = np.ones(m, dtype=bool)
+    converged = np.zeros(m, dtype=bool)
+    velocity = np.zeros_like(P)
+    m1 = np.zeros_like(P)
+    m2 = np.zeros_like(P)
+    beta, beta1, beta2, eps = 0.9, 0.9, 0.999, 1e-8
+
+    for t in range(1, steps + 1):
+        idx = np.nonzero(active)[0]
+        Q = P[idx]
+        G = grad(Q)
+
+        if optimizer == "gd":
+            step = lr * G
+        elif optimizer == "momentum":
+            velocity[idx] = beta * velocity[idx] + G
+            step = lr * velocity[idx]
+        elif optimizer == "adam":
+            m1[idx] = beta1 * m1[idx] + (1 - beta1) * G
+            m2[idx] = beta2 * m2[idx] + (1 - beta2) * G * G
+            m_hat = m1[idx] / (1 - beta1 ** t)
+            v_hat = m2[idx] / (1 - beta2 ** t)
+            step = lr * m_hat / (np.sqrt(v_hat) + eps)
+        else:
+            HQ = hess(Q)
+            a, b, d = HQ[:, 0, 0], HQ[:, 0, 1], HQ[:, 1, 1]
+            with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                det = a * d - b * b
+                newton = np.column_stack([(d * G[:, 0] - b * G[:, 1]) / det,
+                                          (a * G[:, 1] - b * G[:, 0]) / det])
+            # 海森矩阵奇异的点退化为普通梯度步
+            singular = ~np.isfinite(newton).all(axis=1) | (np.abs(det) < 1e-12)
+            newton[singular] = G[singular]
+            step = lr * newton
+
+        new_Q = Q - step
+        bad = ~np.isfinite(new_Q).all(axis=1) | (np.abs(new_Q) > GD_DIVERGE).any(axis=1)
+        new_Q[bad] = Q[bad]
+        P[idx] = new_Q
+
+        done = np.linalg.norm(G, axis=1) < tol
+        converged[idx[done & ~bad]] = True
+        active[idx[done | bad]] = False
+        history.append(P.copy())
+        if not active.any():
+            break
+
+    history = np.array(history)             # (iterations + 1, m, 2)
+    iterations = history.shape[0] - 1
+    finals = history[-1]
+    # 只对收敛的终点聚类：没收敛的点停在半路，不是极小点，类别记为 -1
+    centers, converged_labels = _distinct_points(finals[converged])
+    labels = np.full(m, -1)
+    labels[converged] = converged_labels
 
     # 绘制等高线和轨迹
-    x_min, x_max = min(points[:,0].min(), -2), max(points[:,0].max(), 2)
-    y_min, y_max = min(points[:,1].min(), -2), max(points[:,1].max(), 2)
+    span = np.vstack([starts, finals])
+    x_min, x_max = min(span[:, 0].min(), -2), max(span[:, 0].max(), 2)
+    y_min, y_max = min(span[:, 1].min(), -2), max(span[:, 1].max(), 2)
     X, Y = np.meshgrid(np.linspace(x_min, x_max, 100),
                        np.linspace(y_min, y_max, 100))
-    Z = f(X, Y)
-
-    fig, ax = plt.subplots(figsize=(8,6))
-    contour = ax.contour(X, Y, Z, levels=20, cmap=cm.viridis)
-    ax.clabel(contour, inline=True, fontsize=8)
-    ax.plot(points[:,0], points[:,1], 'ro-', markersize=4, label='GD path')
-    ax.plot(points[0,0], points[0,1], 'go', markersize=8, label='Start')
-    ax.plot(points[-1,0], points[-1,1], 'bo', markersize=8, label='End')
-    ax.set_xlabel(x_name)
-    ax.set_ylabel(y_name)
-    ax.set_title(f"Gradient Descent, lr={lr}, steps={steps}")
-    ax.legend()
-    ax.grid(alpha=0.3)
-
-    # 保存为 base64
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png', dpi=120, bbox_inches='tight')
-    plt.close(fig)
-    buf.seek(0)
-    img_b64 = base64.b64encode(buf.read()).decode('utf-8')
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        Z = f(X, Y)
+    Z = np.array(np.broadcast_to(Z, X.shape), dtype=float)
+    Z[~np.isfinite(Z)] = np.nan
+
+    summary = {
+        "optimizer": optimizer,
+        "starts": int(m),
+        "iterations": int(iterations),
+        "converged": int(converged.sum()),
+        "minima": [[float(v) for v in c] for c in centers],
+    }
+
+    if output == "data":
+        path = _subsample_frames(history, max(2, GD_MAX_PATH_POINTS // m))
+        return {
+            "kind": "plot_data",
+            "plot": "contour",
+            "func_latex": sp.latex(expr),
+            "x_label": x_name,
+            "y_label": y_name,
+            "x": _pack_array(X[0]),
+            "y": _pack_array(Y[:, 0]),
+            "z": _pack_array(Z),
+            # 单起点时保持 (帧数, 2)，多起点为 (帧数, m, 2)
+            "path": _pack_array(path[:, 0, :] if m == 1 else path),
+            "path_frames": int(path.shape[0]),
+            "labels": labels.tolist(),
+            **summary,
+        }
+
+    from matplotlib import cm
+    from .render import figure_to_base64, pooled_figure
+
+    title = f"{optimizer.upper() if optimizer != 'gd' else 'Gradient Descent'}, lr={lr}, steps={iterations}"
+    with pooled_figure(figsize=(8, 6)) as fig:
+        ax = fig.add_subplot(111)
+        contour = ax.contour(X, Y, Z, levels=20, cmap=cm.viridis)
+        ax.clabel(contour, inline=True, fontsize=8)
+        if m == 1:
+            points = history[:, 0, :]
+            ax.plot(points[:,0], points[:,1], 'ro-', markersize=4, label='GD path')
+            ax.plot(points[0,0], points[0,1], 'go', markersize=8, label='Start')
+            ax.plot(points[-1,0], points[-1,1], 'bo', markersize=8, label='End')
+        elif m <= GD_PATHS_DRAWN:
+            for i in range(m):
+                ax.plot(history[:, i, 0], history[:, i, 1], '-', linewidth=1, alpha=0.7)
+            ax.plot(starts[:, 0], starts[:, 1], 'go', markersize=4, label='Start')
+            ax.plot(finals[:, 0], finals[:, 1], 'bo', markersize=5, label='End')
+        else:
+            # 吸引域：起点按最终落入的极小点着色
+            ax.scatter(starts[:, 0], starts[:, 1], c=labels, cmap=cm.tab10, s=12, label='Start (by basin)')
+            if centers:
+                cs = np.array(centers)
+                ax.plot(cs[:, 0], cs[:, 1], 'k*', markersize=12, label='Minima')
+        ax.set_xlabel(x_name)
+        ax.set_ylabel(y_name)
+        ax.set_title(title)
+        ax.legend()
+        ax.grid(alpha=0.3)
+
+        # 保存为 base64
+        img_b64 = figure_to_base64(fig, dpi=120)
 
     return {
         "kind": "plot",
         "img_base64": img_b64,
         "func_latex": sp.latex(expr),
-    }
\ No newline at end of file
+        **summary,
+    }
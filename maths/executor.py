@@ -0,0 +1,219 @@
+import multiprocessing as mp
+import os
+import threading
+import time
+
+# 这些模式可能让 SymPy 跑上几分钟，放到独立进程里执行，超时/超内存直接杀掉
+SYMBOLIC_MODES = {"simplify", "integrate", "solve", "limit", "series"}
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+class BudgetExceeded(Exception):
+    """符号计算超出时间或内存预算，已被取消"""
+
+    def __init__(self, kind: str, limit, elapsed: float):
+        self.kind = kind          # "timeout" | "memory"
+        self.limit = limit
+        self.elapsed = elapsed
+        if kind == "memory":
+            msg = f"计算占用内存超过 {limit} MB，已取消"
+        else:
+            msg = f"计算超时（超过 {limit} 秒），已取消"
+        super().__init__(msg)
+
+    def as_dict(self) -> dict:
+        return {
+            "timed_out": self.kind == "timeout",
+            "reason": self.kind,
+            "limit": self.limit,
+            "elapsed": round(self.elapsed, 3),
+        }
+
+
+class Cancelled(Exception):
+    """调用方主动取消了计算（例如流式请求的客户端已断开）"""
+
+
+def _rss_mb(pid: int):
+    """读取子进程常驻内存（MB）；非 Linux 平台返回 None，不做内存限制"""
+    try:
+        with open(f"/proc/{pid}/statm") as fh:
+            resident_pages = int(fh.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * _PAGE_SIZE / (1024 * 1024)
+
+
+def _worker_main(conn):
+    from maths import engine
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None:
+            break
+
+        mode, payload, workspace, stream = msg
+        # stream=True 时中间结果也经管道发回父进程
+        progress = (lambda partial: conn.send(("partial", partial))) if stream else None
+        try:
+            conn.send(("ok", engine.run(mode, payload, workspace, progress=progress)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+def _get_context():
+    # forkserver 预加载 engine：新 worker 不用重新 import sympy，也不会继承 Django 线程里的锁
+    if "forkserver" in mp.get_all_start_methods():
+        ctx = mp.get_context("forkserver")
+        ctx.set_forkserver_preload(["maths.engine"])
+        return ctx
+    return mp.get_context("spawn")
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.proc.start()
+        child_conn.close()
+
+    def kill(self):
+        try:
+            self.proc.kill()
+            self.proc.join(1)
+        finally:
+            self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.proc.join(1)
+        except (OSError, BrokenPipeError):
+            pass
+        if self.proc.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class BudgetPool:
+    """
+    常驻的符号计算进程池。
+    每个请求独占一个 worker，父进程轮询结果，同时检查耗时和 worker 的 RSS；
+    超出预算就杀掉该 worker（下次按需补一个新的），请求线程立刻返回。
+    """
+
+    def __init__(self, max_workers: int = 2, poll_interval: float = 0.05):
+        self.max_workers = max(1, int(max_workers))
+        self.poll_interval = poll_interval
+        self._ctx = _get_context()
+        self._idle = []
+        self._total = 0
+        self._cond = threading.Condition()
+
+    def _acquire(self, deadline: float):
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._total < self.max_workers:
+                    self._total += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+        try:
+            return _Worker(self._ctx)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, worker: _Worker, healthy: bool):
+        with self._cond:
+            if healthy:
+                self._idle.append(worker)
+            else:
+                self._total -= 1
+            self._cond.notify()
+        if not healthy:
+            worker.kill()
+
+    def run(self, mode: str, payload: dict, workspace: dict | None = None,
+            timeout: float = 10.0, memory_mb: int | None = 512, progress=None, cancel=None):
+        """
+        progress：可选回调，worker 交出的中间结果（stage="partial" / "preview"）会转给它；
+        cancel：可选 threading.Event，置位后杀掉 worker 并抛 Cancelled。
+        """
+        start = time.monotonic()
+        deadline = start + float(timeout)
+
+        worker = self._acquire(deadline)
+        if worker is None:
+            raise BudgetExceeded("timeout", timeout, time.monotonic() - start)
+
+        healthy = False
+        try:
+            worker.conn.send((mode, payload, workspace or {}, progress is not None))
+            while True:
+                while not worker.conn.poll(self.poll_interval):
+                    elapsed = time.monotonic() - start
+                    if cancel is not None and cancel.is_set():
+                        raise Cancelled("计算已取消")
+                    if elapsed >= timeout:
+                        raise BudgetExceeded("timeout", timeout, elapsed)
+                    if memory_mb:
+                        rss = _rss_mb(worker.proc.pid)
+                        if rss is not None and rss > memory_mb:
+                            raise BudgetExceeded("memory", memory_mb, elapsed)
+                    if not worker.proc.is_alive():
+                        raise RuntimeError("计算进程异常退出")
+
+                try:
+                    status, value = worker.conn.recv()
+                except EOFError:
+                    raise RuntimeError("计算进程异常退出")
+                if status != "partial":
+                    break
+                progress(value)
+            healthy = True
+        finally:
+            self._release(worker, healthy)
+
+        if status == "error":
+            raise ValueError(value)
+        return value
+
+    def shutdown(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for worker in idle:
+            worker.stop()
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_pool(max_workers: int = 2) -> BudgetPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = BudgetPool(max_workers=max_workers)
+        return _POOL
+
+
+def run_with_budget(mode: str, payload: dict, workspace: dict | None = None,
+                    timeout: float = 10.0, memory_mb: int | None = 512, max_workers: int = 2,
+                    progress=None, cancel=None):
+    """在进程池里执行 engine.run，超时或超内存时抛 BudgetExceeded，被取消时抛 Cancelled"""
+    return get_pool(max_workers).run(
+        mode, payload, workspace, timeout=timeout, memory_mb=memory_mb, progress=progress, cancel=cancel
+    )
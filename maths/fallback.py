@@ -0,0 +1,91 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .executor import BudgetExceeded
+
+# 有数值兜底的模式：定积分（自适应求积）、极限（Richardson 外推）
+FALLBACK_MODES = {"integrate", "limit"}
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="maths-race")
+        return _EXECUTOR
+
+
+def _has_numeric_path(mode: str, payload: dict) -> bool:
+    if mode == "integrate":
+        # 不定积分没有数值解
+        return all(str(payload.get(k) if payload.get(k) is not None else "").strip() for k in ("a", "b"))
+    return mode in FALLBACK_MODES
+
+
+def _symbolic_status(future) -> str | None:
+    """符号结果可用时返回 None，否则返回没用上它的原因"""
+    if not future.done():
+        return "timeout"
+    error = future.exception()
+    if isinstance(error, BudgetExceeded):
+        return error.kind
+    if error is not None:
+        return f"error: {error}"
+    if future.result().get("unevaluated"):
+        return "unevaluated"
+    return None
+
+
+def race(run_symbolic, mode: str, payload: dict, workspace: dict | None = None,
+         budget: float = 3.0, max_workers: int = 4, numeric_timeout: float | None = None) -> dict:
+    """
+    符号与数值两条路径同时计算（都经 run_symbolic 放进带预算的进程池），在 budget 秒内：
+    - 符号路径先给出闭式解 → 直接返回符号结果（method="symbolic"）；
+    - 符号路径超时 / 出错 / 结果仍含未求出的 Integral、Limit → 返回数值结果（method="numeric"），
+      symbolic_status 说明原因。
+    run_symbolic(mode, payload, workspace, timeout, cancel=None) 负责到时取消计算：沙箱开启时超时的 worker 进程会被杀掉；
+    沙箱关闭时线程无法中止，只是不再等待它的结果。数值路径以 numeric_timeout（默认同 budget）为上限，
+    符号路径胜出后立即取消，不再占用进程池。
+    """
+    workspace = workspace or {}
+    if not _has_numeric_path(mode, payload):
+        return run_symbolic(mode, {**payload, "strategy": "symbolic"}, workspace, None)
+
+    start = time.monotonic()
+    executor = _get_executor(max_workers)
+    symbolic = executor.submit(run_symbolic, mode, {**payload, "strategy": "symbolic"}, workspace, budget)
+    cancel_numeric = threading.Event()
+    numeric = executor.submit(
+        run_symbolic, mode, {**payload, "strategy": "numeric"}, workspace, numeric_timeout or budget,
+        cancel=cancel_numeric,
+    )
+
+    # 先等符号路径，期间数值路径也在算；符号路径提前失败时不必等满预算
+    pending = {symbolic}
+    while pending:
+        remaining = budget - (time.monotonic() - start)
+        if remaining <= 0:
+            break
+        _, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    status = _symbolic_status(symbolic)
+    if status is None:
+        cancel_numeric.set()
+        return symbolic.result()
+
+    try:
+        result = numeric.result()
+    except Exception:
+        # 两条路径都失败：符号路径的错误通常更有信息量，超时则报数值路径的错误
+        if symbolic.done() and symbolic.exception() is not None and status not in ("timeout", "memory"):
+            raise symbolic.exception()
+        if status == "unevaluated":
+            return symbolic.result()
+        raise
+    result["symbolic_status"] = status
+    result["elapsed_ms"] = round((time.monotonic() - start) * 1000, 3)
+    return result
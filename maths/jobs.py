@@ -0,0 +1,114 @@
+import copy
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# 与 deeplearning.utils.trainer 的训练任务一致：内存字典 + 全局锁，状态 queued/running/finished/error
+MATH_JOBS = {}
+MATH_JOBS_LOCK = threading.Lock()
+
+# 已结束的任务保留多久（秒），超过后在下一次提交时清理
+FINISHED_JOB_TTL = 600
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="maths-job")
+        return _EXECUTOR
+
+
+def _prune_finished(now: float):
+    with MATH_JOBS_LOCK:
+        expired = [
+            job_id for job_id, job in MATH_JOBS.items()
+            if job["finished_at"] and now - job["finished_at"] > FINISHED_JOB_TTL
+        ]
+        for job_id in expired:
+            del MATH_JOBS[job_id]
+
+
+def start_math_job(fn, mode: str, payload: dict, user_id=None, max_workers: int = 4) -> str:
+    """
+    把 fn(payload, progress=...) 放到后台线程池执行，立即返回 job_id。
+    fn 通常是 views_api 里的统一分发函数（符号计算仍会走带预算的进程池）；
+    fn 可以调用 progress(partial) 先交出中间结果（例如 3D 作图的粗网格预览），轮询时从 job["partial"] 读取。
+    """
+    now = time.time()
+    _prune_finished(now)
+
+    job_id = uuid.uuid4().hex
+    job_data = {
+        "job_id": job_id,
+        "user_id": user_id,
+        "mode": mode,
+        "status": "queued",
+        "message": "计算任务已创建，等待执行。",
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None,
+        "result": None,
+        "partial": None,
+        "partial_seq": 0,
+        "error": None,
+    }
+
+    with MATH_JOBS_LOCK:
+        MATH_JOBS[job_id] = job_data
+
+    _get_executor(max_workers).submit(_run_math_job, job_id, fn, payload)
+    return job_id
+
+
+def get_math_job(job_id: str, user_id=None):
+    with MATH_JOBS_LOCK:
+        job = MATH_JOBS.get(job_id)
+        if not job or (user_id is not None and job["user_id"] != user_id):
+            return None
+        return copy.deepcopy(job)
+
+
+def _update_job(job_id: str, **kwargs):
+    with MATH_JOBS_LOCK:
+        if job_id in MATH_JOBS:
+            MATH_JOBS[job_id].update(kwargs)
+
+
+def _report_partial(job_id: str, partial):
+    with MATH_JOBS_LOCK:
+        job = MATH_JOBS.get(job_id)
+        if job is not None:
+            job["partial"] = partial
+            job["partial_seq"] += 1
+            job["message"] = "已生成预览，继续计算…"
+
+
+def _run_math_job(job_id: str, fn, payload: dict):
+    _update_job(job_id, status="running", started_at=time.time(), message="计算中…")
+    try:
+        result = fn(payload, progress=lambda partial: _report_partial(job_id, partial))
+        _update_job(
+            job_id,
+            status="finished",
+            result=result,
+            partial=None,
+            finished_at=time.time(),
+            message="计算完成",
+        )
+    except Exception as e:
+        extra = e.as_dict() if hasattr(e, "as_dict") else {}
+        _update_job(
+            job_id,
+            status="error",
+            error=str(e),
+            finished_at=time.time(),
+            message=f"{type(e).__name__}: {str(e)}",
+            traceback=traceback.format_exc(),
+            **extra,
+        )
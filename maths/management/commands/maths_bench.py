@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from maths.bench import CORPUS, compare, load_results, run_benchmarks, write_results
+
+
+class Command(BaseCommand):
+    help = "Benchmark maths.engine on a fixed corpus (latency percentiles + peak memory), or compare two result files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", action="append", choices=sorted(CORPUS),
+                            help="只跑指定模式，可重复；默认全部")
+        parser.add_argument("--case", action="append", help="只跑指定名字的用例，可重复")
+        parser.add_argument("--repeat", type=int, default=5, help="每个用例重复次数（默认 5）")
+        parser.add_argument("--warm", action="store_true", help="保留解析/lambdify 缓存（默认每次迭代前清空）")
+        parser.add_argument("--startup", action="store_true",
+                            help="额外测量新进程 import maths.urls 的耗时（以及是否加载了 sympy/numpy/matplotlib）")
+        parser.add_argument("--startup-only", action="store_true", help="只测启动耗时")
+        parser.add_argument("--output", "-o", help="把结果写入 JSON 文件")
+        parser.add_argument("--compare", nargs="+", metavar="FILE",
+                            help="BASE.json [HEAD.json]：与基线比较；只给 BASE 时先跑一遍当前代码作为 HEAD")
+        parser.add_argument("--threshold", type=float, default=0.10, help="判定回退的相对阈值（默认 0.10）")
+        parser.add_argument("--metric", default="p50_ms",
+                            choices=["p50_ms", "p90_ms", "p95_ms", "p99_ms", "mean_ms", "min_ms"])
+        parser.add_argument("--fail-on-regression", action="store_true", help="有回退时以非零状态退出")
+
+    def handle(self, *args, **options):
+        compare_files = options.get("compare") or []
+        if len(compare_files) > 2:
+            raise CommandError("--compare 最多两个文件")
+
+        if len(compare_files) == 2:
+            base, head = (load_results(p) for p in compare_files)
+        else:
+            head = run_benchmarks(
+                modes=options.get("mode"),
+                repeat=options["repeat"],
+                warm=options["warm"],
+                names=["startup-maths-urls"] if options["startup_only"] else options.get("case"),
+                on_case=self._print_case,
+                startup=options["startup"] or options["startup_only"],
+            )
+            if options.get("output"):
+                write_results(head, options["output"])
+                self.stdout.write(self.style.SUCCESS(f"结果已写入 {options['output']}"))
+            if not compare_files:
+                return
+            base = load_results(compare_files[0])
+
+        rows = compare(base, head, threshold=options["threshold"], metric=options["metric"])
+        regressions = self._print_comparison(rows, options["metric"])
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"{regressions} 个用例出现性能回退")
+
+    def _print_case(self, r):
+        if not r["ok"]:
+            self.stdout.write(self.style.ERROR(f"{r['name']:<24} 失败：{r['error']}"))
+            return
+        if r["mode"] == "startup":
+            self.stdout.write(
+                f"{r['name']:<24} p50 {r['p50_ms']:>9.2f} ms  p95 {r['p95_ms']:>9.2f} ms  "
+                f"django.setup p50 {r['django_setup_p50_ms']:.2f} ms  "
+                f"已加载：{', '.join(r['heavy_modules_loaded']) or '无'}"
+            )
+            return
+        self.stdout.write(
+            f"{r['name']:<24} p50 {r['p50_ms']:>9.2f} ms  p95 {r['p95_ms']:>9.2f} ms  "
+            f"max {r['max_ms']:>9.2f} ms  peak {r['peak_kb']:>9.1f} KB"
+        )
+
+    def _print_comparison(self, rows, metric) -> int:
+        regressions = 0
+        self.stdout.write(f"\n{'case':<24} {'base':>10} {'head':>10} {'ratio':>7}  mem(KB)            {metric}")
+        for row in rows:
+            if row["status"] in ("missing", "error"):
+                self.stdout.write(self.style.WARNING(f"{row['name']:<24} {row['status']}  {row.get('error') or ''}"))
+                continue
+            mem = (f"{row['base_peak_kb']:>8.1f} -> {row['head_peak_kb']:<8.1f}"
+                   if row["base_peak_kb"] is not None and row["head_peak_kb"] is not None else f"{'-':>8}    {'-':<8}")
+            line = (
+                f"{row['name']:<24} {row['base']:>10.2f} {row['head']:>10.2f} {row['ratio'] or 0:>7.3f}  "
+                f"{mem}  {row['status']}"
+            )
+            if row["status"] == "regression":
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            elif row["status"] == "improvement":
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stdout.write(line)
+        return regressions
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+
+from .cache import LRUCache
+
+# 结果只取决于输入的模式；作图、梯度下降演示这类输出图片/大数组的不缓存
+MEMO_MODES = {"simplify", "diff", "integrate", "solve", "limit", "series"}
+
+# 这些字段不影响计算结果，不参与 key
+_IGNORED_KEYS = {"mode"}
+
+# 可以缓存的 symbolic_status：None（符号结果或非竞速模式）与 unevaluated（符号路径算完了但没有闭式解）；
+# timeout / memory / error 取决于当时的负载，缓存下来会把一次偶然的降级结果固定很久
+_CACHEABLE_STATUSES = {None, "unevaluated"}
+
+_MEMO = None
+_MEMO_LOCK = threading.Lock()
+_BACKEND_DISABLED = False
+
+
+def _get_memo() -> LRUCache:
+    global _MEMO
+    with _MEMO_LOCK:
+        if _MEMO is None:
+            _MEMO = LRUCache(getattr(settings, "MATHS_RESULT_CACHE_SIZE", 512))
+        return _MEMO
+
+
+def _get_backend():
+    """共享的 Django 缓存（文件 / Redis / Memcached 等）；未配置或不可用时返回 None，只用进程内 LRU"""
+    global _BACKEND_DISABLED
+    alias = getattr(settings, "MATHS_RESULT_CACHE_ALIAS", None)
+    if not alias or _BACKEND_DISABLED:
+        return None
+    from django.core.cache import caches
+    from django.core.cache.backends.base import InvalidCacheBackendError
+
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        _BACKEND_DISABLED = True
+        return None
+
+
+def _canonical(value):
+    if isinstance(value, str):
+        # 与解析器一致：^ 与 ** 等价，首尾空白无意义
+        return " ".join(value.split()).replace("^", "**")
+    return value
+
+
+def result_key(mode: str, payload: dict, workspace: dict | None = None) -> str | None:
+    """
+    规范化后的 模式 + 参数 + 用到的 workspace 变量 的摘要；不可缓存时返回 None。
+    workspace 只取名字在参数里出现过的变量，不同用户的同名请求只要引用的变量取值相同就共享结果。
+    """
+    mode = (mode or "eval").lower()
+    if mode not in MEMO_MODES:
+        return None
+    params = {k: _canonical(v) for k, v in payload.items() if k not in _IGNORED_KEYS}
+    text = " ".join(v for v in params.values() if isinstance(v, str))
+    used = {name: str(value) for name, value in (workspace or {}).items() if name in text}
+    try:
+        raw = json.dumps([mode, params, used], sort_keys=True, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return None
+    return "maths:result:" + hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get(key: str):
+    raw = _get_memo().get(key)
+    if raw is None:
+        backend = _get_backend()
+        if backend is not None:
+            raw = backend.get(key)
+            if raw is not None:
+                _get_memo().put(key, raw)
+    if raw is None:
+        return None
+    # 每次返回新对象：调用方会往结果里补字段（symbolic_status 等），不能改到缓存里的那份
+    result = json.loads(raw)
+    result["cached"] = True
+    return result
+
+
+def put(key: str, result: dict):
+    try:
+        raw = json.dumps(result, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return
+    if len(raw) > getattr(settings, "MATHS_RESULT_CACHE_MAX_BYTES", 256 * 1024):
+        return
+    _get_memo().put(key, raw)
+    backend = _get_backend()
+    if backend is not None:
+        backend.set(key, raw, getattr(settings, "MATHS_RESULT_CACHE_TIMEOUT", 24 * 3600))
+
+
+def memoized(compute, mode: str, payload: dict, workspace: dict | None = None):
+    """
+    确定性模式先查结果缓存，未命中再 compute() 并写回；只缓存成功的结果（超时、出错都不缓存）。
+    数值兜底的结果只在符号路径确实求不出闭式解（unevaluated）时缓存；
+    因超时、内存超限、出错而退回数值的结果不缓存，下次仍让符号路径再试。
+    """
+    key = result_key(mode, payload, workspace)
+    if key is None:
+        return compute()
+    cached = get(key)
+    if cached is not None:
+        return cached
+    result = compute()
+    if isinstance(result, dict) and result.get("symbolic_status") in _CACHEABLE_STATUSES:
+        put(key, result)
+    return result
+
+
+def stats() -> dict:
+    return {
+        **_get_memo().stats(),
+        "backend": getattr(settings, "MATHS_RESULT_CACHE_ALIAS", None) if _get_backend() is not None else None,
+    }
+
+
+def clear():
+    _get_memo().clear()
+    backend = _get_backend()
+    if backend is not None:
+        backend.clear()
@@ -1,3 +1,22 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class MathVariable(models.Model):
+    """数学实验室里用户自己定义的命名变量，例如 f = sin(x)*x"""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="math_variables")
+    name = models.CharField(max_length=16)
+    expr = models.CharField(max_length=800)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "name"], name="uniq_math_variable_per_user"),
+        ]
+        ordering = ["created_at", "id"]
+
+    def __str__(self):
+        return f"MathVariable({self.user_id}, {self.name} = {self.expr})"
@@ -0,0 +1,301 @@
+import re
+
+import sympy as sp
+
+# 表达式文法（白名单）：
+#   input   := expr (('<' | '>' | '<=' | '>=') expr)?    关系式只能出现在最外层：x>1
+#   expr    := term (('+' | '-') term)*
+#   term    := unary (('*' | '/') unary | 隐式乘法 unary)*
+#   unary   := ('+' | '-') unary | power
+#   power   := postfix (('^' | '**') unary)?          右结合，-x^2 = -(x^2)，2^-1 合法
+#   postfix := primary '!'*
+#   primary := NUMBER | NAME | NAME '(' args ')' | 函数名 [^n] 参数 | '(' expr (',' expr)* ')'
+#              带逗号的括号是元组，用作 Sum(1/n^2, (n, 1, oo))、integrate(x, (x, 0, 1)) 的范围参数
+# 只认识这些记号，其它字符一律报错；名字只会解析成白名单里的函数/常量、调用方给的局部变量或实数 Symbol，
+# 整个过程直接构造 SymPy 对象，不经过 Python 的 eval / tokenize。
+
+_TOKEN = re.compile(r"""
+    (?P<ws>\s+)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>\*\*|<=|>=|[-+*/^(),!<>])
+""", re.X)
+
+GREEK = {
+    "alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta", "iota", "kappa", "lamda",
+    "lambda", "mu", "nu", "xi", "omicron", "rho", "sigma", "tau", "upsilon", "phi", "chi", "psi", "omega",
+}
+
+MAX_DEPTH = 100            # 括号 / 幂 / 一元运算的嵌套上限，防止深递归
+MAX_POWER_BITS = 10000     # 整数幂结果超过这么多位时报错（9^9^9、(9^9999)^(9^7) 之类）
+MAX_FACTORIAL = 1000       # 整数阶乘超过这个值时不求值
+
+_RELATIONS = {"<": sp.Lt, ">": sp.Gt, "<=": sp.Le, ">=": sp.Ge}
+
+
+class _Parser:
+    def __init__(self, text: str, names: dict):
+        self.names = names
+        self.tokens = self._tokenize(text)
+        self.pos = 0
+        self.depth = 0
+
+    # ---------- 词法 ----------
+
+    def _tokenize(self, text: str) -> list:
+        tokens, pos = [], 0
+        while pos < len(text):
+            m = _TOKEN.match(text, pos)
+            if m is None:
+                raise ValueError(f"表达式包含不允许的字符：{text[pos]!r}")
+            pos = m.end()
+            kind = m.lastgroup
+            if kind == "ws":
+                continue
+            if kind == "name":
+                name = m.group()
+                if text[pos:].lstrip().startswith("(") and len(name) > 1 and name.isalpha() and not self._known(name):
+                    # 未知的多字母名字后面跟括号，几乎总是拼错或不支持的函数（expand(...)），
+                    # 拆成字母乘积只会得到看似合理的错误结果
+                    raise ValueError(f"不支持的函数：{name}")
+                parts = self._split_name(name)
+                if text[pos:].lstrip().startswith("(") and self._unsupported_call(parts[-1]):
+                    # N(pi)、beta(1, 2)：SymPy 里的函数但不在白名单，不能当成 N*pi / beta*(1, 2)
+                    raise ValueError(f"不支持的函数：{parts[-1]}")
+                tokens.extend(("name", part) for part in parts)
+            else:
+                value = m.group()
+                tokens.append(("op", "**") if value == "^" else (kind, value))
+        tokens.append(("end", None))
+        return tokens
+
+    def _known(self, name: str) -> bool:
+        return name in self.names or name in GREEK
+
+    def _unsupported_call(self, name: str) -> bool:
+        return name not in self.names and callable(getattr(sp, name, None))
+
+    def _split_name(self, name: str) -> list:
+        """
+        未知的纯字母名字按隐式乘法拆开：xy -> x*y，xsin -> x*sin，pix -> pi*x；
+        已知名字、希腊字母、带数字或下划线的名字（x1、x_1）保持完整。
+        """
+        if self._known(name) or not name.isalpha() or len(name) == 1:
+            return [name]
+        parts, i = [], 0
+        while i < len(name):
+            for j in range(len(name), i + 1, -1):
+                if self._known(name[i:j]):
+                    parts.append(name[i:j])
+                    i = j
+                    break
+            else:
+                parts.append(name[i])
+                i += 1
+        return parts
+
+    # ---------- 语法 ----------
+
+    def _peek(self):
+        return self.tokens[self.pos]
+
+    def _next(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def _accept(self, op: str) -> bool:
+        if self.tokens[self.pos] == ("op", op):
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, op: str):
+        if not self._accept(op):
+            raise ValueError(f"表达式格式不正确：缺少 '{op}'")
+
+    def _enter(self):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise ValueError("表达式嵌套过深")
+
+    def _starts_factor(self) -> bool:
+        kind, value = self._peek()
+        return kind in ("number", "name") or (kind, value) == ("op", "(")
+
+    def _is_function(self, name: str) -> bool:
+        # SymPy 函数类、普通函数，以及 Rational / Sum / Eq 这类可调用的类；表达式对象本身（Symbol 也能调用）不算
+        value = self.names.get(name)
+        return callable(value) and not isinstance(value, sp.Basic)
+
+    def parse(self):
+        result = self.expr()
+        kind, value = self._peek()
+        if kind == "op" and value in _RELATIONS:
+            self.pos += 1
+            result = _RELATIONS[value](_operand(result), _operand(self.expr()))
+            kind, value = self._peek()
+        if kind != "end":
+            raise ValueError(f"表达式格式不正确：多余的 '{value}'")
+        return result
+
+    def expr(self):
+        left = self.term()
+        while True:
+            if self._accept("+"):
+                left = _operand(left) + _operand(self.term())
+            elif self._accept("-"):
+                left = _operand(left) - _operand(self.term())
+            else:
+                return left
+
+    def term(self, stop_at_function=False):
+        left = self.unary()
+        while True:
+            if stop_at_function:
+                # 隐式函数参数只吃并列的因子：sin 2x -> sin(2*x)，sin x cos x -> sin(x)*cos(x)
+                kind, value = self._peek()
+                if not self._starts_factor() or (kind == "name" and self._is_function(value)):
+                    return left
+                left = _operand(left) * _operand(self.power())
+            elif self._accept("*"):
+                left = _operand(left) * _operand(self.unary())
+            elif self._accept("/"):
+                left = _operand(left) / _operand(self.unary())
+            elif self._starts_factor():
+                left = _operand(left) * _operand(self.power())
+            else:
+                return left
+
+    def unary(self):
+        self._enter()
+        try:
+            if self._accept("-"):
+                return -_operand(self.unary())
+            if self._accept("+"):
+                return self.unary()
+            return self.power()
+        finally:
+            self.depth -= 1
+
+    def power(self):
+        base = self.postfix()
+        if self._accept("**"):
+            return _pow(_operand(base), _operand(self.unary()))
+        return base
+
+    def postfix(self):
+        value = self.primary()
+        while self._accept("!"):
+            value = _factorial(_operand(value))
+        return value
+
+    def primary(self):
+        kind, value = self._next()
+        if kind == "number":
+            if any(c in value for c in ".eE"):
+                return sp.Float(value)
+            return sp.Integer(value)
+        if kind == "name":
+            return self._name(value)
+        if (kind, value) == ("op", "("):
+            self._enter()
+            try:
+                items = [self.expr()]
+                while self._accept(","):
+                    items.append(self.expr())
+            finally:
+                self.depth -= 1
+            self._expect(")")
+            return items[0] if len(items) == 1 else sp.Tuple(*items)
+        if kind == "end":
+            raise ValueError("表达式不完整")
+        raise ValueError(f"表达式格式不正确：意外的 '{value}'")
+
+    def _name(self, name: str):
+        if not self._is_function(name):
+            if name in self.names:
+                return self.names[name]
+            return _symbol(name)
+
+        fn = self.names[name]
+        # sin^2 x / sin^2(x) -> sin(x)^2
+        exponent = None
+        if self._peek() == ("op", "**") and self.tokens[self.pos + 1][0] == "number":
+            self.pos += 1
+            exponent = self.primary()
+
+        if self._accept("("):
+            self._enter()
+            try:
+                args = [self.expr()]
+                while self._accept(","):
+                    args.append(self.expr())
+            finally:
+                self.depth -= 1
+            self._expect(")")
+        elif self._starts_factor():
+            args = [self.term(stop_at_function=True)]
+        elif name in GREEK:
+            # gamma / zeta 单独出现时当作希腊字母符号
+            return _symbol(name)
+        else:
+            raise ValueError(f"函数 {name} 缺少参数")
+
+        try:
+            result = fn(*args)
+        except TypeError:
+            raise ValueError(f"函数 {name} 的参数个数或类型不正确")
+        return _pow(result, exponent) if exponent is not None else result
+
+
+def _symbol(name: str) -> sp.Symbol:
+    # 与 engine._sym 一致用 real=True：求导/积分变量、workspace 里的值和表达式里的裸名字是同一个符号，
+    # f - x*sin(x) 这类式子才能互相抵消
+    return sp.Symbol(name, real=True)
+
+
+def _operand(value):
+    """带逗号的括号（sp.Tuple）只能作为函数参数，不能参与运算：beta(1, 2) 不能变成 beta*(1, 2)"""
+    if isinstance(value, sp.Tuple):
+        raise ValueError("表达式格式不正确：逗号分隔的括号只能作为函数参数")
+    return value
+
+
+def _rational_power(value):
+    """有理数 r -> (r, 1)；有理数的有理次幂 a^k（如 sqrt(2)）-> (a, k)；其它返回 None"""
+    if isinstance(value, sp.Rational):
+        return value, sp.Integer(1)
+    if isinstance(value, sp.Pow) and isinstance(value.base, sp.Rational) and isinstance(value.exp, sp.Rational):
+        return value.base, value.exp
+    return None
+
+
+def _pow(base, exponent):
+    """
+    SymPy 会把 (a^k)^m 合并成 a^(k*m) 再求值，(9^9999)^(9^7) 要算几十秒；按合并后的指数估计结果的位数，
+    超过 MAX_POWER_BITS 直接报错。不能只是不求值：之后的加减乘除、化简、求导仍会把它算出来。
+    """
+    parts = _rational_power(base)
+    if parts is not None and isinstance(exponent, sp.Rational):
+        b, k = parts
+        total = abs(k * exponent)
+        size = max(abs(b.p).bit_length(), b.q.bit_length())
+        # 0、±1 的任意次幂都很便宜
+        if size > 1 and (total >= MAX_POWER_BITS or size * total > MAX_POWER_BITS):
+            raise ValueError(f"整数幂的结果超过 {MAX_POWER_BITS} 位，无法计算")
+    return base ** exponent
+
+
+def _factorial(value):
+    if isinstance(value, sp.Integer) and value > MAX_FACTORIAL:
+        return sp.factorial(value, evaluate=False)
+    return sp.factorial(value)
+
+
+def parse(text: str, names: dict):
+    """
+    按白名单文法把字符串直接构造成 SymPy 表达式。
+    names：可用的名字（函数、常量、变量）；不在其中的名字解析为 real=True 的 Symbol。
+    """
+    return _Parser(text, names).parse()
@@ -0,0 +1,71 @@
+import base64
+import io
+import queue
+from contextlib import contextmanager
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import matplotlib as mpl
+
+# 不经过 pyplot：Figure + FigureCanvasAgg 是纯对象，没有全局“当前图”状态，多线程可以同时渲染
+FIGURE_POOL_SIZE = 4
+
+
+def _new_figure() -> Figure:
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    return fig
+
+
+class FigurePool:
+    """
+    预热好的 Figure 池。取出时按需调整尺寸，归还时 clear() 掉所有 Axes。
+    池空时临时新建一张，不阻塞请求；归还时池满则直接丢弃。
+    """
+
+    def __init__(self, size: int = FIGURE_POOL_SIZE):
+        self.size = int(size)
+        self._figures = queue.LifoQueue(maxsize=self.size)
+
+    def warm_up(self):
+        while not self._figures.full():
+            try:
+                self._figures.put_nowait(_new_figure())
+            except queue.Full:
+                break
+
+    @contextmanager
+    def figure(self, figsize=None):
+        try:
+            fig = self._figures.get_nowait()
+        except queue.Empty:
+            fig = _new_figure()
+
+        fig.set_size_inches(figsize or mpl.rcParams["figure.figsize"])
+        try:
+            yield fig
+        finally:
+            fig.clear()
+            try:
+                self._figures.put_nowait(fig)
+            except queue.Full:
+                pass
+
+
+_POOL = FigurePool()
+
+
+def pooled_figure(figsize=None):
+    """with pooled_figure() as fig: ...  —— 借用一张 Figure，退出时自动清空归还"""
+    return _POOL.figure(figsize)
+
+
+def warm_up():
+    """在 worker 进程里预先创建 Figure，首个作图请求不必付初始化开销"""
+    _POOL.warm_up()
+
+
+def figure_to_base64(fig: Figure, dpi=160) -> str:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+    return base64.b64encode(buf.getvalue()).decode("utf-8")
@@ -0,0 +1,61 @@
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .executor import Cancelled
+
+# 长时间没有新事件时发一条 SSE 注释：保持连接，也让服务器及时发现客户端已断开
+KEEPALIVE_SECONDS = 10
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_executor(max_workers: int) -> ThreadPoolExecutor:
+    global _EXECUTOR
+    with _EXECUTOR_LOCK:
+        if _EXECUTOR is None:
+            _EXECUTOR = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="maths-stream")
+        return _EXECUTOR
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_events(compute, max_workers: int = 4):
+    """
+    compute(progress, cancel) 放到后台线程执行，返回逐条产出 SSE 文本的生成器：
+    每个中间结果一条 partial 事件，最后一条 result 或 error 事件。
+    生成器被关闭（客户端断开、StreamingHttpResponse 结束）时置位 cancel，后台计算随之停止。
+    """
+    events = queue.Queue()
+    cancel = threading.Event()
+
+    def work():
+        try:
+            result = compute(lambda partial: events.put(("partial", partial)), cancel)
+            events.put(("result", result))
+        except Cancelled:
+            pass
+        except Exception as e:
+            events.put(("error", {"error": str(e), **(e.as_dict() if hasattr(e, "as_dict") else {})}))
+
+    _get_executor(max_workers).submit(work)
+
+    def generate():
+        try:
+            while True:
+                try:
+                    event, data = events.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield sse_event(event, data)
+                if event != "partial":
+                    return
+        finally:
+            cancel.set()
+
+    return generate()
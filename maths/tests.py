@@ -1,3 +1,999 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import sympy as sp
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from . import bench, engine, memo, workspace
+from .cache import LRUCache
+from .executor import BudgetExceeded, BudgetPool, Cancelled
+from .fallback import race
+from .streaming import sse_event, stream_events
+from .engine import (
+    SIMPLIFY_SIZE_THRESHOLD, _cse_matrix, _simplify_each, compile_matrix, gradient, hessian, jacobian,
+    GD_MAX_PATH_POINTS, PLOT3D_DATA_MAX_N, PLOT3D_SYNC_MAX_N, build_workspace, diff_expr, eval_expr,
+    gradient_descent_demo, linear_algebra, plot_2d, plot_3d, safe_parse, solve_expr,
+)
+from .models import MathVariable
+from .render import FigurePool
+from .workspace import Workspace
+
+# 测试里不用沙箱进程池，也不写共享的文件结果缓存
+MATHS_TEST_SETTINGS = dict(MATHS_SANDBOX_ENABLED=False, MATHS_RESULT_CACHE_ALIAS=None)
+
+# 解析器把未知名字解析成 real=True 的符号
+REAL = {name: sp.Symbol(name, real=True) for name in "nxy"}
+
+
+class MathsApiTestCase(TestCase):
+    def setUp(self):
+        memo.clear()
+        workspace._CACHE.clear()
+        self.user = User.objects.create_user("maths", "maths@example.com", "pw")
+        self.client.force_login(self.user)
+
+    def post_json(self, url, payload):
+        return self.client.post(url, json.dumps(payload), content_type="application/json")
+
+    def wait_for_job(self, job_id, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = self.client.get(f"/maths/api/jobs/{job_id}/").json()["job"]
+            if job["status"] in ("finished", "error"):
+                return job
+            time.sleep(0.05)
+        self.fail(f"计算任务 {job_id} 超时未结束")
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats(), {"size": 2, "maxsize": 2, "hits": 3, "misses": 1, "hit_rate": 0.75})
+
+    def test_zero_maxsize_disables_caching(self):
+        cache = LRUCache(maxsize=0)
+        cache.put("a", 1)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_clear_resets_counters(self):
+        cache = LRUCache()
+        cache.put("a", 1)
+        cache.get("a")
+        cache.get("b")
+        cache.clear()
+        self.assertEqual(cache.stats(), {"size": 0, "maxsize": 256, "hits": 0, "misses": 0, "hit_rate": 0.0})
+
+
+class EngineCacheTests(SimpleTestCase):
+    def setUp(self):
+        engine.clear_caches()
+
+    def tearDown(self):
+        engine.clear_caches()
+
+    def test_parse_cache_hits_on_repeat(self):
+        first = safe_parse("sin(x)^2 + 1")
+        self.assertIs(safe_parse("  sin(x)^2 + 1 "), first)
+        stats = engine.cache_stats()["parse"]
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_parse_cache_is_keyed_by_locals(self):
+        a = sp.Symbol("a", real=True)
+        self.assertEqual(safe_parse("a + 1", {"a": sp.Integer(2)}), 3)
+        self.assertEqual(safe_parse("a + 1", {"a": sp.Integer(5)}), 6)
+        self.assertEqual(safe_parse("a + 1"), a + 1)
+        self.assertEqual(engine.cache_stats()["parse"]["hits"], 0)
+
+    def test_unhashable_locals_skip_cache(self):
+        self.assertEqual(safe_parse("2a", {"a": sp.Matrix([1, 2])}), sp.Matrix([2, 4]))
+        self.assertEqual(engine.cache_stats()["parse"]["size"], 0)
+
+    def test_lambdify_cache_reused_across_plots(self):
+        plot_2d("x^2", "x", -1, 1, n=50, output="data")
+        plot_2d("x^2", "x", -2, 2, n=50, output="data")
+        stats = engine.cache_stats()["lambdify"]
+        self.assertEqual((stats["size"], stats["hits"]), (1, 1))
+
+
+class BudgetPoolTests(SimpleTestCase):
+    # 展开前的高次多项式，simplify 要跑十几秒以上
+    SLOW = {"expr": "(x+y+z+1)^30*(x-y)^10"}
+
+    def setUp(self):
+        self.pool = BudgetPool(max_workers=1, poll_interval=0.02)
+        self.addCleanup(self.pool.shutdown)
+
+    def worker_pid(self):
+        return self.pool._idle[0].proc.pid
+
+    def test_reuses_worker_between_requests(self):
+        out = self.pool.run("diff", {"expr": "x^3"}, timeout=30)
+        self.assertEqual(out["result_str"], "3*x**2")
+        pid = self.worker_pid()
+        self.pool.run("eval", {"expr": "1+1"}, timeout=30)
+        self.assertEqual(self.worker_pid(), pid)
+
+    def test_engine_error_keeps_worker(self):
+        self.pool.run("eval", {"expr": "1"}, timeout=30)
+        pid = self.worker_pid()
+        with self.assertRaises(ValueError):
+            self.pool.run("eval", {"expr": "foo(x)"}, timeout=30)
+        self.assertEqual(self.worker_pid(), pid)
+
+    def test_timeout_kills_worker(self):
+        self.pool.run("eval", {"expr": "1"}, timeout=30)
+        pid = self.worker_pid()
+        with self.assertRaises(BudgetExceeded) as ctx:
+            self.pool.run("simplify", self.SLOW, timeout=1)
+        self.assertEqual(ctx.exception.as_dict()["reason"], "timeout")
+        self.assertLess(ctx.exception.elapsed, 3)
+        self.assertEqual(self.pool._total, 0)
+        self.pool.run("eval", {"expr": "1"}, timeout=30)
+        self.assertNotEqual(self.worker_pid(), pid)
+
+    def test_memory_limit(self):
+        with self.assertRaises(BudgetExceeded) as ctx:
+            self.pool.run("simplify", self.SLOW, timeout=30, memory_mb=1)
+        self.assertEqual(ctx.exception.kind, "memory")
+        self.assertEqual(self.pool._total, 0)
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        threading.Timer(0.5, cancel.set).start()
+        with self.assertRaises(Cancelled):
+            self.pool.run("simplify", self.SLOW, timeout=30, cancel=cancel)
+        self.assertEqual(self.pool._total, 0)
+
+
+def bench_report(**p50_by_name) -> dict:
+    return {"results": [{"name": name, "mode": "eval", "ok": True, "p50_ms": p50, "peak_kb": 100.0}
+                        for name, p50 in p50_by_name.items()]}
+
+
+class BenchTests(SimpleTestCase):
+    def test_runs_selected_cases(self):
+        seen = []
+        report = bench.run_benchmarks(modes=["eval", "diff"], repeat=2, names=["eval-poly", "diff-chain"],
+                                      on_case=seen.append)
+        self.assertEqual([r["name"] for r in report["results"]], ["eval-poly", "diff-chain"])
+        self.assertEqual(seen, report["results"])
+        case = report["results"][0]
+        self.assertTrue(case["ok"], case["error"])
+        self.assertEqual(len(case["samples_ms"]), 2)
+        self.assertLessEqual(case["min_ms"], case["p50_ms"])
+        self.assertLessEqual(case["p50_ms"], case["max_ms"])
+        self.assertGreater(case["peak_kb"], 0)
+        self.assertEqual(report["meta"]["repeat"], 2)
+
+    def test_failing_case_is_reported(self):
+        with mock.patch.dict(bench.CORPUS, {"eval": [("eval-broken", {"expr": "1 +"})]}):
+            [case] = bench.run_benchmarks(modes=["eval"], repeat=1)["results"]
+        self.assertFalse(case["ok"])
+        self.assertIn("ValueError", case["error"])
+
+    def test_rejects_bad_arguments(self):
+        with self.assertRaisesMessage(ValueError, "未知模式"):
+            bench.run_benchmarks(modes=["nope"])
+        with self.assertRaisesMessage(ValueError, "repeat"):
+            bench.run_benchmarks(modes=["eval"], repeat=0)
+
+    def test_compare_applies_threshold_and_noise_floor(self):
+        base = bench_report(slow=100.0, fast=100.0, noise=0.5, same=50.0)
+        head = bench_report(slow=120.0, fast=80.0, noise=0.9, same=52.0, new=1.0)
+        status = {row["name"]: row["status"] for row in bench.compare(base, head)}
+        self.assertEqual(status, {"slow": "regression", "fast": "improvement", "noise": "ok",
+                                  "same": "ok", "new": "missing"})
+
+    def test_results_round_trip_and_command_fails_on_regression(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base_path, head_path = os.path.join(tmp, "base.json"), os.path.join(tmp, "head.json")
+            bench.write_results(bench_report(a=10.0), base_path)
+            bench.write_results(bench_report(a=20.0), head_path)
+            self.assertEqual(bench.load_results(base_path), bench_report(a=10.0))
+            with self.assertRaisesMessage(CommandError, "1 个用例出现性能回退"):
+                call_command("maths_bench", "--compare", base_path, head_path, "--fail-on-regression",
+                             stdout=io.StringIO())
+            with open(base_path, "w") as fh:
+                json.dump({}, fh)
+            with self.assertRaisesMessage(ValueError, "不是基准结果文件"):
+                bench.load_results(base_path)
+
+
+class LazyImportTests(SimpleTestCase):
+    def test_loading_urls_does_not_import_heavy_modules(self):
+        # 新的 Python 进程里 django.setup() + import maths.urls
+        result = bench.measure_startup(repeat=1)
+        self.assertTrue(result["ok"], result.get("error"))
+        self.assertEqual(result["heavy_modules_loaded"], [])
+
+
+class ParserTests(SimpleTestCase):
+    def assertParses(self, text, expected):
+        self.assertEqual(safe_parse(text), sp.sympify(expected, locals=REAL))
+
+    def test_implicit_multiplication(self):
+        self.assertParses("2x", "2*x")
+        self.assertParses("xy", "x*y")
+        self.assertParses("x(x+1)", "x*(x+1)")
+        self.assertParses("sin^2 x", "sin(x)**2")
+        self.assertParses("xsin x", "x*sin(x)")
+        self.assertParses("-x^2", "-(x**2)")
+
+    def test_whitelisted_sympy_functions(self):
+        self.assertParses("expand((x+1)^2)", "x**2 + 2*x + 1")
+        self.assertParses("factor(x^2-1)", "(x - 1)*(x + 1)")
+        self.assertParses("Rational(1, 3)", "Rational(1, 3)")
+        self.assertParses("diff(x^3, x)", "3*x**2")
+        self.assertParses("integrate(x, (x, 0, 1))", "Rational(1, 2)")
+        self.assertEqual(safe_parse("Sum(1/n^2, (n, 1, oo))").doit(), sp.pi ** 2 / 6)
+
+    def test_relations(self):
+        x = REAL["x"]
+        self.assertEqual(safe_parse("x>1"), sp.Gt(x, 1))
+        self.assertEqual(safe_parse("x <= 2"), sp.Le(x, 2))
+        with self.assertRaises(ValueError):
+            safe_parse("x > 1 > 2")
+
+    def test_unknown_function_call_is_an_error(self):
+        for text in ("expnd((x+1)^2)", "foo(x)", "xsin(x)", "Symbol(x)", "sympify(x)", "N(pi)", "xN(pi)", "beta(1,2)"):
+            with self.subTest(text=text), self.assertRaisesMessage(ValueError, "不支持的函数"):
+                safe_parse(text)
+        # 单字母变量后面跟括号仍是隐式乘法，单独的 beta 仍是希腊字母符号
+        self.assertParses("y(x+1)", "y*(x+1)")
+        self.assertEqual(safe_parse("beta + 1"), sp.Symbol("beta", real=True) + 1)
+
+    def test_tuples_are_only_function_arguments(self):
+        for text in ("x(1, 2)", "(1, 2) + x", "-(1, 2)", "(1, 2)^2", "(1, 2)!", "(1, 2) > 0"):
+            with self.subTest(text=text), self.assertRaisesMessage(ValueError, "只能作为函数参数"):
+                safe_parse(text)
+
+    def test_rejects_non_whitelisted_syntax(self):
+        for text in ("__import__('os')", "x.real", "[1, 2]", "lambda: 1", "x; y"):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                safe_parse(text)
+
+    def test_huge_integer_power_is_not_evaluated(self):
+        # 嵌套的幂会被 SymPy 合并后求值，按合并后的指数估计位数
+        for text in ("9^9^9", "(9^9999)^(9^7)", "(2^20000)^2", "(2^5000)^2", "sqrt(2)^(9^9)", "(1/9)^(9^9)",
+                     "2^-100000"):
+            with self.subTest(text=text), self.assertRaisesMessage(ValueError, "整数幂的结果超过"):
+                safe_parse(text)
+        self.assertEqual(safe_parse("(2^3)^2"), 64)
+        self.assertEqual(safe_parse("(-1)^(10^9)"), 1)
+        self.assertEqual(safe_parse("x^(10^6)"), REAL["x"] ** 1000000)
+
+
+class SimplifyLevelTests(SimpleTestCase):
+    # 运算数超过 SIMPLIFY_SIZE_THRESHOLD，它和它对 x 的导数 auto 会选 cheap；对 y 的偏导很小，选 full
+    BIG = " + ".join(f"x^{i}/(x + {i})" for i in range(1, 20))
+
+    def test_simplify_each_reports_highest_level(self):
+        x = REAL["x"]
+        big = safe_parse(self.BIG)
+        self.assertGreater(sp.count_ops(big), SIMPLIFY_SIZE_THRESHOLD)
+        self.assertEqual(_simplify_each([x + 1, big])[1], "full")
+        self.assertEqual(_simplify_each([big])[1], "cheap")
+        self.assertEqual(_simplify_each([x, big], "none")[1], "none")
+        self.assertIsNone(_simplify_each([])[1])
+
+    def test_gradient_level_is_not_just_the_last_entry(self):
+        out = gradient(f"y + {self.BIG}", "y, x")
+        self.assertEqual(out["simplify_level"], "full")
+
+    def test_jacobian_level_covers_every_row(self):
+        self.assertEqual(jacobian(f"x*y; {self.BIG}", "x, y")["simplify_level"], "full")
+        self.assertEqual(jacobian(f"{self.BIG}; {self.BIG}", "x")["simplify_level"], "cheap")
+
+
+class CseMatrixTests(SimpleTestCase):
+    def test_cse_matrix_reconstructs_original(self):
+        x, y = REAL["x"], REAL["y"]
+        M = sp.Matrix([[sp.sin(x * y) * x, sp.sin(x * y) * y], [sp.exp(x + y), sp.exp(x + y) ** 2]])
+        replacements, reduced, _ = _cse_matrix(M, [x, y], "none")
+        self.assertGreater(len(replacements), 0)
+        for sym, sub in reversed(replacements):
+            reduced = reduced.xreplace({sym: sub})
+        self.assertEqual(sp.simplify(reduced - M), sp.zeros(2, 2))
+
+    def test_jacobian_points(self):
+        for cse in (False, True):
+            with self.subTest(cse=cse):
+                out = jacobian("x*y; x^2 + y^2", "x, y", cse=cse, points="1,2; 3,4")
+                self.assertEqual(out["points"], 2)
+                self.assertEqual(out["values"], [[[2, 1], [2, 4]], [[4, 3], [6, 8]]])
+
+    def test_hessian_points_with_constant_entries(self):
+        out = hessian("x^2*y + y", "x, y", cse=True, points=[[1, 2], [0, 0]])
+        self.assertEqual(out["values"], [[[4, 2], [2, 0]], [[0, 0], [0, 0]]])
+        self.assertIn("cse_terms", out)
+
+    def test_compiled_matrix_is_cached(self):
+        x, y = REAL["x"], REAL["y"]
+        M = sp.Matrix([[x * y, 1]])
+        F = compile_matrix([x, y], M)
+        self.assertIs(compile_matrix([x, y], M), F)
+        np.testing.assert_allclose(F([[2, 3], [4, 5]]), [[[6, 1]], [[20, 1]]])
+
+    def test_bad_points(self):
+        with self.assertRaisesMessage(ValueError, "每个点需要 2 个坐标"):
+            jacobian("x*y", "x, y", points="1,2,3")
+
+    def test_non_finite_values_are_null(self):
+        self.assertEqual(jacobian("1/x", "x", points="0; 1")["values"], [[[None]], [[-1]]])
+
+
+class GradientDescentTests(SimpleTestCase):
+    def test_rejects_starts_times_steps_over_budget(self):
+        with self.assertRaisesMessage(ValueError, "起点数 × 步数过大"):
+            gradient_descent_demo("x^2 + y^2", "x, y", "", grid_n=50, steps=5000, output="data")
+
+    def test_data_path_is_subsampled(self):
+        out = gradient_descent_demo("(x^2-1)^2 + y^2", "x, y", "", lr=0.1, steps=400, grid_n=50, output="data")
+        frames, m, _ = out["path"]["shape"]
+        self.assertEqual(m, 2500)
+        self.assertLessEqual(frames * m, GD_MAX_PATH_POINTS)
+        self.assertEqual(out["path_frames"], frames)
+        self.assertEqual(len(out["minima"]), 2)
+
+    def test_minima_only_from_converged_points(self):
+        out = gradient_descent_demo("x^2 + y^2", "x, y", "1, 2", lr=0.001, steps=5, output="data")
+        self.assertEqual(out["converged"], 0)
+        self.assertEqual(out["minima"], [])
+        self.assertEqual(out["labels"], [-1])
+
+    def test_single_start_converges(self):
+        out = gradient_descent_demo("x^2 + y^2", "x, y", "1, 2", lr=0.1, steps=500, output="data")
+        self.assertEqual(out["converged"], 1)
+        self.assertLess(out["iterations"], 500)
+        self.assertAlmostEqual(out["minima"][0][0], 0, places=5)
+
+
+@override_settings(MATHS_RESULT_CACHE_ALIAS=None)
+class ResultMemoTests(SimpleTestCase):
+    def setUp(self):
+        memo.clear()
+
+    def memoized(self, result, payload=None):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return dict(result)
+
+        payload = payload or {"mode": "integrate", "expr": "exp(-x^2)*cos(x^3)", "a": "0", "b": "1"}
+        first = memo.memoized(compute, "integrate", payload)
+        second = memo.memoized(compute, "integrate", payload)
+        return first, second, len(calls)
+
+    def test_symbolic_result_is_cached(self):
+        first, second, calls = self.memoized({"result_str": "1/2"})
+        self.assertEqual(calls, 1)
+        self.assertTrue(second["cached"])
+        self.assertNotIn("cached", first)
+
+    def test_unevaluated_fallback_is_cached(self):
+        _, _, calls = self.memoized({"result_str": "0.62", "symbolic_status": "unevaluated"})
+        self.assertEqual(calls, 1)
+
+    def test_degraded_fallback_is_not_cached(self):
+        for status in ("timeout", "memory", "error: worker died"):
+            with self.subTest(status=status):
+                memo.clear()
+                _, second, calls = self.memoized({"result_str": "0.62", "symbolic_status": status})
+                self.assertEqual(calls, 2)
+                self.assertNotIn("cached", second)
+
+    def test_key_normalises_whitespace_and_caret(self):
+        self.assertEqual(
+            memo.result_key("diff", {"expr": " x^2 "}),
+            memo.result_key("diff", {"expr": "x**2"}),
+        )
+        self.assertIsNone(memo.result_key("plot2d", {"func": "x"}))
+
+    def test_key_depends_only_on_referenced_workspace_names(self):
+        payload = {"expr": "f + 1"}
+        x = REAL["x"]
+        self.assertEqual(
+            memo.result_key("simplify", payload, {"f": x, "g": 1}),
+            memo.result_key("simplify", payload, {"f": x, "g": 2}),
+        )
+        self.assertNotEqual(
+            memo.result_key("simplify", payload, {"f": x}),
+            memo.result_key("simplify", payload, {"f": 2 * x}),
+        )
+
+
+class FakeRunner:
+    """代替 _run_symbolic：按 strategy 返回预设结果，可选延迟；记录数值路径收到的 timeout / cancel"""
+
+    def __init__(self, symbolic, numeric, symbolic_delay=0.0):
+        self.results = {"symbolic": symbolic, "numeric": numeric}
+        self.symbolic_delay = symbolic_delay
+        self.calls = {}
+
+    def __call__(self, mode, payload, workspace, timeout, cancel=None):
+        strategy = payload["strategy"]
+        self.calls[strategy] = {"timeout": timeout, "cancel": cancel}
+        if strategy == "symbolic" and self.symbolic_delay:
+            time.sleep(min(self.symbolic_delay, timeout))
+            if self.symbolic_delay >= timeout:
+                raise BudgetExceeded("timeout", timeout, timeout)
+        result = self.results[strategy]
+        if isinstance(result, Exception):
+            raise result
+        return dict(result)
+
+
+class FallbackRaceTests(SimpleTestCase):
+    payload = {"mode": "integrate", "expr": "exp(-x^2)*cos(x^3)", "var": "x", "a": "0", "b": "1"}
+
+    def test_symbolic_result_wins_and_cancels_numeric(self):
+        runner = FakeRunner({"method": "symbolic", "result_str": "1/3"}, {"method": "numeric"})
+        out = race(runner, "integrate", self.payload, budget=1)
+        self.assertEqual(out["method"], "symbolic")
+        self.assertTrue(runner.calls["numeric"]["cancel"].is_set())
+
+    def test_numeric_path_runs_under_budget(self):
+        runner = FakeRunner({"method": "symbolic"}, {"method": "numeric"}, symbolic_delay=0.2)
+        out = race(runner, "integrate", self.payload, budget=0.1)
+        self.assertEqual(out["method"], "numeric")
+        self.assertEqual(out["symbolic_status"], "timeout")
+        self.assertEqual(runner.calls["numeric"]["timeout"], 0.1)
+
+    def test_numeric_path_can_outlast_symbolic_budget(self):
+        runner = FakeRunner({"method": "symbolic"}, {"method": "numeric"}, symbolic_delay=0.2)
+        out = race(runner, "integrate", self.payload, budget=0.1, numeric_timeout=10)
+        self.assertEqual(out["method"], "numeric")
+        self.assertEqual(runner.calls["symbolic"]["timeout"], 0.1)
+        self.assertEqual(runner.calls["numeric"]["timeout"], 10)
+
+    def test_unevaluated_symbolic_falls_back(self):
+        runner = FakeRunner({"unevaluated": True, "result_str": "Integral(...)"}, {"method": "numeric"})
+        out = race(runner, "integrate", self.payload, budget=1)
+        self.assertEqual(out["symbolic_status"], "unevaluated")
+
+    def test_both_paths_fail(self):
+        runner = FakeRunner(ValueError("bad symbolic"), ValueError("bad numeric"))
+        with self.assertRaisesMessage(ValueError, "bad symbolic"):
+            race(runner, "integrate", self.payload, budget=1)
+
+    def test_indefinite_integral_skips_numeric_path(self):
+        runner = FakeRunner({"method": "symbolic"}, {"method": "numeric"})
+        race(runner, "integrate", {"expr": "x", "var": "x"}, budget=1)
+        self.assertNotIn("numeric", runner.calls)
+
+
+class SparseLinearAlgebraTests(SimpleTestCase):
+    def test_singular_sparse_det_is_zero(self):
+        # 第二行是第一行的 2 倍
+        out = linear_algebra("det", "shape 3 3; 0 0 1; 0 1 2; 1 0 2; 1 1 4; 2 2 5", fmt="coo")
+        self.assertEqual(float(out["result_str"]), 0.0)
+
+    def test_structurally_singular_sparse_det_is_zero(self):
+        out = linear_algebra("det", "shape 3 3; 0 0 1; 1 1 1", fmt="coo")
+        self.assertEqual(float(out["result_str"]), 0.0)
+
+    def test_sparse_det_matches_dense(self):
+        sparse = linear_algebra("det", "0 1 2; 1 0 3; 2 2 4; 0 0 1", fmt="coo")
+        dense = linear_algebra("det", "[[1, 2, 0], [3, 0, 0], [0, 0, 4]]")
+        self.assertAlmostEqual(float(sparse["result_str"]), float(dense["result_str"]))
+        self.assertAlmostEqual(float(sparse["result_str"]), -24.0)
+
+    def test_sparse_solve(self):
+        out = linear_algebra("solve", "shape 3 3; 0 0 2; 1 1 4; 2 2 5; 0 1 1", vector="[4, 8, 10]", fmt="coo")
+        self.assertTrue(out["sparse"])
+        self.assertEqual(out["result_str"], "[1.0, 2.0, 2.0]")
+
+    def test_singular_sparse_solve_raises_like_dense(self):
+        with self.assertRaisesMessage(ValueError, "Singular matrix"):
+            linear_algebra("solve", "[[1, 2], [2, 4]]", vector="[1, 2]")
+        with self.assertRaisesMessage(ValueError, "Singular matrix"):
+            linear_algebra("solve", "shape 3 3; 0 0 1; 0 1 2; 1 0 2; 1 1 4; 2 2 5", vector="[1, 2, 3]", fmt="coo")
+
+    def test_sparse_eig_returns_largest_eigenvalues(self):
+        diagonal = "; ".join(f"{i} {i} {i + 1}" for i in range(10))
+        out = linear_algebra("eig", diagonal, fmt="coo")
+        self.assertTrue(out["truncated"])
+        self.assertIn("模最大的 6 个特征值", out["result_str"])
+        values = out["result_str"].split("\n")[0].split(": ")[1]
+        np.testing.assert_allclose(sorted(json.loads(values)), [5, 6, 7, 8, 9, 10])
+
+    def test_large_sparse_matrix_rejects_dense_ops(self):
+        with self.assertRaisesMessage(ValueError, "矩阵阶数上限"):
+            linear_algebra("inv", "shape 4000 4000; 0 0 1", fmt="coo")
+
+    def test_large_matrix_output_is_a_preview(self):
+        identity = "; ".join(f"{i} {i} 1" for i in range(40))
+        out = linear_algebra("transpose", identity, fmt="coo")
+        self.assertTrue(out["truncated"])
+        self.assertEqual(out["shape"], [40, 40])
+
+
+def unpack(packed) -> np.ndarray:
+    """data 输出里的 float32 数组"""
+    return np.frombuffer(base64.b64decode(packed["data"]), dtype="<f4").reshape(packed["shape"])
+
+
+class PlotDataTests(SimpleTestCase):
+    def test_uniform_data_output(self):
+        out = plot_2d("x^2", "x", -2, 2, n=101, output="data")
+        self.assertEqual((out["kind"], out["samples"]), ("plot_data", 101))
+        xs, ys = unpack(out["x"]), unpack(out["y"])
+        np.testing.assert_allclose(xs, np.linspace(-2, 2, 101), rtol=1e-6)
+        np.testing.assert_allclose(ys, xs.astype(float) ** 2, rtol=1e-5)
+
+    def test_poles_become_nan(self):
+        ys = unpack(plot_2d("1/x", "x", -1, 1, n=101, output="data")["y"])
+        self.assertTrue(np.isnan(ys[50]))
+        self.assertFalse(np.isnan(ys[0]))
+
+    def test_rejects_unknown_output(self):
+        with self.assertRaisesMessage(ValueError, "png / data"):
+            plot_2d("x", "x", output="svg")
+
+
+class FigurePoolTests(SimpleTestCase):
+    def test_figures_are_reused_and_cleared(self):
+        pool = FigurePool(size=1)
+        with pool.figure(figsize=(3, 2)) as fig:
+            fig.add_subplot(111).plot([0, 1], [0, 1])
+        with pool.figure() as again:
+            self.assertIs(again, fig)
+            self.assertEqual(again.axes, [])
+            self.assertNotEqual(tuple(again.get_size_inches()), (3, 2))
+
+    def test_empty_pool_does_not_block(self):
+        pool = FigurePool(size=1)
+        with pool.figure() as first, pool.figure() as second:
+            self.assertIsNot(first, second)
+        self.assertEqual(pool._figures.qsize(), 1)
+
+    def test_warm_up_fills_pool(self):
+        pool = FigurePool(size=3)
+        pool.warm_up()
+        self.assertEqual(pool._figures.qsize(), 3)
+
+    def test_png_plot_renders(self):
+        out = plot_2d("sin(x)", "x", n=60)
+        self.assertEqual(out["kind"], "plot")
+        self.assertTrue(base64.b64decode(out["img_base64"]).startswith(b"\x89PNG"))
+
+
+class AdaptivePlotTests(SimpleTestCase):
+    def test_never_returns_more_than_n_points(self):
+        for func in ("tan(x)", "tan(5x)", "tan(20x)", "floor(x)"):
+            for n in (50, 800):
+                with self.subTest(func=func, n=n):
+                    out = plot_2d(func, "x", -5, 5, n=n, sampling="adaptive", output="data")
+                    self.assertLessEqual(out["x"]["shape"][0], n)
+
+    def test_poles_are_broken_with_nan(self):
+        out = plot_2d("tan(x)", "x", -5, 5, n=800, sampling="adaptive", output="data")
+        ys = unpack(out["y"])
+        # tan 在 [-5, 5] 上有 4 个极点，每个极点处至少断开一次（过大的值也会被裁成 NaN）
+        self.assertGreaterEqual(int(np.isnan(ys).sum()), 4)
+
+    def test_smooth_function_needs_few_points(self):
+        out = plot_2d("x^2", "x", -5, 5, n=800, sampling="adaptive", output="data")
+        self.assertLess(out["x"]["shape"][0], 200)
+
+
+class Plot3dTests(SimpleTestCase):
+    def test_data_output_is_capped(self):
+        out = plot_3d("sin(x)*cos(y)", n=1025, output="data")
+        self.assertEqual(out["n"], 1025)
+        self.assertEqual(out["grid_n"], PLOT3D_DATA_MAX_N)
+        self.assertEqual(out["z"]["shape"], [PLOT3D_DATA_MAX_N, PLOT3D_DATA_MAX_N])
+
+    def test_small_data_output_keeps_full_grid(self):
+        out = plot_3d("x*y", n=40, output="data")
+        self.assertEqual(out["z"]["shape"], [40, 40])
+
+    def test_fine_png_uses_lod(self):
+        out = plot_3d("x^2 + y^2", n=301)
+        self.assertLess(out["vertices"], 301 * 301)
+
+
+class SolveScanTests(SimpleTestCase):
+    def test_finds_every_root_in_interval(self):
+        out = solve_expr("sin(x)", "x", method="scan", x_min="-10", x_max="10")
+        self.assertEqual(len(out["roots"]), 7)
+        self.assertAlmostEqual(out["roots"][3], 0.0, places=9)
+
+    def test_no_solution(self):
+        self.assertEqual(solve_expr("1/x = 0", "x", method="scan")["roots"], [])
+
+    def test_double_root_without_sign_change(self):
+        out = solve_expr("(x - 1)^2", "x", method="scan", x_min="-3", x_max="3", n=100)
+        self.assertEqual(len(out["roots"]), 1)
+        self.assertAlmostEqual(out["roots"][0], 1.0, places=5)
+
+    def test_poles_are_not_roots(self):
+        out = solve_expr("tan(x)", "x", method="scan", x_min="-4", x_max="4")
+        # ±π 与 ±π/2 处的极点各有一个变号区间；0 恰好是采样点
+        self.assertEqual(out["brackets"], 4)
+        self.assertEqual(len(out["roots"]), 3)
+
+    def test_root_count_is_capped(self):
+        out = solve_expr("sin(x)", "x", method="scan", x_min="0.5", x_max="2000", n=200001)
+        self.assertTrue(out["truncated"])
+        self.assertEqual(len(out["roots"]), 500)
+
+    def test_rejects_bad_interval(self):
+        for x_min, x_max, n in (("1", "1", None), ("-oo", "1", None), ("0", "1", 2)):
+            with self.subTest(x_min=x_min, x_max=x_max, n=n), self.assertRaises(ValueError):
+                solve_expr("x", "x", method="scan", x_min=x_min, x_max=x_max, n=n)
+
+    def test_workspace_does_not_override_solve_variable(self):
+        workspace = {"x": sp.Integer(3), "c": sp.Integer(2), "L": sp.Integer(4)}
+        out = solve_expr("x^2 - c", "x", method="scan", x_min="-L", x_max="L", workspace=workspace)
+        self.assertEqual(out["interval"], [-4.0, 4.0])
+        self.assertEqual([round(r, 9) for r in out["roots"]], [-1.414213562, 1.414213562])
+
+    def test_bounds_cannot_reference_solve_variable(self):
+        with self.assertRaises((TypeError, ValueError)):
+            solve_expr("x^2 - 2", "x", method="scan", x_min="x", x_max="5", workspace={"x": sp.Integer(-5)})
+
+
+def parse_sse(chunks) -> list:
+    """SSE 文本 -> [(event, data)]，跳过 keep-alive 注释"""
+    events = []
+    for block in "".join(chunks).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class StreamEventsTests(SimpleTestCase):
+    def test_sse_event_format(self):
+        self.assertEqual(sse_event("partial", {"x": "π"}), 'event: partial\ndata: {"x": "π"}\n\n')
+
+    def test_partials_then_result(self):
+        def compute(progress, cancel):
+            progress({"order": 1})
+            progress({"order": 2})
+            return {"order": 4}
+
+        events = parse_sse(stream_events(compute))
+        self.assertEqual(events, [("partial", {"order": 1}), ("partial", {"order": 2}), ("result", {"order": 4})])
+
+    def test_error_event_includes_budget_details(self):
+        def compute(progress, cancel):
+            raise BudgetExceeded("timeout", 10, 10.2)
+
+        [(event, data)] = parse_sse(stream_events(compute))
+        self.assertEqual(event, "error")
+        self.assertEqual(data["reason"], "timeout")
+        self.assertIn("超时", data["error"])
+
+    def test_keepalive_while_waiting(self):
+        release = threading.Event()
+
+        def compute(progress, cancel):
+            release.wait(5)
+            return {}
+
+        with mock.patch("maths.streaming.KEEPALIVE_SECONDS", 0.05):
+            stream = stream_events(compute)
+            self.assertEqual(next(stream), ": keep-alive\n\n")
+        release.set()
+        self.assertEqual(parse_sse(stream), [("result", {})])
+
+    def test_closing_stream_cancels_computation(self):
+        started, stopped = threading.Event(), threading.Event()
+
+        def compute(progress, cancel):
+            progress({"order": 1})
+            started.set()
+            cancel.wait(5)
+            stopped.set()
+            raise Cancelled("计算已取消")
+
+        stream = stream_events(compute)
+        self.assertTrue(next(stream).startswith("event: partial"))
+        self.assertTrue(started.wait(5))
+        stream.close()
+        self.assertTrue(stopped.wait(5))
+
+
+@override_settings(**MATHS_TEST_SETTINGS)
+class SeriesStreamApiTests(MathsApiTestCase):
+    def test_streams_partials_then_result(self):
+        resp = self.post_json("/maths/api/series/stream/", {"expr": "exp(x)", "var": "x", "order": 6})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        events = parse_sse(chunk.decode() for chunk in resp.streaming_content)
+        self.assertEqual([e for e, _ in events], ["partial", "partial", "partial", "result"])
+        self.assertEqual([d["order"] for _, d in events[:-1]], [1, 2, 4])
+        self.assertIn("x^{5}", events[-1][1]["result_latex"])
+
+    def test_error_event(self):
+        resp = self.post_json("/maths/api/series/stream/", {"expr": "1 +", "var": "x"})
+        [(event, data)] = parse_sse(chunk.decode() for chunk in resp.streaming_content)
+        self.assertEqual(event, "error")
+        self.assertTrue(data["error"])
+
+    def test_rejects_invalid_payloads(self):
+        self.assertEqual(self.post_json("/maths/api/series/stream/", [1]).status_code, 400)
+        with mock.patch("maths.workspace.get_user_workspace", side_effect=ValueError("变量 f 存在循环依赖")):
+            resp = self.post_json("/maths/api/series/stream/", {"expr": "f"})
+        self.assertEqual(resp.status_code, 400)
+
+
+@override_settings(**MATHS_TEST_SETTINGS)
+class LinearUploadApiTests(MathsApiTestCase):
+    def test_mtx_upload_solves_sparse_system(self):
+        mtx = SimpleUploadedFile("a.mtx", b"%%MatrixMarket matrix coordinate real general\n"
+                                          b"2 2 2\n1 1 2\n2 2 4\n")
+        resp = self.client.post("/maths/api/linear/upload/", {"op": "solve", "matrix_a": mtx, "vector": "[2, 8]"})
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()["data"]
+        self.assertTrue(data["sparse"])
+        self.assertEqual(data["result_str"], "[1.0, 2.0]")
+
+    def test_npy_upload(self):
+        buf = io.BytesIO()
+        np.save(buf, np.array([[2.0, 0.0], [0.0, 3.0]]))
+        npy = SimpleUploadedFile("a.npy", buf.getvalue())
+        resp = self.client.post("/maths/api/linear/upload/", {"op": "det", "matrix_a": npy})
+        self.assertAlmostEqual(float(resp.json()["data"]["result_str"]), 6.0)
+
+    def test_rejects_missing_or_unknown_files(self):
+        self.assertEqual(self.client.post("/maths/api/linear/upload/", {"op": "det"}).status_code, 400)
+        bad = SimpleUploadedFile("a.pkl", b"\x80")
+        resp = self.client.post("/maths/api/linear/upload/", {"op": "det", "matrix_a": bad})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn(".npy", resp.json()["error"])
+
+
+class WorkspaceGraphTests(SimpleTestCase):
+    def setUp(self):
+        self.ws = Workspace()
+        self.ws.define("a", "2")
+        self.ws.define("b", "a + 1")
+        self.ws.define("c", "x^2")
+
+    def test_redefinition_recomputes_only_downstream(self):
+        self.assertEqual(self.ws.define("a", "5"), ["a", "b"])
+        self.assertEqual(self.ws.values()["b"], 6)
+        self.assertEqual(self.ws.define("a", "5"), [])
+
+    def test_cycle_is_rejected_and_old_definition_kept(self):
+        with self.assertRaisesMessage(ValueError, "循环依赖"):
+            self.ws.define("a", "b + 1")
+        self.assertEqual(self.ws.values()["a"], 2)
+        self.assertEqual(self.ws.describe()[0]["expr"], "2")
+
+    def test_new_variable_relinks_earlier_plain_symbol(self):
+        self.ws.define("g", "k + 1")
+        self.assertEqual(self.ws.define("k", "3"), ["k", "g"])
+        self.assertEqual(self.ws.values()["g"], 4)
+
+    def test_cycle_through_relinked_symbol_is_rejected(self):
+        self.ws.define("f", "x + 1")
+        with self.assertRaisesMessage(ValueError, "变量 x 存在循环依赖"):
+            self.ws.define("x", "f*2")
+        self.assertNotIn("x", self.ws.values())
+        self.assertEqual(self.ws.values()["f"], REAL["x"] + 1)
+        self.assertEqual(self.ws.define("a", "7"), ["a", "b"])
+        self.assertEqual(self.ws.values()["f"], REAL["x"] + 1)
+
+    def test_referenced_variable_cannot_be_removed(self):
+        with self.assertRaisesMessage(ValueError, "被 b 引用"):
+            self.ws.remove("a")
+        self.ws.remove("b")
+        self.ws.remove("a")
+        self.assertEqual(list(self.ws.values()), ["c"])
+
+    def test_rejects_reserved_names(self):
+        for name in ("sin", "pi", "1a", ""):
+            with self.subTest(name=name), self.assertRaisesMessage(ValueError, "变量名不合法"):
+                self.ws.define(name, "1")
+
+    def test_reads_wait_for_concurrent_definition(self):
+        reads = []
+        with self.ws.lock:
+            readers = [threading.Thread(target=lambda: reads.append(self.ws.values())),
+                       threading.Thread(target=lambda: reads.append(self.ws.describe()))]
+            for t in readers:
+                t.start()
+            time.sleep(0.05)
+            self.assertEqual(reads, [])
+            self.ws._defs["d"] = {"expr": "1", "template": sp.S.One, "deps": set(), "value": sp.S.One}
+        for t in readers:
+            t.join(5)
+        self.assertEqual(sorted(len(r) for r in reads), [4, 4])
+
+    def test_from_definitions_resolves_forward_references(self):
+        ws = Workspace.from_definitions([("h", "a * 2"), ("a", "3")])
+        self.assertEqual(ws.values(), {"h": 6, "a": 3})
+        with self.assertRaisesMessage(ValueError, "循环依赖"):
+            Workspace.from_definitions([("p", "q"), ("q", "p")])
+
+
+class WorkspaceSymbolTests(SimpleTestCase):
+    def test_workspace_value_cancels_with_free_variable(self):
+        ws = Workspace()
+        ws.define("f", "sin(x)*x")
+        self.assertEqual(eval_expr("f - x*sin(x)", workspace=ws.values())["result_str"], "0")
+
+    def test_dependent_definition_cancels(self):
+        ws = Workspace()
+        ws.define("f", "sin(x)*x")
+        ws.define("h", "f + y")
+        self.assertEqual(eval_expr("h - x*sin(x) - y", workspace=ws.values())["result_str"], "0")
+
+    def test_workspace_value_differentiates_in_its_variable(self):
+        ws = Workspace()
+        ws.define("f", "x^3")
+        self.assertEqual(diff_expr("f", "x", workspace=ws.values())["result_str"], "3*x**2")
+
+    def test_build_workspace_uses_same_symbols(self):
+        ws = build_workspace({"f": "sin(x)*x", "g": "f^2"})
+        self.assertEqual(eval_expr("g - x^2*sin(x)^2", workspace=ws)["result_str"], "0")
+
+
+@override_settings(**MATHS_TEST_SETTINGS)
+class WorkspaceApiTests(MathsApiTestCase):
+    def test_assignment_then_eval_cancels(self):
+        self.post_json("/maths/api/run/", {"mode": "eval", "expr": "f = sin(x)*x"})
+        resp = self.post_json("/maths/api/run/", {"mode": "eval", "expr": "f - x*sin(x)"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["data"]["result_str"], "0")
+
+    def test_variables_persist_and_reload(self):
+        resp = self.post_json("/maths/api/workspace/", {"assign": "a = 2"})
+        self.assertEqual(resp.status_code, 200)
+        resp = self.post_json("/maths/api/workspace/", {"name": "b", "expr": "a^2"})
+        self.assertEqual(resp.json()["data"]["recomputed"], ["b"])
+        self.assertEqual(MathVariable.objects.filter(user=self.user).count(), 2)
+
+        workspace._CACHE.clear()
+        variables = self.client.get("/maths/api/workspace/").json()["variables"]
+        self.assertEqual([(v["name"], v["value_str"], v["deps"]) for v in variables],
+                         [("a", "2", []), ("b", "4", ["a"])])
+
+    def test_reloads_after_database_change(self):
+        self.post_json("/maths/api/workspace/", {"assign": "a = 2"})
+        MathVariable.objects.filter(user=self.user, name="a").update(expr="7")
+        MathVariable.objects.create(user=self.user, name="b", expr="a + 1")
+        resp = self.post_json("/maths/api/run/", {"mode": "eval", "expr": "b"})
+        self.assertEqual(resp.json()["data"]["result_str"], "8")
+
+    def test_cycle_through_relinked_symbol_is_not_saved(self):
+        self.post_json("/maths/api/workspace/", {"assign": "f = x + 1"})
+        resp = self.post_json("/maths/api/workspace/", {"assign": "x = f*2"})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("循环依赖", resp.json()["error"])
+        self.assertEqual(list(MathVariable.objects.filter(user=self.user).values_list("name", flat=True)), ["f"])
+
+        workspace._CACHE.clear()
+        resp = self.post_json("/maths/api/run/", {"mode": "eval", "expr": "f - x"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["data"]["result_str"], "1")
+
+    def test_invalid_definitions_are_bad_requests(self):
+        self.post_json("/maths/api/workspace/", {"assign": "a = 2"})
+        self.post_json("/maths/api/workspace/", {"assign": "b = a"})
+        for payload in ({"assign": "a == 2"}, {"name": "sin", "expr": "1"}, {"assign": "a = b + 1"}):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post_json("/maths/api/workspace/", payload).status_code, 400)
+        self.assertEqual(MathVariable.objects.get(user=self.user, name="a").expr, "2")
+
+    def test_delete(self):
+        self.post_json("/maths/api/workspace/", {"assign": "a = 2"})
+        self.post_json("/maths/api/workspace/", {"assign": "b = a + 1"})
+        resp = self.client.post("/maths/api/workspace/a/delete/")
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post("/maths/api/workspace/b/delete/")
+        self.assertEqual([v["name"] for v in resp.json()["variables"]], ["a"])
+        self.assertFalse(MathVariable.objects.filter(user=self.user, name="b").exists())
+
+
+@override_settings(**MATHS_TEST_SETTINGS)
+class BatchApiTests(MathsApiTestCase):
+    def test_batch_workspace_cancels_with_free_variable(self):
+        resp = self.post_json("/maths/api/batch/", {
+            "workspace": {"g": "x^2"},
+            "ops": [{"mode": "eval", "expr": "g - x^2"}, {"mode": "diff", "expr": "g", "var": "x"}],
+        })
+        self.assertEqual(resp.status_code, 200)
+        results = resp.json()["results"]
+        self.assertEqual(results[0]["data"]["result_str"], "0")
+        self.assertEqual(results[1]["data"]["result_str"], "2*x")
+
+    def test_batch_dedupes_and_isolates_failures(self):
+        resp = self.post_json("/maths/api/batch/", {
+            "ops": [
+                {"mode": "eval", "expr": "1 + 1"},
+                {"mode": "eval", "expr": " 1 + 1 "},
+                {"mode": "eval", "expr": "1 +"},
+            ],
+        })
+        body = resp.json()
+        self.assertEqual(body["deduped"], 1)
+        self.assertEqual([r["ok"] for r in body["results"]], [True, True, False])
+
+    def test_batch_rejects_invalid_ops(self):
+        self.assertEqual(self.post_json("/maths/api/batch/", {"ops": []}).status_code, 400)
+        self.assertEqual(self.post_json("/maths/api/batch/", {"ops": ["x"]}).status_code, 400)
+
+
+@override_settings(**MATHS_TEST_SETTINGS)
+class PlotApiTests(MathsApiTestCase):
+    def test_run_returns_plot_data(self):
+        resp = self.post_json("/maths/api/run/", {"mode": "plot", "expr": "sin(x)", "n": 60, "output": "data"})
+        data = resp.json()["data"]
+        self.assertEqual(data["kind"], "plot_data")
+        self.assertEqual(unpack(data["y"]).shape, (60,))
+
+
+@override_settings(**MATHS_TEST_SETTINGS)
+class Plot3dApiTests(MathsApiTestCase):
+    payload = {"mode": "plot3d", "expr": "sin(x)*cos(y)", "n": PLOT3D_SYNC_MAX_N + 1, "output": "data"}
+
+    def test_sync_run_rejects_large_grid(self):
+        resp = self.post_json("/maths/api/run/", self.payload)
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("api/jobs/", resp.json()["error"])
+
+    def test_job_api_accepts_large_grid(self):
+        job_id = self.post_json("/maths/api/jobs/", self.payload).json()["job_id"]
+        job = self.wait_for_job(job_id)
+        self.assertEqual(job["status"], "finished", job)
+        self.assertEqual(job["result"]["grid_n"], PLOT3D_DATA_MAX_N)
+
+
+@override_settings(**MATHS_TEST_SETTINGS)
+class JobApiTests(MathsApiTestCase):
+    def test_submit_and_poll(self):
+        resp = self.post_json("/maths/api/jobs/", {"mode": "diff", "expr": "x^3", "var": "x"})
+        self.assertEqual(resp.status_code, 200)
+        job = self.wait_for_job(resp.json()["job_id"])
+        self.assertEqual(job["status"], "finished")
+        self.assertEqual(job["result"]["result_str"], "3*x**2")
+        self.assertNotIn("user_id", job)
+
+    def test_other_users_cannot_see_job(self):
+        job_id = self.post_json("/maths/api/jobs/", {"mode": "eval", "expr": "1+1"}).json()["job_id"]
+        other = User.objects.create_user("other", "other@example.com", "pw")
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(f"/maths/api/jobs/{job_id}/").status_code, 404)
+
+    def test_rejects_invalid_payloads(self):
+        resp = self.client.post("/maths/api/jobs/", "{not json", content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        for payload in ([1, 2], "x^2", 3, None):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post_json("/maths/api/jobs/", payload).status_code, 400)
+
+    def test_workspace_failure_is_a_bad_request(self):
+        with mock.patch("maths.workspace.get_user_workspace", side_effect=ValueError("变量 f 存在循环依赖")):
+            resp = self.post_json("/maths/api/jobs/", {"mode": "eval", "expr": "f"})
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("循环依赖", resp.json()["error"])
+
+    def test_failed_computation_reports_error(self):
+        job_id = self.post_json("/maths/api/jobs/", {"mode": "eval", "expr": "1 +"}).json()["job_id"]
+        job = self.wait_for_job(job_id)
+        self.assertEqual(job["status"], "error")
+        self.assertNotIn("traceback", job)
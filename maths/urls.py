@@ -8,4 +8,12 @@ urlpatterns = [
     path("api/run/", views_api.api_run, name="api_run"),
     path("api/eval/", views_api.api_eval, name="api_eval"),
     path("api/plot/", views_api.api_plot, name="api_plot"),
+    path("api/series/stream/", views_api.api_series_stream, name="api_series_stream"),
+    path("api/linear/upload/", views_api.api_linear_upload, name="api_linear_upload"),
+    path("api/batch/", views_api.api_batch, name="api_batch"),
+    path("api/workspace/", views_api.api_workspace, name="api_workspace"),
+    path("api/workspace/<str:name>/delete/", views_api.api_workspace_delete, name="api_workspace_delete"),
+    path("api/jobs/", views_api.api_job_submit, name="api_job_submit"),
+    path("api/jobs/<str:job_id>/", views_api.api_job_status, name="api_job_status"),
+    path("api/cache-stats/", views_api.api_cache_stats, name="api_cache_stats"),
 ]
\ No newline at end of file
@@ -1,18 +1,59 @@
 import json
-from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from functools import partial
+
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
 from django.contrib.auth.decorators import login_required
-from .engine import eval_expr, plot_2d, linear_algebra
-from .engine import run as run_engine
+from .batch import run_batch
+from .executor import SYMBOLIC_MODES, BudgetExceeded, Cancelled, run_with_budget
+from .fallback import FALLBACK_MODES, race
+from .jobs import get_math_job, start_math_job
+from .memo import memoized
+from .streaming import stream_events
+
+# engine / workspace 会拉起 sympy、numpy（以及作图时的 matplotlib），一律在视图函数里按需导入：
+# 加载 URLconf（每个 Django 进程启动、manage.py 命令）时不必付这部分开销。
+# 需要提前加载的部署可以在 worker fork 之后调用 maths.warmup.warm_up()。
+
+
+def _run_symbolic(mode, payload, workspace, timeout=None, progress=None, cancel=None):
+    """
+    符号计算走带时间/内存预算的进程池；关闭沙箱时退回进程内执行。
+    progress 接收中间结果；cancel（threading.Event）置位后停止计算并抛 Cancelled——
+    进程内执行时只能在两次中间结果之间检查。
+    """
+    if not getattr(settings, "MATHS_SANDBOX_ENABLED", False):
+        from .engine import run as run_engine
+
+        if cancel is not None and progress is not None:
+            report = progress
+
+            def progress(partial):
+                if cancel.is_set():
+                    raise Cancelled("计算已取消")
+                report(partial)
+
+        return run_engine(mode, payload, workspace=workspace, progress=progress)
+    return run_with_budget(
+        mode, payload, workspace,
+        timeout=timeout or getattr(settings, "MATHS_SANDBOX_TIMEOUT", 10),
+        memory_mb=getattr(settings, "MATHS_SANDBOX_MEMORY_MB", 512),
+        max_workers=getattr(settings, "MATHS_SANDBOX_WORKERS", 2),
+        progress=progress,
+        cancel=cancel,
+    )
 
 @login_required
 @require_POST
 def api_eval(request):
+    from .engine import eval_expr
+    from .workspace import get_user_workspace
+
     payload = json.loads(request.body.decode("utf-8"))
     expr = payload.get("expr", "")
-    # MVP 先不做 workspace，后面再加
     try:
-        out = eval_expr(expr, workspace={})
+        out = eval_expr(expr, workspace=get_user_workspace(request.user).values())
         return JsonResponse({"ok": True, "data": out})
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=400)
@@ -20,6 +61,8 @@ def api_eval(request):
 @login_required
 @require_POST
 def api_plot(request):
+    from .engine import plot_2d
+
     payload = json.loads(request.body.decode("utf-8"))
     func = payload.get("func", "")
     x_min = payload.get("x_min", -5)
@@ -31,22 +74,255 @@ def api_plot(request):
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=400)
     
+def _execute(payload, workspace=None, progress=None, background=False):
+    """
+    api_run、批量接口与后台任务共用的分发逻辑；progress 只有后台任务会传（渐进式结果）。
+    background=False（在请求线程里同步执行）时拒绝过细的 3D 网格，这类请求应提交到 api/jobs/。
+    """
+    from .engine import PLOT3D_SYNC_MAX_N, linear_algebra
+    from .engine import run as run_engine
+
+    workspace = workspace or {}
+    mode = payload.get("mode", "eval")
+    if mode == "plot3d" and not background and int(payload.get("n") or 80) > PLOT3D_SYNC_MAX_N:
+        raise ValueError(f"3D 网格 n 超过 {PLOT3D_SYNC_MAX_N} 时请通过后台任务接口（api/jobs/）提交")
+    if mode == "linear":
+        # 线性代数特殊处理，因为输入不是单一表达式
+        op = payload.get("op")
+        matrix_a = payload.get("matrix_a")
+        matrix_b = payload.get("matrix_b")
+        vector = payload.get("vector")
+        fmt = payload.get("format", "dense")
+        return linear_algebra(op, matrix_a, matrix_b, vector, workspace=workspace, fmt=fmt)
+    if mode in FALLBACK_MODES and (payload.get("strategy") or "auto") == "auto":
+        # 积分/极限：符号与数值竞速，符号路径在预算内没给出闭式解就用数值结果
+        return memoized(partial(
+            race, _run_symbolic, mode, payload, workspace,
+            budget=getattr(settings, "MATHS_FALLBACK_BUDGET", 3),
+            max_workers=getattr(settings, "MATHS_SANDBOX_WORKERS", 2) * 2,
+            numeric_timeout=getattr(settings, "MATHS_SANDBOX_TIMEOUT", 10),
+        ), mode, payload, workspace)
+    if mode in SYMBOLIC_MODES:
+        return memoized(
+            partial(_run_symbolic, mode, payload, workspace=workspace, progress=progress), mode, payload, workspace
+        )
+    return memoized(
+        partial(run_engine, mode, payload, workspace=workspace, progress=progress), mode, payload, workspace
+    )
+
 @login_required
 @require_POST
 def api_run(request):
+    from .workspace import get_user_workspace, parse_assignment
+
     payload = json.loads(request.body.decode("utf-8"))
-    mode = payload.get("mode", "eval")
 
     try:
-        if mode == "linear":
-            # 线性代数特殊处理，因为输入不是单一表达式
-            op = payload.get("op")
-            matrix_a = payload.get("matrix_a")
-            matrix_b = payload.get("matrix_b")
-            vector = payload.get("vector")
-            out = linear_algebra(op, matrix_a, matrix_b, vector, workspace={})
-        else:
-            out = run_engine(mode, payload, workspace={})
+        if payload.get("mode", "eval") == "eval":
+            # 计算模式下的 “f = sin(x)*x” 视为定义变量
+            assignment = parse_assignment(payload.get("expr", ""))
+            if assignment:
+                return JsonResponse({"ok": True, "data": _assign(request.user, *assignment)})
+        out = _execute(payload, workspace=get_user_workspace(request.user).values())
         return JsonResponse({"ok": True, "data": out})
+    except BudgetExceeded as e:
+        return JsonResponse({"ok": False, "error": str(e), **e.as_dict()}, status=504)
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+@login_required
+@require_POST
+def api_series_stream(request):
+    """
+    泰勒展开的流式版本（text/event-stream，请求体同 api_run 的 series）：
+    先推送低阶的部分展开式（event: partial），最后推送完整结果（event: result）或错误（event: error）。
+    客户端断开连接即取消计算（沙箱 worker 会被杀掉）。
+    """
+    from .workspace import get_user_workspace
+
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": f"请求体不是合法 JSON: {e}"}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"ok": False, "error": "请求体必须是 JSON 对象"}, status=400)
+    payload = {**payload, "mode": "series"}
+    try:
+        workspace = get_user_workspace(request.user).values()
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": f"变量表加载失败: {e}"}, status=400)
+
+    def compute(progress, cancel):
+        return memoized(
+            partial(_run_symbolic, "series", payload, workspace, progress=progress, cancel=cancel),
+            "series", payload, workspace,
+        )
+
+    response = StreamingHttpResponse(
+        stream_events(compute, max_workers=getattr(settings, "MATHS_STREAM_WORKERS", 4)),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"   # 让 nginx 不缓冲，事件实时到达
+    return response
+
+@login_required
+@require_POST
+def api_linear_upload(request):
+    """
+    大矩阵走文件上传（multipart）：matrix_a 必填，matrix_b 可选（也可以用文本字段 vector）；
+    支持 .npy / .mtx / .txt / .csv。
+    """
+    from .engine import linear_algebra, load_matrix_file
+
+    max_bytes = getattr(settings, "MATHS_MATRIX_UPLOAD_MAX_MB", 20) * 1024 * 1024
+    try:
+        matrices = {}
+        for field in ("matrix_a", "matrix_b"):
+            upload = request.FILES.get(field)
+            if upload is None:
+                continue
+            if upload.size > max_bytes:
+                raise ValueError(f"{field} 文件过大")
+            label = "矩阵 A" if field == "matrix_a" else "矩阵 b"
+            matrices[field] = load_matrix_file(upload.read(), upload.name, label)
+        if "matrix_a" not in matrices:
+            raise ValueError("请上传矩阵 A 文件")
+
+        out = linear_algebra(
+            request.POST.get("op"),
+            matrices["matrix_a"],
+            matrices.get("matrix_b"),
+            request.POST.get("vector"),
+            workspace={},
+        )
+        return JsonResponse({"ok": True, "data": out})
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+@login_required
+@require_POST
+def api_batch(request):
+    """
+    一次提交多个操作：{"workspace": {"f": "sin(x)*x"}, "ops": [{"mode": "diff", "expr": "f"}, ...]}
+    workspace 只解析一次，所有操作共享；返回与 ops 同序的结果列表。
+    """
+    from .engine import build_workspace
+    from .workspace import get_user_workspace
+
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+        workspace = build_workspace(
+            payload.get("workspace"),
+            base=get_user_workspace(request.user).values(),
+        )
+        out = run_batch(
+            _execute,
+            payload.get("ops"),
+            workspace,
+            max_workers=getattr(settings, "MATHS_BATCH_WORKERS", 4),
+        )
+        return JsonResponse({"ok": True, **out})
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+@login_required
+@require_POST
+def api_job_submit(request):
+    """提交耗时计算（3D 作图、解方程等），立即返回 job_id，之后轮询 api_job_status"""
+    from .workspace import get_user_workspace
+
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": f"请求体不是合法 JSON: {e}"}, status=400)
+    if not isinstance(payload, dict):
+        return JsonResponse({"ok": False, "error": "请求体必须是 JSON 对象"}, status=400)
+
+    try:
+        workspace = get_user_workspace(request.user).values()
     except Exception as e:
-        return JsonResponse({"ok": False, "error": str(e)}, status=400)
\ No newline at end of file
+        return JsonResponse({"ok": False, "error": f"变量表加载失败: {e}"}, status=400)
+
+    job_id = start_math_job(
+        partial(_execute, workspace=workspace, background=True),
+        payload.get("mode", "eval"),
+        payload,
+        user_id=request.user.pk,
+        max_workers=getattr(settings, "MATHS_JOB_WORKERS", 4),
+    )
+    return JsonResponse({"ok": True, "job_id": job_id})
+
+@login_required
+@require_GET
+def api_job_status(request, job_id):
+    job = get_math_job(job_id, user_id=request.user.pk)
+    if not job:
+        return JsonResponse({"ok": False, "error": "找不到该计算任务。"}, status=404)
+    job.pop("user_id", None)
+    job.pop("traceback", None)
+    return JsonResponse({"ok": True, "job": job})
+
+@login_required
+@require_GET
+def api_cache_stats(request):
+    from .engine import cache_stats
+    from .memo import stats as result_stats
+
+    # 表达式解析 / lambdify / 计算结果缓存的命中情况，便于观察对 api_run 延迟的影响
+    return JsonResponse({"ok": True, "data": {**cache_stats(), "results": result_stats()}})
+
+def _assign(user, name, expr_str):
+    import sympy as sp
+    from .workspace import define_user_variable
+
+    ws, recomputed = define_user_variable(user, name, expr_str)
+    value = ws.values()[name]
+    return {
+        "kind": "text",
+        "result_str": f"{name} = {value}",
+        "result_latex": f"{name} = {sp.latex(value)}",
+        "recomputed": recomputed,
+    }
+
+@login_required
+def api_workspace(request):
+    """GET 列出已保存的变量；POST {"name", "expr"} 或 {"assign": "f = sin(x)*x"} 新增/修改"""
+    from .workspace import get_user_workspace, parse_assignment
+
+    if request.method == "POST":
+        try:
+            payload = json.loads(request.body.decode("utf-8"))
+            if payload.get("assign"):
+                assignment = parse_assignment(payload["assign"])
+                if not assignment:
+                    raise ValueError("赋值格式应为 name = 表达式")
+            else:
+                assignment = (payload.get("name", ""), payload.get("expr", ""))
+            out = _assign(request.user, *assignment)
+        except Exception as e:
+            return JsonResponse({"ok": False, "error": str(e)}, status=400)
+        return JsonResponse({
+            "ok": True,
+            "data": out,
+            "variables": get_user_workspace(request.user).describe(),
+        })
+
+    if request.method != "GET":
+        return JsonResponse({"ok": False, "error": "仅支持 GET / POST"}, status=405)
+    try:
+        variables = get_user_workspace(request.user).describe()
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    return JsonResponse({"ok": True, "variables": variables})
+
+@login_required
+@require_POST
+def api_workspace_delete(request, name):
+    from .workspace import delete_user_variable
+
+    try:
+        ws = delete_user_variable(request.user, name)
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+    return JsonResponse({"ok": True, "variables": ws.describe()})
@@ -0,0 +1,35 @@
+import threading
+import time
+
+
+def warm_up() -> dict:
+    """
+    预加载 SymPy / NumPy / Matplotlib，并把解析、lambdify、Figure 池各走一遍，返回各阶段耗时（毫秒）。
+    maths 的视图按需导入这些库，进程启动很快，但第一个计算请求要付导入开销；
+    多进程部署可以在 worker fork 之后调用它，例如 gunicorn 配置：
+
+        def post_fork(server, worker):
+            from maths.warmup import warm_up
+            warm_up()
+    """
+    t0 = time.perf_counter()
+    from . import engine
+    t1 = time.perf_counter()
+
+    x = engine._sym("x")
+    expr = engine.safe_parse("sin(x)*exp(-x^2) + 1", {"x": x})
+    engine._lambdify((x,), expr)(engine.np.linspace(-1, 1, 8))
+    t2 = time.perf_counter()
+
+    from . import render
+    render.warm_up()
+    t3 = time.perf_counter()
+
+    return engine._timings(import_engine=t1 - t0, parse=t2 - t1, render=t3 - t2)
+
+
+def warm_up_in_background() -> threading.Thread:
+    """在后台线程预热，不阻塞进程启动"""
+    thread = threading.Thread(target=warm_up, name="maths-warmup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,216 @@
+import re
+import threading
+
+import sympy as sp
+
+from .cache import LRUCache
+from .engine import ALLOWED, WORKSPACE_NAME, safe_parse
+
+ASSIGNMENT = re.compile(r"^\s*([a-zA-Z]\w*)\s*=(?!=)\s*(.+)$", re.S)
+
+# 每个进程最多缓存多少个用户的 workspace
+WORKSPACE_CACHE_SIZE = 128
+
+
+class Workspace:
+    """
+    命名变量表 + 依赖图。
+    每个定义只解析一次，解析时把其它变量名替换成固定的占位符，得到“模板”；
+    变量的值 = 模板里的占位符换成上游变量的当前值（xreplace，很便宜）。
+    修改某个定义时只重算它自己和下游依赖它的变量。
+    """
+
+    def __init__(self):
+        self._defs = {}            # name -> {"expr", "template", "deps", "value"}
+        self._placeholders = {}    # name -> Dummy
+        self.stamp = None          # 与数据库同步用的版本戳
+        self.lock = threading.Lock()
+
+    def _placeholder(self, name: str) -> sp.Dummy:
+        if name not in self._placeholders:
+            self._placeholders[name] = sp.Dummy(name)
+        return self._placeholders[name]
+
+    def _parse_template(self, name: str, expr_str: str):
+        refs = {n: self._placeholder(n) for n in self._defs if n != name}
+        template = safe_parse(expr_str, refs)
+        by_placeholder = {p: n for n, p in refs.items()}
+        deps = {by_placeholder[s] for s in template.free_symbols if s in by_placeholder}
+        return template, deps
+
+    def _upstream(self, name: str) -> set:
+        seen, stack = set(), [name]
+        while stack:
+            for dep in self._defs[stack.pop()]["deps"]:
+                if dep not in seen:
+                    seen.add(dep)
+                    stack.append(dep)
+        return seen
+
+    def _downstream(self, names: set) -> list:
+        """names 及所有依赖它们的变量，按拓扑序返回"""
+        affected = set(names)
+        changed = True
+        while changed:
+            changed = False
+            for n, d in self._defs.items():
+                if n not in affected and d["deps"] & affected:
+                    affected.add(n)
+                    changed = True
+
+        order, done = [], set()
+
+        def visit(n):
+            if n in done:
+                return
+            done.add(n)
+            for dep in self._defs[n]["deps"]:
+                if dep in affected:
+                    visit(dep)
+            order.append(n)
+
+        for n in self._defs:
+            if n in affected:
+                visit(n)
+        return order
+
+    def _recompute(self, names: set) -> list:
+        order = self._downstream(names)
+        for n in order:
+            d = self._defs[n]
+            d["value"] = d["template"].xreplace(
+                {self._placeholder(dep): self._defs[dep]["value"] for dep in d["deps"]}
+            )
+        return order
+
+    def define(self, name: str, expr_str: str) -> list:
+        """新增或修改一个定义，返回被重算的变量名（拓扑序）"""
+        if not WORKSPACE_NAME.fullmatch(name or "") or name in ALLOWED:
+            raise ValueError(f"变量名不合法：{name}")
+
+        old = self._defs.get(name)
+        if old is not None and old["expr"] == expr_str:
+            return []
+
+        template, deps = self._parse_template(name, expr_str)
+        self._defs[name] = {"expr": expr_str, "template": template, "deps": deps, "value": None}
+
+        # 改动前的定义，出现循环依赖时整体还原
+        saved = {name: old}
+        if old is None:
+            # 之前的定义里把 name 当成普通符号用了，现在它成了变量，需要改为引用
+            plain = sp.Symbol(name, real=True)
+            for n, d in self._defs.items():
+                if n != name and plain in d["template"].free_symbols:
+                    saved[n] = dict(d)
+                    d["template"], d["deps"] = self._parse_template(n, d["expr"])
+
+        # 改为引用后也可能成环（先定义 f = x+1，再定义 x = f*2），所有改动过的变量都要检查
+        for n in saved:
+            if n in self._upstream(n):
+                for m, d in saved.items():
+                    if d is None:
+                        del self._defs[m]
+                    else:
+                        self._defs[m] = d
+                raise ValueError(f"变量 {n} 存在循环依赖")
+        return self._recompute(set(saved))
+
+    def remove(self, name: str):
+        if name not in self._defs:
+            raise ValueError(f"变量 {name} 不存在")
+        users = [n for n, d in self._defs.items() if name in d["deps"]]
+        if users:
+            raise ValueError(f"变量 {name} 被 {', '.join(users)} 引用，无法删除")
+        del self._defs[name]
+
+    def values(self) -> dict:
+        """传给 engine 的 workspace：{name: 当前值}；缓存的 workspace 会被其它请求同时修改，读取时持锁"""
+        with self.lock:
+            return {n: d["value"] for n, d in self._defs.items()}
+
+    def describe(self) -> list:
+        with self.lock:
+            defs = [(n, d["expr"], sorted(d["deps"]), d["value"]) for n, d in self._defs.items()]
+        # latex 比较慢，放到锁外面
+        return [
+            {
+                "name": n,
+                "expr": expr,
+                "deps": deps,
+                "value_str": str(value),
+                "value_latex": sp.latex(value),
+            }
+            for n, expr, deps, value in defs
+        ]
+
+    @classmethod
+    def from_definitions(cls, definitions) -> "Workspace":
+        """从 (name, expr) 序列重建；先登记所有名字，保证相互引用都能解析成占位符"""
+        ws = cls()
+        definitions = list(definitions)
+        for name, _ in definitions:
+            ws._defs[name] = {"expr": None, "template": sp.S.Zero, "deps": set(), "value": None}
+        for name, expr_str in definitions:
+            template, deps = ws._parse_template(name, expr_str)
+            ws._defs[name] = {"expr": expr_str, "template": template, "deps": deps, "value": None}
+        for name in ws._defs:
+            if name in ws._upstream(name):
+                raise ValueError(f"变量 {name} 存在循环依赖")
+        ws._recompute(set(ws._defs))
+        return ws
+
+
+# ---------- 持久化：MathVariable 表 + 进程内缓存 ----------
+
+_CACHE = LRUCache(WORKSPACE_CACHE_SIZE)
+
+
+def _db_stamp(user):
+    from django.db.models import Count, Max
+
+    agg = user.math_variables.aggregate(n=Count("id"), t=Max("updated_at"))
+    return (agg["n"], agg["t"])
+
+
+def get_user_workspace(user) -> Workspace:
+    """取用户的 workspace；数据库有变动（其它进程修改过）时才重新加载"""
+    stamp = _db_stamp(user)
+    ws = _CACHE.get(user.pk)
+    if ws is not None and ws.stamp == stamp:
+        return ws
+
+    rows = user.math_variables.values_list("name", "expr")
+    ws = Workspace.from_definitions(rows)
+    ws.stamp = stamp
+    _CACHE.put(user.pk, ws)
+    return ws
+
+
+def define_user_variable(user, name: str, expr_str: str) -> tuple:
+    from .models import MathVariable
+
+    expr_str = (expr_str or "").strip()
+    ws = get_user_workspace(user)
+    with ws.lock:
+        recomputed = ws.define(name, expr_str)
+        MathVariable.objects.update_or_create(user=user, name=name, defaults={"expr": expr_str})
+        ws.stamp = _db_stamp(user)
+    return ws, recomputed
+
+
+def delete_user_variable(user, name: str) -> Workspace:
+    ws = get_user_workspace(user)
+    with ws.lock:
+        ws.remove(name)
+        user.math_variables.filter(name=name).delete()
+        ws.stamp = _db_stamp(user)
+    return ws
+
+
+def parse_assignment(text: str):
+    """'f = sin(x)*x' -> ("f", "sin(x)*x")；不是赋值语句时返回 None"""
+    m = ASSIGNMENT.match(text or "")
+    if not m:
+        return None
+    return m.group(1), m.group(2).strip()